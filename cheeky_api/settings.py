@@ -43,6 +43,8 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    'ct.core.middleware.RequestInstrumentationMiddleware',
+    'ct.core.middleware.ReadYourWritesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -53,6 +55,10 @@ MIDDLEWARE_CLASSES = (
     'django.middleware.security.SecurityMiddleware',
 )
 
+# Per-request query/timing profiles (see ct/core/middleware.py). Off unless
+# CT_INSTRUMENT_REQUESTS is set; while it's off the middleware removes itself.
+INSTRUMENT_REQUESTS = bool(os.environ.get('CT_INSTRUMENT_REQUESTS'))
+
 ROOT_URLCONF = 'cheeky_api.urls'
 
 TEMPLATES = [
@@ -81,9 +87,26 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Keep connections open between requests rather than reconnecting for
+        # each one, and wait up to 20 seconds for a lock (SQLite's busy timeout)
+        # instead of failing straight away with "database is locked".
+        'CONN_MAX_AGE': int(os.environ.get('CT_CONN_MAX_AGE', 60)),
+        'OPTIONS': {'timeout': 20},
     }
 }
 
+# The public, read-only RSVP endpoints read from READ_DATABASE, everything else
+# uses the primary (see ct/core/db.py). Point CT_REPLICA_DATABASE at a copy of
+# db.sqlite3 to try it out locally. The test runner treats it as a mirror of
+# the primary rather than creating a second test database.
+if os.environ.get('CT_REPLICA_DATABASE'):
+    DATABASES['replica'] = dict(DATABASES['default'], NAME=os.environ['CT_REPLICA_DATABASE'],
+        TEST={'MIRROR': 'default'})
+READ_DATABASE = 'replica' if 'replica' in DATABASES else 'default'
+# How long a client that has just written keeps reading from the primary.
+READ_PIN_SECONDS = int(os.environ.get('CT_READ_PIN_SECONDS', 15))
+DATABASE_ROUTERS = ['ct.core.db.ReadReplicaRouter']
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/1.8/topics/i18n/
@@ -16,9 +16,37 @@ Including another URLconf
 from django.conf.urls import include, url
 from django.contrib import admin
 
-from ct.rsvp.views import loadEventWithGuests
+from ct.core.views import requestStats
+from ct.rsvp.views import (loadEventWithGuests, importJobStatus, cacheStats, throttleStats,
+    liveSearch, invitationByCode, codeRSVP, invitationRSVP, eventInvitations, eventGuests,
+    eventChanges, eventStream, createInvitations, arrangeInvitations, invitationDetail,
+    cloneEvent, eventSummary, exportGuests, plannerDashboard)
 
 urlpatterns = [
     url(r'^admin/', include(admin.site.urls)),
+    url(r'^stats/requests/$', requestStats, name='request_stats'),
+    url(r'^stats/cache/$', cacheStats, name='cache_stats'),
+    url(r'^stats/throttles/$', throttleStats, name='throttle_stats'),
     url(r'^uploadGuests/', loadEventWithGuests, name='guest_list_upload'),
+    url(r'^api/imports/(?P<job_id>[0-9a-f-]+)/$', importJobStatus, name='import_job_status'),
+    url(r'^api/dashboard/$', plannerDashboard, name='planner_dashboard'),
+    url(r'^api/codes/(?P<code>[\w-]+)/$', invitationByCode, name='invitation_by_code'),
+    url(r'^api/codes/(?P<code>[\w-]+)/rsvp/$', codeRSVP, name='code_rsvp'),
+    url(r'^api/events/(?P<event_id>\d+)/search/$', liveSearch, name='live_search'),
+    url(r'^api/events/(?P<event_id>\d+)/invitations/$', eventInvitations, name='event_invitations'),
+    url(r'^api/events/(?P<event_id>\d+)/guests/$', eventGuests, name='event_guests'),
+    url(r'^api/events/(?P<event_id>\d+)/invitations/bulk/$', createInvitations,
+        name='invitation_bulk_create'),
+    url(r'^api/events/(?P<event_id>\d+)/invitations/arrange/$', arrangeInvitations,
+        name='invitation_arrange'),
+    url(r'^api/events/(?P<event_id>\d+)/invitations/(?P<invitation>\d+)/$', invitationDetail,
+        name='invitation_detail'),
+    url(r'^api/events/(?P<event_id>\d+)/invitations/(?P<invitation>\d+)/rsvp/$', invitationRSVP,
+        name='invitation_rsvp'),
+    url(r'^api/events/(?P<event_id>\d+)/changes/$', eventChanges, name='event_changes'),
+    url(r'^api/events/(?P<event_id>\d+)/stream/$', eventStream, name='event_stream'),
+    url(r'^api/events/(?P<event_id>\d+)/clone/$', cloneEvent, name='event_clone'),
+    url(r'^api/events/(?P<event_id>\d+)/summary/$', eventSummary, name='event_summary'),
+    url(r'^api/events/(?P<event_id>\d+)/export\.(?P<filetype>csv|jsonl)$', exportGuests,
+        name='guest_export'),
 ]
@@ -0,0 +1 @@
+default_app_config = 'ct.core.apps.CoreConfig'
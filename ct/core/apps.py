@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class CoreConfig(AppConfig):
+	name = 'ct.core'
+	verbose_name = 'Core'
+
+	def ready(self):
+		from .db import configureSQLite
+		connection_created.connect(configureSQLite, dispatch_uid='ct.core.db.configureSQLite')
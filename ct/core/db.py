@@ -0,0 +1,114 @@
+"""
+Database routing and connection setup.
+
+Writes always go to 'default', the primary. Reads go there too, except in views
+wrapped in readFromReplica (the public, read-only RSVP endpoints), which send
+their reads to settings.READ_DATABASE for the length of the request. That's an
+alias in DATABASES; settings.py adds a 'replica' one when CT_REPLICA_DATABASE
+names a database file, and otherwise READ_DATABASE is 'default' and nothing
+changes.
+
+A replica lags the primary, so a guest who has just RSVPed shouldn't be shown
+their invitation as it was before. ReadYourWritesMiddleware sets a short-lived
+cookie on the response to any successful POST/PUT/PATCH/DELETE, and while a
+client has it, readFromReplica leaves its reads on the primary. Make
+READ_PIN_SECONDS longer than the replica ever falls behind.
+
+Every new SQLite connection also gets SQLITE_PRAGMAS (WAL, so readers don't
+block the writer, and fewer fsyncs). The busy timeout and persistent
+connections are ordinary DATABASES settings, see settings.py.
+"""
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'ct_read_primary'
+DEFAULT_PIN_SECONDS = 15
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+SQLITE_PRAGMAS = ('journal_mode=WAL', 'synchronous=NORMAL')
+
+_state = threading.local()
+
+
+def readDatabase():
+	alias = getattr(settings, 'READ_DATABASE', DEFAULT_DB_ALIAS)
+	if alias == DEFAULT_DB_ALIAS:
+		return alias
+	# While testing, a replica that's a TEST MIRROR opens the primary's test
+	# database on a connection of its own, which can't see what the test
+	# hasn't committed. Read through the primary's connection instead.
+	mirror = connections[alias].settings_dict['TEST'].get('MIRROR')
+	if mirror and connections[alias].settings_dict['NAME'] == connections[mirror].settings_dict['NAME']:
+		return mirror
+	return alias
+
+
+def currentReadDatabase():
+	"""
+	The alias this thread's reads are going to.
+	"""
+	return getattr(_state, 'alias', None) or DEFAULT_DB_ALIAS
+
+
+def pinSeconds():
+	return getattr(settings, 'READ_PIN_SECONDS', DEFAULT_PIN_SECONDS)
+
+
+class readsFrom(object):
+	"""
+	Context manager sending this thread's reads to the alias. Nests.
+	"""
+
+	def __init__(self, alias):
+		self.alias = alias
+
+	def __enter__(self):
+		self.previous = getattr(_state, 'alias', None)
+		_state.alias = self.alias
+
+	def __exit__(self, *exc_info):
+		_state.alias = self.previous
+
+
+def readFromReplica(view):
+	"""
+	View decorator: safe requests read from READ_DATABASE unless the client
+	wrote something in the last READ_PIN_SECONDS. Put it outside @condition so
+	the ETag query reads from the replica too.
+	"""
+	@wraps(view)
+	def wrapped(request, *args, **kwargs):
+		alias = readDatabase()
+		if alias == DEFAULT_DB_ALIAS or request.method not in SAFE_METHODS or \
+				PIN_COOKIE in request.COOKIES:
+			return view(request, *args, **kwargs)
+		with readsFrom(alias):
+			return view(request, *args, **kwargs)
+	return wrapped
+
+
+class ReadReplicaRouter(object):
+
+	def db_for_read(self, model, **hints):
+		return getattr(_state, 'alias', None)
+
+	def db_for_write(self, model, **hints):
+		return DEFAULT_DB_ALIAS
+
+	def allow_relation(self, obj1, obj2, **hints):
+		# The replica holds the same rows as the primary.
+		return True
+
+
+def configureSQLite(sender, connection, **kwargs):
+	"""
+	connection_created handler, connected in apps.CoreConfig.ready.
+	"""
+	if connection.vendor != 'sqlite':
+		return
+	cursor = connection.cursor()
+	for pragma in getattr(settings, 'SQLITE_PRAGMAS', SQLITE_PRAGMAS):
+		cursor.execute('PRAGMA {0}'.format(pragma))
+	cursor.close()
@@ -0,0 +1,232 @@
+"""
+Lightweight database query recording, for the benchmark command and anything
+else that needs to know how many statements a block of code ran and how long
+they took, and the per-request profiling behind
+middleware.RequestInstrumentationMiddleware.
+
+Django 1.8 has no execute wrappers, so QueryRecorder hooks each connection's
+make_debug_cursor while it's active. It keeps counters and the few slowest
+statements rather than the full query log, so recording a 500k row import
+doesn't hold every INSERT in memory.
+"""
+import heapq
+import math
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.db import connections
+from django.db.backends.utils import CursorWrapper
+
+MAX_SQL_LENGTH = 500
+
+
+class RecordingCursorWrapper(CursorWrapper):
+
+	def __init__(self, cursor, db, recorder):
+		super(RecordingCursorWrapper, self).__init__(cursor, db)
+		self.recorder = recorder
+
+	def execute(self, sql, params=None):
+		started = time.perf_counter()
+		try:
+			return super(RecordingCursorWrapper, self).execute(sql, params)
+		finally:
+			self.recorder.record(sql, time.perf_counter() - started)
+
+	def executemany(self, sql, param_list):
+		started = time.perf_counter()
+		try:
+			return super(RecordingCursorWrapper, self).executemany(sql, param_list)
+		finally:
+			self.recorder.record(sql, time.perf_counter() - started)
+
+
+class QueryRecorder(object):
+	"""
+	Context manager counting statements run on every database connection (or
+	just the aliases in using, one or a list of them), their total time in
+	seconds, and the keep_slowest slowest of them. Recorders nest.
+	"""
+
+	def __init__(self, using=None, keep_slowest=5):
+		if isinstance(using, str):
+			using = [using]
+		self.using = using
+		self.keep_slowest = keep_slowest
+		self.count = 0
+		self.time = 0.0
+		self._slowest = []
+
+	def __enter__(self):
+		aliases = list(connections) if self.using is None else self.using
+		self._saved, hooked = [], set()
+		for alias in aliases:
+			if id(connections[alias]) not in hooked: # Test mirrors can share one.
+				hooked.add(id(connections[alias]))
+				self._saved.append((alias, self._hook(connections[alias])))
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		for alias, (force_debug_cursor, previous) in reversed(self._saved):
+			connection = connections[alias]
+			connection.force_debug_cursor = force_debug_cursor
+			if previous is None:
+				del connection.make_debug_cursor
+			else:
+				connection.make_debug_cursor = previous
+
+	def _hook(self, connection):
+		"""
+		Wraps connection's cursors, returning what __exit__ needs to put back.
+		"""
+		previous = connection.__dict__.get('make_debug_cursor')
+		logged = connection.queries_logged
+
+		def make_debug_cursor(cursor):
+			if previous is not None:
+				cursor = previous(cursor)
+			elif logged:
+				# Keep filling connection.queries for DEBUG and assertNumQueries.
+				cursor = type(connection).make_debug_cursor(connection, cursor)
+			return RecordingCursorWrapper(cursor, connection, self)
+
+		saved = (connection.force_debug_cursor, previous)
+		connection.force_debug_cursor = True
+		connection.make_debug_cursor = make_debug_cursor
+		return saved
+
+	def record(self, sql, duration):
+		self.count += 1
+		self.time += duration
+		if self.keep_slowest:
+			entry = (duration, self.count, sql[:MAX_SQL_LENGTH])
+			if len(self._slowest) < self.keep_slowest:
+				heapq.heappush(self._slowest, entry)
+			else:
+				heapq.heappushpop(self._slowest, entry)
+
+	@property
+	def slowest(self):
+		return [{'sql': sql, 'time': duration}
+			for duration, order, sql in sorted(self._slowest, reverse=True)]
+
+
+######### PER-REQUEST PROFILING ##########
+# Filled in by middleware.RequestInstrumentationMiddleware when
+# settings.INSTRUMENT_REQUESTS is on. With it off nothing here is ever set up,
+# and timed() costs one thread-local lookup.
+_active = threading.local()
+WINDOW = 1000 # Requests kept per endpoint for the percentiles.
+PERCENTILES = (50, 95, 99)
+
+
+class RequestProfile(object):
+
+	def __init__(self, slowest=3):
+		self.view = None
+		self.queries = QueryRecorder(keep_slowest=slowest)
+		self.sections = defaultdict(float)
+		self.started = self.elapsed = None
+
+	def start(self):
+		self.queries.__enter__()
+		self.started = time.perf_counter()
+		_active.profile = self
+
+	def stop(self):
+		self.elapsed = time.perf_counter() - self.started
+		self.queries.__exit__(None, None, None)
+		_active.profile = None
+
+
+def currentProfile():
+	return getattr(_active, 'profile', None)
+
+
+class timed(object):
+	"""
+	with timed('serializer'): ... adds the block's time to that section of the
+	current request's profile. Does nothing outside an instrumented request.
+	"""
+
+	def __init__(self, section):
+		self.section = section
+
+	def __enter__(self):
+		self.profile = getattr(_active, 'profile', None)
+		if self.profile is not None:
+			self.started = time.perf_counter()
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		if self.profile is not None:
+			self.profile.sections[self.section] += time.perf_counter() - self.started
+
+
+def percentile(ordered, pct):
+	"""
+	Nearest-rank percentile of an already sorted list.
+	"""
+	if not ordered:
+		return None
+	return ordered[max(0, int(math.ceil(pct / 100.0 * len(ordered))) - 1)]
+
+
+class EndpointStats(object):
+	"""
+	Rolling aggregate of the last WINDOW profiles for each endpoint, plus the
+	slowest statements any of them ran.
+	"""
+
+	def __init__(self, window=WINDOW, keep_slowest=5):
+		self.window = window
+		self.keep_slowest = keep_slowest
+		self.lock = threading.Lock()
+		self.reset()
+
+	def reset(self):
+		with self.lock:
+			self.samples = defaultdict(lambda: deque(maxlen=self.window))
+			self.totals = defaultdict(int)
+			self.slowest = defaultdict(list)
+
+	def add(self, endpoint, profile):
+		sample = {'time': profile.elapsed, 'queries': profile.queries.count,
+			'db_time': profile.queries.time}
+		sample.update(('{0}_time'.format(section), spent)
+			for section, spent in profile.sections.items())
+		with self.lock:
+			self.samples[endpoint].append(sample)
+			self.totals[endpoint] += 1
+			slowest = self.slowest[endpoint]
+			for statement in profile.queries.slowest:
+				entry = (statement['time'], statement['sql'])
+				if len(slowest) < self.keep_slowest:
+					heapq.heappush(slowest, entry)
+				else:
+					heapq.heappushpop(slowest, entry)
+
+	def summary(self):
+		with self.lock:
+			samples = {endpoint: list(window) for endpoint, window in self.samples.items()}
+			totals = dict(self.totals)
+			slowest = {endpoint: sorted(entries, reverse=True)
+				for endpoint, entries in self.slowest.items()}
+		report = {}
+		for endpoint, window in samples.items():
+			metrics = {}
+			for metric in sorted({metric for sample in window for metric in sample}):
+				ordered = sorted(sample.get(metric, 0) for sample in window)
+				metrics[metric] = {'p{0}'.format(pct): percentile(ordered, pct)
+					for pct in PERCENTILES}
+			report[endpoint] = {
+				'requests': totals[endpoint],
+				'window': len(window),
+				'metrics': metrics,
+				'slowest_queries': [{'sql': sql, 'time': duration}
+					for duration, sql in slowest.get(endpoint, ())],
+			}
+		return report
+
+
+stats = EndpointStats()
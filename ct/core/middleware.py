@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+from .db import PIN_COOKIE, SAFE_METHODS, pinSeconds, readDatabase
+from .instrumentation import RequestProfile, currentProfile, stats
+
+
+class RequestInstrumentationMiddleware(object):
+	"""
+	Profiles every request: SQL statements and their total time, the slowest of
+	them, time spent in timed() sections (the API views time their serializers)
+	and which view ran. Results go into instrumentation.stats, which the
+	superuser-only requestStats view reports as p50/p95/p99 per endpoint, and,
+	when DEBUG is on, into X-Instrumentation-* response headers.
+
+	Opt in with settings.INSTRUMENT_REQUESTS. Otherwise Django drops the
+	middleware at startup and requests don't pay for it at all.
+
+	Keep it first in MIDDLEWARE_CLASSES so the timings cover the other
+	middleware too. Streaming responses are only measured up to the point the
+	view returns.
+	"""
+
+	def __init__(self):
+		if not getattr(settings, 'INSTRUMENT_REQUESTS', False):
+			raise MiddlewareNotUsed
+
+	def process_request(self, request):
+		RequestProfile().start()
+
+	def process_view(self, request, view_func, view_args, view_kwargs):
+		profile = currentProfile()
+		if profile is not None:
+			match = getattr(request, 'resolver_match', None)
+			profile.view = (match and match.url_name) or '{0}.{1}'.format(
+				view_func.__module__, getattr(view_func, '__name__', type(view_func).__name__))
+
+	def process_response(self, request, response):
+		profile = currentProfile()
+		if profile is None:
+			# An earlier middleware answered before process_request ran.
+			return response
+		profile.stop()
+		endpoint = '{0} {1}'.format(request.method, profile.view or 'unresolved')
+		stats.add(endpoint, profile)
+		if settings.DEBUG:
+			response['X-Instrumentation-View'] = profile.view or 'unresolved'
+			response['X-Instrumentation-Time'] = '{0:.2f}ms'.format(profile.elapsed * 1000)
+			response['X-Instrumentation-Queries'] = str(profile.queries.count)
+			response['X-Instrumentation-DB-Time'] = '{0:.2f}ms'.format(profile.queries.time * 1000)
+			for section, spent in sorted(profile.sections.items()):
+				response['X-Instrumentation-{0}-Time'.format(section.title())] = '{0:.2f}ms'.format(
+					spent * 1000)
+			slowest = profile.queries.slowest
+			if slowest:
+				response['X-Instrumentation-Slowest-Query'] = '{0:.2f}ms {1}'.format(
+					slowest[0]['time'] * 1000, ' '.join(slowest[0]['sql'].split())[:200])
+		return response
+
+
+class ReadYourWritesMiddleware(object):
+	"""
+	Pins a client's reads to the primary for READ_PIN_SECONDS after it writes,
+	by setting db.PIN_COOKIE on the response to any successful unsafe request.
+	The public RSVP endpoints have no login or session to hang this off, and a
+	client that fakes the cookie only gets the primary. Does nothing while there
+	is no replica to read from.
+	"""
+
+	def process_response(self, request, response):
+		if readDatabase() != DEFAULT_DB_ALIAS and request.method not in SAFE_METHODS and \
+				response.status_code < 400:
+			response.set_cookie(PIN_COOKIE, '1', max_age=pinSeconds(), httponly=True)
+		return response
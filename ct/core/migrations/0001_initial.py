@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0006_require_contenttypes_0002'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Event',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('name', models.CharField(max_length=60)),
+                ('event_date', models.DateField()),
+                ('prefix_primary_guests', models.BooleanField(default=True)),
+                ('prefix_with_guests', models.BooleanField(default=False)),
+                ('surname_with_guests', models.BooleanField(default=True)),
+                ('and_joiner', models.CharField(max_length=25, default='&')),
+                ('with_joiner', models.CharField(max_length=25, default='with')),
+                ('site_url', models.CharField(max_length=90, default='cheekyteak.com')),
+                ('rsvp_method', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('user', models.OneToOneField(primary_key=True, serialize=False, related_name='ctprofile', to=settings.AUTH_USER_MODEL)),
+                ('user_type', models.SmallIntegerField(default=0)),
+                ('following_events', models.CommaSeparatedIntegerField(max_length=200)),
+            ],
+        ),
+    ]
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def copy_following_events(apps, schema_editor):
+    Event = apps.get_model('core', 'Event')
+    Profile = apps.get_model('core', 'Profile')
+    Follow = Profile.followed_events.through
+    existing = set(Event.objects.values_list('pk', flat=True))
+    follows = []
+    for profile in Profile.objects.all():
+        eventIds = {int(pk) for pk in profile.following_events.split(',') if pk.strip()}
+        follows.extend(Follow(profile_id=profile.pk, event_id=pk) for pk in eventIds & existing)
+    Follow.objects.bulk_create(follows)
+
+
+def copy_back(apps, schema_editor):
+    Profile = apps.get_model('core', 'Profile')
+    for profile in Profile.objects.all():
+        profile.following_events = ','.join(str(pk) for pk in
+            sorted(profile.followed_events.values_list('pk', flat=True)))
+        profile.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='followed_events',
+            field=models.ManyToManyField(to='core.Event', related_name='followers', blank=True),
+        ),
+        migrations.RunPython(copy_following_events, copy_back),
+        # A default, so unapplying the RemoveField can put the column back.
+        migrations.AlterField(
+            model_name='profile',
+            name='following_events',
+            field=models.CommaSeparatedIntegerField(max_length=200, default='', blank=True),
+        ),
+        migrations.RemoveField(
+            model_name='profile',
+            name='following_events',
+        ),
+    ]
@@ -32,4 +32,16 @@ class Profile(models.Model):
 	"""
 	user = models.OneToOneField(User, primary_key=True, related_name='ctprofile')
 	user_type = models.SmallIntegerField(default=0)
-	following_events = models.CommaSeparatedIntegerField(max_length=200)
+	followed_events = models.ManyToManyField(Event, related_name='followers', blank=True)
+
+	def followedEventIds(self):
+		"""
+		Primary keys of the events this profile follows, as a set of ints.
+		"""
+		return set(self.followed_events.values_list('pk', flat=True))
+
+	def follows(self, eventId):
+		"""
+		One indexed lookup on the follow table, for permission checks.
+		"""
+		return self.followed_events.filter(pk=eventId).exists()
@@ -1,3 +1,175 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+import datetime
+import json
+import os
+import tempfile
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.db import connections, router
+
+from ct.core.db import PIN_COOKIE, readsFrom
+
+from ct.core.instrumentation import (EndpointStats, QueryRecorder, RequestProfile, percentile,
+	stats, timed)
+from ct.core.models import Event
+from ct.rsvp import cache
+from ct.rsvp.models import EventGuest, InvitationCode
+
+
+def content(response):
+	return json.loads(response.content.decode('utf-8'))
+
+
+class TestInstrumentation(TestCase):
+
+	def test_percentile_is_nearest_rank(self):
+		ordered = list(range(1, 101))
+		self.assertEqual(percentile(ordered, 50), 50)
+		self.assertEqual(percentile(ordered, 99), 99)
+		self.assertEqual(percentile([7], 95), 7)
+		self.assertIsNone(percentile([], 50))
+
+	def test_profile_counts_queries_and_sections(self):
+		profile = RequestProfile()
+		profile.start()
+		Event.objects.count()
+		with timed('serializer'):
+			Event.objects.count()
+		profile.stop()
+		self.assertEqual(profile.queries.count, 2)
+		self.assertIn('serializer', profile.sections)
+		with timed('serializer'):
+			pass # No profile running, so nothing to record into.
+
+	def test_recorder_keeps_the_query_log(self):
+		with self.assertNumQueries(2):
+			with QueryRecorder() as recorder:
+				Event.objects.count()
+				with QueryRecorder() as inner:
+					Event.objects.count()
+		self.assertEqual((recorder.count, inner.count), (2, 1))
+
+	def test_stats_keep_a_window(self):
+		endpointStats = EndpointStats(window=2)
+		for elapsed in (1.0, 2.0, 3.0):
+			profile = RequestProfile()
+			profile.start()
+			profile.stop()
+			profile.elapsed = elapsed
+			endpointStats.add('GET thing', profile)
+		summary = endpointStats.summary()['GET thing']
+		self.assertEqual(summary['requests'], 3)
+		self.assertEqual(summary['window'], 2)
+		self.assertEqual(summary['metrics']['time']['p50'], 2.0)
+		self.assertEqual(summary['metrics']['time']['p99'], 3.0)
+
+
+@override_settings(INSTRUMENT_REQUESTS=True, DEBUG=True)
+class TestInstrumentationMiddleware(TestCase):
+
+	def setUp(self):
+		stats.reset()
+		cache.responses.clear()
+		self.ev = Event(name='Test Event', event_date=datetime.date.today())
+		self.ev.save()
+		self.url = reverse('event_invitations', args=[self.ev.pk])
+
+	def test_headers_and_stats(self):
+		response = self.client.get(self.url)
+		self.assertEqual(response['X-Instrumentation-View'], 'event_invitations')
+		self.assertEqual(response['X-Instrumentation-Queries'], '3')
+		self.assertIn('X-Instrumentation-Serializer-Time', response)
+		self.assertIn('X-Instrumentation-Slowest-Query', response)
+
+		User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+		self.client.login(username='admin', password='pw')
+		report = content(self.client.get(reverse('request_stats')))
+		self.assertTrue(report['enabled'])
+		endpoint = report['endpoints']['GET event_invitations']
+		self.assertEqual(endpoint['requests'], 1)
+		self.assertEqual(endpoint['metrics']['queries']['p95'], 3)
+		self.assertIn('serializer_time', endpoint['metrics'])
+
+	@override_settings(DEBUG=False)
+	def test_no_headers_without_debug(self):
+		response = self.client.get(self.url)
+		self.assertNotIn('X-Instrumentation-Queries', response)
+		self.assertIn('GET event_invitations', stats.summary())
+
+	@override_settings(INSTRUMENT_REQUESTS=False)
+	def test_disabled(self):
+		response = self.client.get(self.url)
+		self.assertNotIn('X-Instrumentation-Queries', response)
+		self.assertEqual(stats.summary(), {})
+
+	def test_stats_are_superuser_only(self):
+		response = self.client.get(reverse('request_stats'))
+		self.assertEqual(response.status_code, 302)
+
+
+@override_settings(READ_DATABASE='stale_replica')
+class TestReadReplica(TestCase):
+	"""
+	A second, empty SQLite database stands in for a replica that hasn't caught
+	up, so whatever is found was read from the primary.
+	"""
+
+	@classmethod
+	def setUpClass(cls):
+		super(TestReadReplica, cls).setUpClass()
+		handle, cls.path = tempfile.mkstemp(suffix='.sqlite3')
+		os.close(handle)
+		connections.databases['stale_replica'] = {'ENGINE': 'django.db.backends.sqlite3',
+			'NAME': cls.path}
+		with connections['stale_replica'].schema_editor() as editor:
+			for model in apps.get_models():
+				editor.create_model(model)
+
+	@classmethod
+	def tearDownClass(cls):
+		connections['stale_replica'].close()
+		del connections.databases['stale_replica']
+		del connections._connections.stale_replica
+		os.remove(cls.path)
+		super(TestReadReplica, cls).tearDownClass()
+
+	def setUp(self):
+		ev = Event.objects.create(name='Test Event', event_date=datetime.date.today(),
+			rsvp_method=InvitationCode.RSVP_METHOD)
+		self.guest = EventGuest.objects.create(event=ev, invitation=1, first='Mitchell')
+		InvitationCode.generate(ev.pk)
+		self.url = reverse('code_rsvp', args=[InvitationCode.objects.get(event=ev).formatted])
+
+	def test_routing(self):
+		self.assertEqual(router.db_for_read(Event), 'default')
+		with readsFrom('stale_replica'):
+			self.assertEqual(router.db_for_read(Event), 'stale_replica')
+			self.assertEqual(router.db_for_write(Event), 'default')
+		self.assertEqual(router.db_for_read(Event), 'default')
+
+	def test_public_reads_use_replica_until_client_writes(self):
+		self.assertEqual(self.client.get(self.url).status_code, 404)
+		self.assertEqual(self.client.get(reverse('event_guests', args=[self.guest.event_id])).status_code,
+			403)
+		version = EventGuest.invitationVersion([self.guest])
+		response = self.client.post(self.url, json.dumps({'version': version,
+			'guests': [{'id': self.guest.pk, 'status': 1, 'plusOne': 0}]}), content_type='application/json')
+		self.assertEqual(response.status_code, 200)
+		self.assertIn(PIN_COOKIE, response.cookies)
+		self.assertEqual(self.client.get(self.url).data['guests'][0]['first'], 'Mitchell')
+		self.client.cookies.pop(PIN_COOKIE)
+		self.assertEqual(self.client.get(self.url).status_code, 404)
+
+	def test_recorder_covers_every_database(self):
+		with QueryRecorder() as everywhere, QueryRecorder(using='default') as primary:
+			Event.objects.count()
+			Event.objects.using('stale_replica').count()
+		self.assertEqual((everywhere.count, primary.count), (2, 1))
+
+	@override_settings(READ_DATABASE='default')
+	def test_no_replica_no_cookie(self):
+		self.assertEqual(self.client.get(self.url).status_code, 200)
+		response = self.client.post(self.url, '{}', content_type='application/json')
+		self.assertNotIn(PIN_COOKIE, response.cookies)
@@ -1,3 +1,22 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.contrib.auth.decorators import user_passes_test
+from django.http import JsonResponse
 
-# Create your views here.
+from .instrumentation import stats
+
+
+@user_passes_test(lambda x: x.is_superuser)
+def requestStats(request):
+	"""
+	Per-endpoint request profiles collected by RequestInstrumentationMiddleware:
+	p50/p95/p99 of wall time, query count, DB time and timed sections over each
+	endpoint's recent requests, and the slowest statements seen. POST to reset.
+
+	Numbers are per worker process.
+	"""
+	if request.method == 'POST':
+		stats.reset()
+	return JsonResponse({
+		'enabled': getattr(settings, 'INSTRUMENT_REQUESTS', False),
+		'endpoints': stats.summary(),
+	})
@@ -1,3 +1,10 @@
 from django.contrib import admin
+from ct.rsvp.models import EventGuest, InvitationCode
 
-# Register your models here.
+admin.site.register(EventGuest)
+
+@admin.register(InvitationCode)
+class InvitationCodeAdmin(admin.ModelAdmin):
+	list_display = ('formatted', 'event', 'invitation')
+	list_filter = ('event',)
+	search_fields = ('code',)
@@ -0,0 +1,211 @@
+"""
+Synthetic load benchmarks for the RSVP hot paths. Run through
+`manage.py rsvp_benchmark`; see that command for the options.
+
+Each run makes a throwaway event with the requested number of guests, spread
+over invitations according to a size distribution, then times each phase
+below. Every phase reports wall time, SQL statements and their total time,
+peak Python memory (tracemalloc) and items per second, as JSON, so results can
+be compared between commits.
+"""
+import datetime
+import io
+import json
+import platform
+import random
+import sqlite3
+import subprocess
+import time
+import tracemalloc
+from collections import OrderedDict
+from itertools import groupby
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import Q
+from django.test import RequestFactory
+
+from ct.core.instrumentation import QueryRecorder
+from ct.core.models import Event
+from .duplicates import DuplicateFinder
+from .models import EventGuest
+from .reader import GuestFileReader
+from .serializers import GuestFullSerializer, InvitationFullSerializer
+from . import search
+
+DEFAULT_SIZES = OrderedDict([(1, 40), (2, 45), (3, 8), (4, 5), (6, 2)])
+
+FIRST_NAMES = ('Mitchell', 'Jaqueline', 'Dave', 'Brian', 'Isabelle', 'Sharon', 'Rachel',
+	'Daylen', 'José', 'Renée', 'Marvin', 'Cynthia', 'Tim', 'Amelia', 'Oliver', 'Priya',
+	'Hannah', 'Mateo', 'Zoë', 'Aarav', 'Grace', 'Liam', 'Noah', 'Emma', 'Ava', 'Lucas',
+	'Mia', 'Ethan', 'Chloé', 'Sofia')
+LAST_NAMES = ('Stoutin', 'Collier', 'Kym', 'Rice', 'McCarthy', 'Blair', 'Kim', 'Álvarez',
+	"O'Brien", 'Nguyen', 'Patel', 'Smith', 'Johnson', 'García', 'Müller', 'Rossi', 'Dubois',
+	'Kowalski', 'Jensen', 'Silva', 'Tanaka', 'Cohen', 'Okafor', 'Larsen', 'Novak')
+PREFIXES = ('Mr', 'Mrs', 'Ms', 'Dr', 'Miss', '')
+
+
+def parseSizes(text):
+	"""
+	"1:40,2:45,4:15" -> {1: 40, 2: 45, 4: 15}: invitation size to relative weight.
+	"""
+	sizes = OrderedDict()
+	for part in text.split(','):
+		size, weight = part.split(':')
+		sizes[int(size)] = float(weight)
+	return sizes
+
+
+def syntheticCSV(guests, sizes, rng):
+	"""
+	Upload file bytes (see reader.py) for the given number of guests.
+	"""
+	lines = ['Prefix,First Name,Last Name,Plus Ones,Same Group']
+	population, weights = list(sizes.keys()), list(sizes.values())
+	written = 0
+	while written < guests:
+		size = min(rng.choices(population, weights)[0], guests - written)
+		last = rng.choice(LAST_NAMES)
+		for position in range(size):
+			lines.append(','.join((rng.choice(PREFIXES), rng.choice(FIRST_NAMES), last,
+				str(rng.choice((0, 0, 0, 1))), 'X' if position else '')))
+		written += size
+	return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def measure(name, fn, items, traceMemory=True):
+	"""
+	Runs fn() once and returns its phase report.
+	"""
+	if traceMemory:
+		tracemalloc.start()
+	try:
+		with QueryRecorder() as queries:
+			started = time.perf_counter()
+			fn()
+			elapsed = time.perf_counter() - started
+	finally:
+		peak = tracemalloc.get_traced_memory()[1] if traceMemory else None
+		if traceMemory:
+			tracemalloc.stop()
+	return OrderedDict([
+		('phase', name),
+		('items', items),
+		('wall_time', elapsed),
+		('queries', queries.count),
+		('db_time', queries.time),
+		('peak_memory', peak),
+		('throughput', items / elapsed if elapsed else None),
+	])
+
+
+class Benchmark(object):
+
+	def __init__(self, guestCounts, sizes=None, seed=0, lookups=200, allocations=200,
+			traceMemory=True, keep=False):
+		self.guestCounts = guestCounts
+		self.sizes = sizes or DEFAULT_SIZES
+		self.seed = seed
+		self.lookups = lookups
+		self.allocations = allocations
+		self.traceMemory = traceMemory
+		self.keep = keep
+
+	def run(self):
+		return OrderedDict([
+			('meta', self.meta()),
+			('runs', [self.runOne(guests) for guests in self.guestCounts]),
+		])
+
+	def meta(self):
+		return OrderedDict([
+			('timestamp', datetime.datetime.utcnow().isoformat() + 'Z'),
+			('revision', gitRevision()),
+			('python', platform.python_version()),
+			('django', django.get_version()),
+			('sqlite', sqlite3.sqlite_version),
+			('sizes', {str(size): weight for size, weight in self.sizes.items()}),
+			('seed', self.seed),
+		])
+
+	def runOne(self, guests):
+		rng = random.Random(self.seed)
+		ev = Event.objects.create(name='Benchmark ({0} guests)'.format(guests),
+			event_date=datetime.date.today())
+		try:
+			return OrderedDict([
+				('guests', guests),
+				('phases', [measure(name, fn, items, self.traceMemory)
+					for name, fn, items in self.phases(ev, guests, rng)]),
+			])
+		finally:
+			search.invalidate(ev.pk)
+			if not self.keep:
+				ev.delete()
+
+	def phases(self, ev, guests, rng):
+		"""
+		(name, callable, item count) for each phase, in the order they run.
+		Later phases work on the guests the upload phase loaded, each with a fresh
+		queryset so none of them gets another's cached rows.
+		"""
+		upload = syntheticCSV(guests, self.sizes, rng)
+		yield ('parse_upload', lambda: sum(1 for row in GuestFileReader(io.BytesIO(upload))),
+			guests)
+		yield 'upload', lambda: self.upload(ev, upload), guests
+
+		# A second, overlapping list: as many rows again as the event has guests.
+		recheck = syntheticCSV(guests, self.sizes, rng)
+		yield 'duplicate_check', lambda: self.checkDuplicates(ev, recheck), guests
+
+		yield ('next_free_invitation', lambda: [EventGuest.nextFreeInvitation(ev)
+			for x in range(self.allocations)], self.allocations)
+
+		queryset = EventGuest.objects.filter(event=ev)
+		yield ('serialize_guests', lambda: GuestFullSerializer(queryset.all(), many=True).data,
+			guests)
+		yield ('serialize_guests_fast', lambda: GuestFullSerializer.fastRepresentation(
+			queryset.all()), guests)
+		yield 'serialize_invitations', lambda: self.serializeInvitations(queryset.all()), guests
+
+		prefixes = [rng.choice(FIRST_NAMES + LAST_NAMES)[:rng.randint(1, 4)]
+			for x in range(self.lookups)]
+		yield 'name_lookup_db', lambda: [list(queryset.filter(Q(first__istartswith=prefix)
+			| Q(last__istartswith=prefix))[:10]) for prefix in prefixes], self.lookups
+		yield 'search_index_build', lambda: search.get_index(ev.pk), guests
+		yield ('name_lookup_index', lambda: [search.get_index(ev.pk).search(prefix)
+			for prefix in prefixes], self.lookups)
+
+	def upload(self, ev, content):
+		from .views import loadEventWithGuests
+		request = RequestFactory().post('/uploadGuests/', {'event': ev.pk,
+			'csvfile': SimpleUploadedFile('guests.csv', content, 'text/csv')})
+		request.user = User(username='benchmark', is_superuser=True)
+		response = loadEventWithGuests(request)
+		assert response.status_code == 200, 'Benchmark upload failed.'
+
+	@staticmethod
+	def checkDuplicates(ev, content):
+		finder = DuplicateFinder(ev.pk)
+		for row in GuestFileReader(io.BytesIO(content)):
+			finder.check(row['row'], row['first'].strip(), row['last'].strip())
+		return finder.matches
+
+	@staticmethod
+	def serializeInvitations(queryset):
+		for number, guests in groupby(queryset, key=lambda guest: guest.invitation):
+			InvitationFullSerializer(list(guests), many=True).data
+
+
+def gitRevision():
+	try:
+		return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+			stderr=subprocess.DEVNULL).decode('ascii').strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def dumps(results):
+	return json.dumps(results, indent=2)
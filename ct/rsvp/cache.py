@@ -0,0 +1,271 @@
+"""
+Versioned cache for per-event API payloads.
+
+Public guest lists and display settings get read far more than they change, and
+every change to an event or its guests already bumps its EventVersion in the
+same transaction (bulk paths included, see EventGuestQuerySet). So payloads are
+keyed on (event, name, version): a write never has to find and delete cache
+entries, the next read just asks for a key that isn't there yet. Storing a new
+version drops the older ones for that event and name straight away; anything
+else ages out of the LRU.
+
+Configure with settings.RSVP_RESPONSE_CACHE, e.g.
+
+	RSVP_RESPONSE_CACHE = {'BACKEND': 'file', 'PATH': '/var/cache/cheekyteak', 'MAX_BYTES': 256 << 20}
+
+BACKEND is 'memory' (the default, one per worker process), 'file' (shared by
+every process on the box) or None to turn caching off. MAX_BYTES bounds either
+backend; MAX_ENTRIES bounds the memory one too. Sizes are those of the JSON
+encoding.
+
+Event rows changed with Event.objects.update() don't send post_save, so they
+don't bump the version either. Save events one at a time.
+"""
+import glob
+import json
+import os
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+
+CACHE_SETTINGS = getattr(settings, 'RSVP_RESPONSE_CACHE', {})
+DEFAULT_MAX_BYTES = 64 << 20
+DEFAULT_MAX_ENTRIES = 1000
+
+
+def encode(payload):
+	return json.dumps(payload, cls=JSONEncoder, separators=(',', ':')).encode('utf-8')
+
+
+def decode(data):
+	return json.loads(data.decode('utf-8'), object_pairs_hook=OrderedDict)
+
+
+class MemoryBackend(object):
+	"""
+	LRU of payload objects in this process. Payloads come back as the same
+	objects that were stored, so callers mustn't change them.
+	"""
+
+	def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_entries=DEFAULT_MAX_ENTRIES):
+		self.max_bytes = max_bytes
+		self.max_entries = max_entries
+		self.lock = threading.Lock()
+		self.entries = OrderedDict()
+		self.bytes = 0
+
+	def get(self, key):
+		with self.lock:
+			entry = self.entries.get(key)
+			if entry is None:
+				return None
+			self.entries.move_to_end(key)
+			return entry[0]
+
+	def set(self, key, payload):
+		"""
+		Stores payload under key, replacing older versions of it. Returns how
+		many entries had to be evicted to make room.
+		"""
+		size = len(encode(payload))
+		if size > self.max_bytes:
+			return 0
+		with self.lock:
+			self._discard(key)
+			for stale in [other for other in self.entries if other[:2] == key[:2]]:
+				self._discard(stale)
+			self.entries[key] = (payload, size)
+			self.bytes += size
+			evicted = 0
+			while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+				oldest = next(iter(self.entries))
+				self._discard(oldest)
+				evicted += 1
+			return evicted
+
+	def _discard(self, key):
+		entry = self.entries.pop(key, None)
+		if entry is not None:
+			self.bytes -= entry[1]
+
+	def clear(self):
+		with self.lock:
+			self.entries = OrderedDict()
+			self.bytes = 0
+
+	def usage(self):
+		return {'entries': len(self.entries), 'bytes': self.bytes}
+
+
+class FileBackend(object):
+	"""
+	One JSON file per payload, in a directory per (event, name) under path,
+	shared between worker processes. Hits touch the file's mtime, and eviction
+	removes the least recently touched files once there are more than max_bytes
+	of them. Finding those means a stat of every file, so a process only sweeps
+	when it has written another max_bytes / SWEEP_FRACTION since its last sweep,
+	and the cache can run over by that much per process in between.
+	"""
+	SWEEP_FRACTION = 16
+
+	def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+		self.path = path or os.path.join(tempfile.gettempdir(), 'cheekyteak-cache')
+		self.max_bytes = max_bytes
+		self.lock = threading.Lock()
+		self.sweepBytes = max_bytes // self.SWEEP_FRACTION
+		self.unswept = self.sweepBytes # Sweep on the first write, the cache may be full already.
+		os.makedirs(self.path, exist_ok=True)
+
+	def _directory(self, key):
+		return os.path.join(self.path, '{0}-{1}'.format(*key))
+
+	def _file(self, key):
+		return os.path.join(self._directory(key), '{0}.json'.format(key[2]))
+
+	def _files(self):
+		return glob.glob(os.path.join(self.path, '*', '*.json'))
+
+	def get(self, key):
+		path = self._file(key)
+		try:
+			with open(path, 'rb') as f:
+				payload = decode(f.read())
+			os.utime(path, None)
+		except (IOError, OSError, ValueError):
+			return None
+		return payload
+
+	def set(self, key, payload):
+		data = encode(payload)
+		if len(data) > self.max_bytes:
+			return 0
+		directory, path = self._directory(key), self._file(key)
+		os.makedirs(directory, exist_ok=True)
+		# Write then rename, so readers in other processes never see half a file.
+		temporary = '{0}.{1}.tmp'.format(path, uuid.uuid4().hex)
+		with open(temporary, 'wb') as f:
+			f.write(data)
+		os.replace(temporary, path)
+		# Other versions of this payload are the only other files in its directory.
+		for name in os.listdir(directory):
+			stale = os.path.join(directory, name)
+			if name.endswith('.json') and stale != path:
+				self._remove(stale)
+		with self.lock:
+			self.unswept += len(data)
+			sweep = self.unswept >= self.sweepBytes
+			if sweep:
+				self.unswept = 0
+		return self._evict() if sweep else 0
+
+	def _evict(self):
+		files = []
+		for path in self._files():
+			try:
+				stat = os.stat(path)
+			except OSError:
+				continue # Another process got there first.
+			files.append((stat.st_mtime, stat.st_size, path))
+		total = sum(size for mtime, size, path in files)
+		evicted = 0
+		for mtime, size, path in sorted(files):
+			if total <= self.max_bytes:
+				break
+			self._remove(path)
+			total -= size
+			evicted += 1
+		return evicted
+
+	@staticmethod
+	def _remove(path):
+		try:
+			os.remove(path)
+		except OSError:
+			pass
+
+	def clear(self):
+		for path in self._files():
+			self._remove(path)
+
+	def usage(self):
+		sizes = [os.path.getsize(path) for path in self._files()]
+		return {'entries': len(sizes), 'bytes': sum(sizes)}
+
+
+def makeBackend(options):
+	kind = options.get('BACKEND', 'memory')
+	maxBytes = options.get('MAX_BYTES', DEFAULT_MAX_BYTES)
+	if kind is None:
+		return None
+	if kind == 'memory':
+		return MemoryBackend(maxBytes, options.get('MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+	if kind == 'file':
+		return FileBackend(options.get('PATH'), maxBytes)
+	raise ValueError('Unknown RSVP_RESPONSE_CACHE backend {0!r}.'.format(kind))
+
+
+class ResponseCache(object):
+	"""
+	The backend plus hit/miss counters.
+	"""
+
+	def __init__(self, backend):
+		self.backend = backend
+		self.lock = threading.Lock()
+		self.reset_stats()
+
+	def reset_stats(self):
+		with self.lock:
+			self.hits = self.misses = self.stores = self.evictions = 0
+
+	def get_or_build(self, eventId, name, version, build):
+		"""
+		The payload cached for this event, name and version, or build()'s
+		result, cached for next time. build() returns (payload, version) with the
+		version its data was read at, which is what the payload gets stored
+		under. Without a version or a backend there's nothing safe to key on, so
+		build() just runs.
+		"""
+		if self.backend is None:
+			return build()[0]
+		if version is not None:
+			payload = self.backend.get((int(eventId), name, version))
+			if payload is not None:
+				with self.lock:
+					self.hits += 1
+				return payload
+		payload, builtVersion = build()
+		evicted = 0
+		if builtVersion is not None:
+			evicted = self.backend.set((int(eventId), name, builtVersion), payload)
+		with self.lock:
+			self.misses += 1
+			self.stores += builtVersion is not None
+			self.evictions += evicted
+		return payload
+
+	def clear(self):
+		if self.backend is not None:
+			self.backend.clear()
+
+	def report(self):
+		with self.lock:
+			lookups = self.hits + self.misses
+			report = {
+				'backend': type(self.backend).__name__ if self.backend is not None else None,
+				'hits': self.hits,
+				'misses': self.misses,
+				'stores': self.stores,
+				'evictions': self.evictions,
+				'hit_rate': self.hits / lookups if lookups else None,
+			}
+		if self.backend is not None:
+			report.update(self.backend.usage())
+		return report
+
+
+responses = ResponseCache(makeBackend(CACHE_SETTINGS))
@@ -0,0 +1,73 @@
+"""
+Request coalescing for the public RSVP endpoints.
+
+When a few hundred guests open the same link at once, many of them ask the
+same question at the same moment: the same search prefix, the same invitation
+list, the same code. coalescer.run(key, build) lets the first request for a key
+run build() and makes the ones that arrive while it's running wait for its
+answer instead of each asking the database. Nothing is kept once build()
+returns, so an answer is never older than a request that was already in
+flight when it started. Errors (Http404 and so on) are shared the same way.
+
+Answers are shared between requests, so callers mustn't change them.
+
+This is per process and only helps workers that serve requests on several
+threads. Between processes, the 'file' response cache (see cache.py) shares
+invitation lists once the first one is built.
+"""
+import threading
+
+from ct.core.db import currentReadDatabase
+
+
+class Call(object):
+
+	def __init__(self):
+		self.done = threading.Event()
+		self.result = self.error = None
+
+
+class Coalescer(object):
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.calls = {}
+		self.reset_stats()
+
+	def reset_stats(self):
+		with self.lock:
+			self.builds = self.shared = 0
+
+	def run(self, key, build):
+		# A client pinned to the primary mustn't be handed what a replica said.
+		key = (currentReadDatabase(),) + tuple(key)
+		with self.lock:
+			call = self.calls.get(key)
+			leader = call is None
+			if leader:
+				call = self.calls[key] = Call()
+				self.builds += 1
+			else:
+				self.shared += 1
+		if not leader:
+			call.done.wait()
+			if call.error is not None:
+				raise call.error
+			return call.result
+		try:
+			call.result = build()
+		except Exception as e:
+			call.error = e
+			raise
+		finally:
+			with self.lock:
+				del self.calls[key]
+			call.done.set()
+		return call.result
+
+	def report(self):
+		with self.lock:
+			return {'builds': self.builds, 'shared': self.shared, 'in_flight': len(self.calls)}
+
+
+coalescer = Coalescer()
@@ -0,0 +1,117 @@
+"""
+Duplicate guest detection for imports (see importer.GuestImporter).
+
+Names are compared the way guests search for them (search.normalize: case,
+accents and apostrophes don't matter, runs of spaces count as one), after the
+importer has cleaned them like EventGuest.clean. A row is an exact duplicate of
+an existing guest, or of an earlier row in the same file, when both names
+match exactly that way. That's one dict lookup.
+
+Anything else only gets compared with names in the same blocks, so nothing is
+checked against the whole list:
+
+* same last name and the same first two letters of the first name, or
+* same first name and the same first two letters of the last name.
+
+Within a block a name is a near duplicate if it's within NEAR_DISTANCE edits
+("Jaqueline Stoutin" and "Jacqueline Stoutin"; one edit for short names), or
+the first names differ only by one being the start of the other
+("Dave"/"Davey"). Each block holds distinct names rather than guests, so a big
+family doesn't make its block slow. The cost is that a typo in the first two
+letters of both names goes unnoticed.
+"""
+from .models import EventGuest
+from .search import normalize
+
+EXACT, NEAR = 'exact', 'near'
+NEAR_DISTANCE = 2
+MIN_PREFIX = 3
+
+
+def nameKey(first, last):
+	return (' '.join(normalize(first).split()), ' '.join(normalize(last).split()))
+
+
+def blockKeys(key):
+	first, last = key
+	return (('last', last, first[:2]), ('first', first, last[:2]))
+
+
+def withinDistance(a, b, limit):
+	"""
+	Whether the Levenshtein distance between a and b is at most limit. Gives up
+	on a row of the table as soon as every entry in it is over the limit.
+	"""
+	if abs(len(a) - len(b)) > limit:
+		return False
+	previous = list(range(len(b) + 1))
+	for i, ca in enumerate(a, 1):
+		current = [i]
+		for j, cb in enumerate(b, 1):
+			current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+		if min(current) > limit:
+			return False
+		previous = current
+	return previous[-1] <= limit
+
+
+def isNear(key, other):
+	(first, last), (otherFirst, otherLast) = key, other
+	if last == otherLast and min(len(first), len(otherFirst)) >= MIN_PREFIX and (
+			first.startswith(otherFirst) or otherFirst.startswith(first)):
+		return True
+	full, otherFull = '{0} {1}'.format(first, last), '{0} {1}'.format(otherFirst, otherLast)
+	# Short names are only a letter or two apart from lots of other names.
+	limit = NEAR_DISTANCE if min(len(full), len(otherFull)) >= 10 else 1
+	return withinDistance(full, otherFull, limit)
+
+
+class DuplicateFinder(object):
+	"""
+	Load once per import with the event's current guests (one query), then
+	call check() for each row, in file order.
+	"""
+
+	def __init__(self, eventId):
+		self.names = {}
+		self.blocks = {}
+		guests = EventGuest.objects.filter(event_id=eventId).order_by('id').values_list(
+			'id', 'first', 'last', 'invitation')
+		for guestId, first, last, invitation in guests.iterator():
+			self._add(nameKey(first, last or ''), {'guest': guestId, 'row': None,
+				'invitation': invitation, 'name': ' '.join(filter(None, (first, last)))})
+		self.matches = []
+
+	def _add(self, key, source):
+		if key in self.names:
+			return
+		self.names[key] = source
+		for block in blockKeys(key):
+			self.blocks.setdefault(block, []).append(key)
+
+	def check(self, row, first, last):
+		"""
+		The match for a row's name (a dict, also kept in self.matches), or None.
+		Either way the row's name is remembered, so later rows that repeat it
+		are caught too.
+		"""
+		key = nameKey(first, last or '')
+		kind, other = None, self.names.get(key)
+		if other is not None:
+			kind = EXACT
+		else:
+			for block in blockKeys(key):
+				for candidate in self.blocks.get(block, ()):
+					if isNear(key, candidate):
+						kind, other = NEAR, self.names[candidate]
+						break
+				if kind is not None:
+					break
+		name = ' '.join(filter(None, (first, last)))
+		self._add(key, {'guest': None, 'row': row, 'invitation': None, 'name': name})
+		if kind is None:
+			return None
+		match = {'row': row, 'name': name, 'kind': kind, 'matches': other['name'],
+			'guest': other['guest'], 'invitation': other['invitation'], 'matches_row': other['row']}
+		self.matches.append(match)
+		return match
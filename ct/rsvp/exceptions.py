@@ -12,4 +12,34 @@ class NoEventError(Exception):
 	process that requires the event that the guests are associated with, but the
 	event is not passed in any form with them.
 	"""
-	pass
\ No newline at end of file
+	pass
+
+class GuestImportError(Exception):
+	"""
+	Raised when a batch of uploaded guest rows fails validation. The whole
+	import is rolled back, so the event is left exactly as it was before.
+	`errors` is a list of (row number, {field: [messages]}) tuples, and `batch`
+	is the (1-based) number of the first batch bad rows were found in, if any.
+	"""
+	def __init__(self, errors, batch=None):
+		self.errors = errors
+		self.batch = batch
+		message = '{0} invalid row(s)'.format(len(errors))
+		if batch is not None:
+			message += ', the first in batch {0}'.format(batch)
+		super(GuestImportError, self).__init__(message + '.')
+
+class PlusOneError(Exception):
+	"""
+	Raised when an RSVP answer brings more plus-ones than the guest is allowed
+	(see EventGuest.respond). Nothing was written.
+	"""
+	pass
+
+class StaleInvitationError(Exception):
+	"""
+	Raised when RSVP answers were made against an older version of an
+	invitation than the one now stored (see EventGuest.respond). Nothing was
+	written; fetch the invitation again and resubmit.
+	"""
+	pass
@@ -1,5 +1,13 @@
 from django import forms
 
+from .importer import GuestImporter
+
 class UploadFileForm(forms.Form):
     event = forms.IntegerField()
     csvfile = forms.FileField()
+    background = forms.BooleanField(required=False)
+    duplicates = forms.ChoiceField(required=False, initial=GuestImporter.FLAG, choices=(
+        (GuestImporter.FLAG, 'Load them, but list them'),
+        (GuestImporter.SKIP_EXACT, "Don't load exact duplicates"),
+    ))
+    dry_run = forms.BooleanField(required=False)
@@ -0,0 +1,229 @@
+"""
+Bulk loading of guest lists into an event.
+
+The upload view used to build and save one EventGuest per row, which meant one
+INSERT (and one autocommit) per guest. GuestImporter instead pulls rows off the
+uploadRowToDict generator a batch at a time, cleans them with the same rules as
+EventGuest.clean, and writes each batch with a single bulk_create. Everything
+happens inside one transaction, so a bad row rolls back the whole import. The
+rest of the file is still checked, so the GuestImportError lists every bad row,
+including ones the reader couldn't parse (see reader.py).
+On "Code" events the new invitations get their codes in the same transaction.
+"""
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import live, search
+from .duplicates import DuplicateFinder, EXACT
+from .exceptions import GuestImportError
+from .models import EventGuest, InvitationCode
+from .reader import FIELDS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = getattr(settings, 'RSVP_IMPORT_BATCH_SIZE', 500)
+
+# Values of the "Same Group" column that mean "start a new invitation."
+FALSE_EXTENDS = {'n', 'f', 'no', 'false', ''}
+
+
+class ImportStats(object):
+	"""
+	Row counts and per-phase wall clock timings (in seconds) for one import.
+
+	Phases are "parse" (pulling rows off the reader), "clean" (building and
+	validating guests) and "write" (bulk inserts).
+	"""
+	PHASES = ('parse', 'clean', 'write')
+
+	def __init__(self):
+		self.rows_read = 0
+		self.rows_skipped = 0
+		self.duplicates = [] # See duplicates.DuplicateFinder.check.
+		self.duplicates_skipped = 0
+		self.guests_created = 0
+		self.invitations_created = 0
+		self.batches = 0
+		self.timings = OrderedDict((phase, 0.0) for phase in self.PHASES)
+		self.total_time = 0.0
+
+	@contextmanager
+	def phase(self, name):
+		started = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.timings[name] += time.perf_counter() - started
+
+	@property
+	def rows_per_second(self):
+		if not self.total_time:
+			return 0.0
+		return self.rows_read / self.total_time
+
+	def as_dict(self):
+		return OrderedDict([
+			('rows_read', self.rows_read),
+			('rows_skipped', self.rows_skipped),
+			('duplicates', len(self.duplicates)),
+			('duplicates_skipped', self.duplicates_skipped),
+			('guests_created', self.guests_created),
+			('invitations_created', self.invitations_created),
+			('batches', self.batches),
+			('timings', OrderedDict(self.timings)),
+			('total_time', self.total_time),
+			('rows_per_second', self.rows_per_second),
+		])
+
+
+class GuestImporter(object):
+	"""
+	Loads an iterable of row dicts (as produced by views.uploadRowToDict) into
+	an event. Usage:
+
+		stats = GuestImporter(event).run(uploadRowToDict(fileobj))
+
+	Raises GuestImportError, after rolling back, if any row fails validation
+	or, when rows has an errors list like reader.GuestFileReader, couldn't be
+	read.
+
+	Rows repeating a guest already on the event, or an earlier row, end up in
+	stats.duplicates (see duplicates.py). With duplicates=SKIP_EXACT, exact
+	duplicates aren't created; with FLAG they are; with None nobody looks. A
+	dry_run does the whole import, reports and then rolls it back.
+	"""
+	FLAG, SKIP_EXACT = 'flag', 'skip'
+
+	def __init__(self, event, batch_size=None, duplicates=FLAG, dry_run=False):
+		self.event = event
+		self.batch_size = batch_size or DEFAULT_BATCH_SIZE
+		self.duplicates = duplicates
+		self.dry_run = dry_run
+		self.invitation = None
+		self.firstInvitation = None
+
+	def run(self, rows, progress=None):
+		"""
+		Imports rows and returns an ImportStats. If given, progress is called
+		with the running ImportStats after each batch is written.
+		"""
+		stats = ImportStats()
+		started = time.perf_counter()
+		unreadable = getattr(rows, 'errors', [])
+		rows = enumerate(rows)
+		with transaction.atomic():
+			self.invitation = self.firstInvitation = None
+			self.errors, self.firstBadBatch = [], None
+			self.finder = DuplicateFinder(self.event.pk) if self.duplicates else None
+			while True:
+				with stats.phase('parse'):
+					batch = self._read_batch(rows)
+				if not batch:
+					break
+				stats.batches += 1
+				# Rows of the file, header and blank lines included, when the reader numbers them.
+				stats.rows_read = batch[-1][1].get('row', stats.rows_read + len(batch))
+				with stats.phase('clean'):
+					guests = self._clean_batch(batch, stats)
+				if self.errors or unreadable:
+					continue # It's all getting rolled back, just keep checking.
+				with stats.phase('write'):
+					EventGuest.objects.bulk_create(guests)
+				stats.guests_created += len(guests)
+				if progress is not None:
+					stats.total_time = time.perf_counter() - started
+					progress(stats)
+			if self.errors or unreadable:
+				raise GuestImportError(sorted(self.errors + unreadable, key=lambda error: error[0]),
+					batch=self.firstBadBatch)
+			if self.finder is not None:
+				stats.duplicates = self.finder.matches
+			if self.dry_run:
+				transaction.set_rollback(True)
+			elif self.firstInvitation is not None and self.event.rsvp_method == InvitationCode.RSVP_METHOD:
+				InvitationCode.generate(self.event.pk, self.firstInvitation, self.invitation)
+		if self.firstInvitation is not None and not self.dry_run:
+			search.invitations_changed(self.event.pk, self.firstInvitation, self.invitation)
+			live.publish(self.event.pk)
+		stats.total_time = time.perf_counter() - started
+		logger.info('%s %d guests (%d invitations) into event %s in %.2fs: %s',
+			'Dry run of' if self.dry_run else 'Imported', stats.guests_created, stats.invitations_created, self.event.pk,
+			stats.total_time, dict(stats.timings))
+		return stats
+
+	def _read_batch(self, rows):
+		batch = []
+		for item in rows:
+			batch.append(item)
+			if len(batch) >= self.batch_size:
+				break
+		return batch
+
+	def _clean_batch(self, batch, stats):
+		rows = [(index, row) for index, row in batch
+			if not (self._is_header(index, row) or self._is_blank(row))]
+		stats.rows_skipped += len(batch) - len(rows)
+		starts = [self._starts_invitation(row, position) for position, (index, row) in enumerate(rows)]
+
+		# One round trip for every invitation this batch opens.
+		newInvitations = sum(starts)
+		if newInvitations:
+			nextNumber = EventGuest.nextFreeInvitation(self.event, count=newInvitations)
+			if self.firstInvitation is None:
+				self.firstInvitation = nextNumber
+			stats.invitations_created += newInvitations
+
+		guests = []
+		errors = []
+		for (index, row), startsInvitation in zip(rows, starts):
+			if startsInvitation:
+				self.invitation = nextNumber
+				nextNumber += 1
+			guest = self._build_guest(row)
+			try:
+				guest.clean() # Same rules as every other path into the model.
+				guest.clean_fields(exclude=['event'])
+			except ValidationError as e:
+				errors.append((row.get('row', index + 1), e.message_dict))
+				continue
+			if self.finder is not None:
+				match = self.finder.check(row.get('row', index + 1), guest.first, guest.last)
+				if match is not None and match['kind'] == EXACT and self.duplicates == self.SKIP_EXACT:
+					stats.duplicates_skipped += 1
+					continue
+			guests.append(guest)
+		if errors:
+			self.errors.extend(errors)
+			if self.firstBadBatch is None:
+				self.firstBadBatch = stats.batches
+		return guests
+
+	def _starts_invitation(self, row, position):
+		if self.invitation is None and position == 0:
+			return True
+		return row['extends'].strip().lower() in FALSE_EXTENDS
+
+	def _build_guest(self, row):
+		try:
+			plusOne = int(row['plusOne'])
+		except ValueError:
+			plusOne = 0
+		return EventGuest(event=self.event, status=0, invitation=self.invitation,
+			pfx=row['pfx'], first=row['first'], last=row['last'], plusOne=plusOne)
+
+	@staticmethod
+	def _is_header(index, row):
+		#CSV headers aren't guests. GuestFileReader (whose rows carry a 'row'
+		# number) has already dropped any header, so its first row is a guest.
+		return (index == 0 and 'row' not in row and 'first' in row['first'].lower()
+			and 'last' in row['last'].lower())
+
+	@staticmethod
+	def _is_blank(row):
+		return not any(row[field].strip() for field in FIELDS)
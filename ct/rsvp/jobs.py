@@ -0,0 +1,233 @@
+"""
+Background guest list imports.
+
+A big upload used to be loaded inside the request, tying up a gunicorn worker
+while the browser waited. In job mode the upload view spools the file to disk,
+creates an ImportJob and returns its id straight away; a thread in the same
+process then runs the file through the normal GuestImporter.
+
+An import holds the database's write lock from its first batch to its commit,
+and with SQLite that lock covers every table, so imports can't usefully run side
+by side, whatever event they're for. Each worker process runs its jobs one at a
+time, in the order they were submitted. Workers don't know about each other's
+jobs, though, so one that can't get the lock within the busy timeout (the
+database is locked) puts its job back at the end of its queue and tries again
+RSVP_IMPORT_RETRY_SECONDS later, up to RSVP_IMPORT_LOCK_RETRIES times, rather
+than failing it. The job shows as "Queued" in between.
+
+While a job runs, its progress is written to a small JSON file next to the
+spooled upload, so any worker process can answer status polls.
+
+A thread rather than a process: imports spend their time in the database, and
+a thread doesn't need Django set up again. Jobs that die with their worker
+process stay "Running"; re-upload them.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, OperationalError
+from django.utils import timezone
+
+from .exceptions import GuestImportError
+from .importer import GuestImporter
+from .models import ImportJob
+from .reader import GuestFileReader
+
+logger = logging.getLogger(__name__)
+
+SPOOL_DIR = getattr(settings, 'RSVP_IMPORT_SPOOL_DIR',
+	os.path.join(tempfile.gettempdir(), 'cheekyteak-imports'))
+LOCK_RETRIES = getattr(settings, 'RSVP_IMPORT_LOCK_RETRIES', 10)
+RETRY_SECONDS = getattr(settings, 'RSVP_IMPORT_RETRY_SECONDS', 30)
+
+
+class SynchronousExecutor(object):
+	"""
+	Runs jobs on the spot. Used when settings.RSVP_IMPORT_JOBS_EAGER is on, e.g.
+	in tests, where other threads can't see the test's transaction.
+	"""
+	def submit(self, fn, *args, **kwargs):
+		fn(*args, **kwargs)
+
+
+_executor = None
+_lock = threading.Lock()
+_queue = deque() # Job ids waiting behind the one running in this process.
+_running = False
+
+
+def getExecutor():
+	global _executor
+	if getattr(settings, 'RSVP_IMPORT_JOBS_EAGER', False):
+		return SynchronousExecutor()
+	with _lock:
+		if _executor is None:
+			_executor = ThreadPoolExecutor(max_workers=1)
+	return _executor
+
+
+def spool(uploadedFile):
+	"""
+	Copies an uploaded file to the spool directory, chunk by chunk, and returns
+	its path.
+	"""
+	if not os.path.isdir(SPOOL_DIR):
+		os.makedirs(SPOOL_DIR, exist_ok=True)
+	path = os.path.join(SPOOL_DIR, '{0}.upload'.format(uuid.uuid4().hex))
+	with open(path, 'wb') as out:
+		for chunk in uploadedFile.chunks():
+			out.write(chunk)
+	return path
+
+
+def submit(job):
+	"""
+	Queues a job: runs it straight away unless another job is running in this
+	process, in which case it waits for that one and any queued before it.
+	"""
+	global _running
+	with _lock:
+		if _running:
+			_queue.append(job.pk)
+			return
+		_running = True
+	getExecutor().submit(_runQueue, job.pk)
+
+
+def isLocked(error):
+	return isinstance(error, OperationalError) and 'locked' in str(error)
+
+
+def _runQueue(jobId):
+	global _running
+	tries = {}
+	while jobId is not None:
+		tries[jobId] = tries.get(jobId, 0) + 1
+		lastTry = tries[jobId] > LOCK_RETRIES
+		try:
+			requeue = runJob(jobId, lastTry).status == ImportJob.QUEUED
+		except Exception as e:
+			requeue = isLocked(e) and not lastTry
+			if not requeue:
+				logger.exception('Import job %s crashed.', jobId)
+		finally:
+			if not getattr(settings, 'RSVP_IMPORT_JOBS_EAGER', False):
+				connection.close() # Worker threads get their own connections.
+		with _lock:
+			if requeue:
+				_queue.append(jobId)
+			if _queue:
+				jobId = _queue.popleft()
+			else:
+				_running = False
+				jobId = None
+		if requeue:
+			# Another worker process is importing; give it time to finish.
+			time.sleep(RETRY_SECONDS)
+
+
+def progressPath(job):
+	return job.path + '.progress'
+
+
+def readProgress(job):
+	try:
+		with open(progressPath(job)) as f:
+			return json.load(f)
+	except (IOError, ValueError):
+		return None
+
+
+def _writeProgress(job, stats):
+	# Write then rename, so pollers never see half a file.
+	path = progressPath(job)
+	with open(path + '.tmp', 'w') as f:
+		json.dump({'rows_processed': stats.rows_read, 'guests_created': stats.guests_created}, f)
+	os.replace(path + '.tmp', path)
+
+
+def countRows(path):
+	rows = 0
+	with open(path, 'rb') as f:
+		for block in iter(lambda: f.read(1 << 20), b''):
+			rows += block.count(b'\n')
+	return rows
+
+
+def runJob(jobId, lastTry=True):
+	"""
+	Loads one queued job's file into its event and records how it went. If the
+	database stayed locked and it isn't the lastTry, the job goes back to
+	"Queued" with its file kept for another go.
+	"""
+	job = ImportJob.objects.select_related('event').get(pk=jobId)
+	job.status = ImportJob.RUNNING
+	job.started = timezone.now()
+	job.total_rows = countRows(job.path)
+	job.save()
+	try:
+		with open(job.path, 'rb') as upload:
+			importer = GuestImporter(job.event, duplicates=job.duplicates or None)
+			stats = importer.run(GuestFileReader(upload),
+				progress=lambda stats: _writeProgress(job, stats))
+	except GuestImportError as e:
+		job.status = ImportJob.FAILED
+		job.errors = json.dumps([{'row': row, 'errors': fields} for row, fields in e.errors])
+	except Exception as e:
+		if isLocked(e) and not lastTry:
+			logger.warning('Import job %s found the database locked, requeueing it.', job.pk)
+			job.status, job.started = ImportJob.QUEUED, None
+			job.save()
+			return job
+		job.status = ImportJob.FAILED
+		job.errors = json.dumps([{'row': None, 'errors': {'__all__': [str(e)]}}])
+		logger.exception('Import job %s failed.', job.pk)
+	else:
+		job.status = ImportJob.DONE
+		job.rows_processed = stats.rows_read
+		job.guests_created = stats.guests_created
+		job.duplicate_rows = json.dumps(stats.duplicates)
+	job.finished = timezone.now()
+	job.save()
+	for path in (job.path, progressPath(job)):
+		if os.path.exists(path):
+			os.remove(path)
+	return job
+
+
+def jobStatus(job):
+	"""
+	What the status endpoint reports: where the job is, how fast it's going
+	and, while it's running, a rough ETA.
+	"""
+	processed, created = job.rows_processed, job.guests_created
+	if job.status == ImportJob.RUNNING:
+		progress = readProgress(job) or {}
+		processed = progress.get('rows_processed', processed)
+		created = progress.get('guests_created', created)
+	end = job.finished or timezone.now()
+	elapsed = (end - job.started).total_seconds() if job.started else 0
+	rate = processed / elapsed if elapsed > 0 else 0
+	eta = None
+	if job.status == ImportJob.RUNNING and rate and job.total_rows is not None:
+		eta = max(job.total_rows - processed, 0) / rate
+	return {
+		'id': str(job.pk),
+		'event': job.event_id,
+		'status': job.get_status_display(),
+		'total_rows': job.total_rows,
+		'rows_processed': processed,
+		'guests_created': created,
+		'rows_per_second': rate,
+		'eta_seconds': eta,
+		'errors': json.loads(job.errors) if job.errors else [],
+		'duplicates': json.loads(job.duplicate_rows) if job.duplicate_rows else [],
+	}
@@ -0,0 +1,179 @@
+"""
+Live RSVP updates for coordinators, as a server-sent event stream. See
+views.eventStream for the endpoint.
+
+The serializers, views and the importer call publish(eventId) right after
+their writes. That wakes every stream this worker process has open for the
+event, and each stream then reads what changed from the change feed
+(views.eventChanges) since the cursor it last sent. So notifications carry
+nothing but "look again", and the change feed stays the one source of truth:
+
+* Django 1.8 has no on_commit hook, so publish() can run before an enclosing
+  transaction commits. A stream woken that early doesn't see the write yet and
+  doesn't move its cursor, so it picks the write up at its next poll instead.
+  Changes can come late that way, but they aren't lost.
+
+* Writes made in other gunicorn workers can't reach this process's hub, so a
+  stream that hears nothing for RSVP_STREAM_POLL_SECONDS checks the event's
+  version itself. Local writes show up at once, everything else within the poll
+  interval. No broker needed.
+* Each subscriber buffers at most RSVP_STREAM_BUFFER notifications. When a
+  slow consumer lets it fill up, older notifications are dropped. Nothing is
+  lost by that, since the next read covers everything since the stream's
+  cursor. A subscriber that still hasn't read anything RSVP_STREAM_STALL_SECONDS
+  later is dropped from the hub altogether, and its stream ends.
+* A stream ends after RSVP_STREAM_MAX_SECONDS either way, so with sync workers
+  an open stream only holds a worker for so long. EventSource reconnects on its
+  own and sends the last id it saw as Last-Event-ID, which is a change feed
+  cursor, so it carries on where it left off. Use gthread or gevent workers if
+  coordinators keep many streams open.
+"""
+import json
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+
+BUFFER = getattr(settings, 'RSVP_STREAM_BUFFER', 64)
+POLL_SECONDS = getattr(settings, 'RSVP_STREAM_POLL_SECONDS', 5)
+STALL_SECONDS = getattr(settings, 'RSVP_STREAM_STALL_SECONDS', 30)
+MAX_SECONDS = getattr(settings, 'RSVP_STREAM_MAX_SECONDS', 60)
+RETRY_MILLISECONDS = 3000
+
+
+class Subscription(object):
+	"""
+	One open stream's mailbox. publish() fills it, the stream drains it.
+	"""
+
+	def __init__(self, eventId, size=BUFFER):
+		self.eventId = eventId
+		self.pending = deque(maxlen=size)
+		self.condition = threading.Condition()
+		self.closed = False
+		self.coalesced = 0
+		self.drained = time.monotonic()
+
+	def put(self, notification):
+		"""
+		Returns False once the subscriber has stalled for good.
+		"""
+		with self.condition:
+			if len(self.pending) == self.pending.maxlen:
+				if time.monotonic() - self.drained > STALL_SECONDS:
+					self.closed = True
+					self.condition.notify()
+					return False
+				self.coalesced += 1
+			self.pending.append(notification)
+			self.condition.notify()
+			return True
+
+	def wait(self, timeout):
+		"""
+		Waits up to timeout seconds for notifications and returns them all, or
+		[] if none came.
+		"""
+		with self.condition:
+			if not self.pending and not self.closed:
+				self.condition.wait(timeout)
+			notifications = list(self.pending)
+			self.pending.clear()
+			self.drained = time.monotonic()
+			return notifications
+
+
+class Hub(object):
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.subscribers = {}
+		self.published = self.disconnected = 0
+
+	def subscribe(self, eventId, size=BUFFER):
+		subscription = Subscription(int(eventId), size)
+		with self.lock:
+			self.subscribers.setdefault(subscription.eventId, set()).add(subscription)
+		return subscription
+
+	def unsubscribe(self, subscription):
+		with self.lock:
+			subscribers = self.subscribers.get(subscription.eventId)
+			if subscribers is not None:
+				subscribers.discard(subscription)
+				if not subscribers:
+					del self.subscribers[subscription.eventId]
+
+	def publish(self, eventId):
+		eventId = int(eventId)
+		notification = time.monotonic()
+		with self.lock:
+			subscribers = list(self.subscribers.get(eventId, ()))
+			self.published += 1
+		for subscription in subscribers:
+			if not subscription.put(notification):
+				self.unsubscribe(subscription)
+				with self.lock:
+					self.disconnected += 1
+
+	def report(self):
+		with self.lock:
+			return {
+				'events': len(self.subscribers),
+				'subscribers': sum(len(subs) for subs in self.subscribers.values()),
+				'published': self.published,
+				'disconnected': self.disconnected,
+			}
+
+
+hub = Hub()
+
+
+def publish(eventId):
+	"""
+	Call after guests on an event are created, changed or deleted, ideally
+	once the transaction has committed (see above for when it hasn't).
+	"""
+	hub.publish(eventId)
+
+
+def message(event, data, cursor=None):
+	lines = []
+	if cursor is not None:
+		lines.append('id: {0}'.format(cursor))
+	lines.append('event: {0}'.format(event))
+	lines.append('data: {0}'.format(json.dumps(data, cls=JSONEncoder, separators=(',', ':'))))
+	return '\n'.join(lines) + '\n\n'
+
+
+def stream(eventId, cursor, changes, maxSeconds=MAX_SECONDS, pollSeconds=POLL_SECONDS):
+	"""
+	Generates the text/event-stream body, starting from a change feed cursor.
+	changes(since) returns the change feed payload for the event since then,
+	or None once the event is gone, which ends the stream with a "gone" event.
+	"""
+	subscription = hub.subscribe(eventId)
+	try:
+		deadline = time.monotonic() + maxSeconds
+		yield 'retry: {0}\n\n'.format(RETRY_MILLISECONDS)
+		yield message('ready', {'cursor': cursor}, cursor)
+		while True:
+			# Look whether or not we were notified: the write may have come from
+			# another worker process.
+			payload = changes(cursor)
+			if payload is None:
+				yield message('gone', {'cursor': cursor}, cursor)
+				return
+			if payload['reset'] or payload['guests'] or payload['deleted']:
+				yield message('changes', payload, payload['cursor'])
+			else:
+				yield ': keepalive\n\n'
+			cursor = payload['cursor']
+			remaining = deadline - time.monotonic()
+			if remaining <= 0 or subscription.closed:
+				return
+			subscription.wait(min(pollSeconds, remaining))
+	finally:
+		hub.unsubscribe(subscription)
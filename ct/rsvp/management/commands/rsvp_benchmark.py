@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ct.rsvp.benchmark import Benchmark, DEFAULT_SIZES, dumps, parseSizes
+
+
+class Command(BaseCommand):
+	help = ('Times the RSVP hot paths (upload, invitation numbering, serialization, name '
+		'lookup) against synthetic events and prints the results as JSON.')
+
+	def add_arguments(self, parser):
+		parser.add_argument('--guests', nargs='+', type=int, default=[1000, 10000],
+			help='Guest counts to run, one synthetic event each.')
+		parser.add_argument('--invitation-sizes', default=None,
+			help='Invitation size distribution as size:weight pairs, e.g. "1:40,2:45,4:15". '
+				'Defaults to {0}.'.format(','.join('{0}:{1}'.format(*pair)
+					for pair in DEFAULT_SIZES.items())))
+		parser.add_argument('--seed', type=int, default=0)
+		parser.add_argument('--lookups', type=int, default=200,
+			help='Name lookups to time per event.')
+		parser.add_argument('--allocations', type=int, default=200,
+			help='nextFreeInvitation calls to time per event.')
+		parser.add_argument('--no-memory', action='store_true', default=False,
+			help="Don't trace memory. tracemalloc slows Python code down, so wall times "
+				'are closer to production without it.')
+		parser.add_argument('--keep', action='store_true', default=False,
+			help='Leave the synthetic events in the database.')
+		parser.add_argument('--output', default=None,
+			help='Write the JSON here instead of stdout.')
+
+	def handle(self, *args, **options):
+		try:
+			sizes = parseSizes(options['invitation_sizes']) if options['invitation_sizes'] else None
+		except ValueError:
+			raise CommandError('--invitation-sizes should look like "1:40,2:45,4:15".')
+		if any(count < 1 for count in options['guests']):
+			raise CommandError('Guest counts must be positive.')
+
+		results = Benchmark(options['guests'], sizes=sizes, seed=options['seed'],
+			lookups=options['lookups'], allocations=options['allocations'],
+			traceMemory=not options['no_memory'], keep=options['keep']).run()
+		if options['output']:
+			with open(options['output'], 'w') as f:
+				f.write(dumps(results))
+			self.stderr.write('Wrote {0}'.format(options['output']))
+		else:
+			self.stdout.write(dumps(results))
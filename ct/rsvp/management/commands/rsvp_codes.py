@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from ct.core.models import Event
+from ct.rsvp.models import InvitationCode
+
+
+class Command(BaseCommand):
+	help = ('Gives every invitation on "Code" events that lacks an invitation code a new one. '
+		'Run it after switching an event to the Code RSVP method.')
+
+	def add_arguments(self, parser):
+		parser.add_argument('events', nargs='*', type=int,
+			help='Event primary keys. Defaults to every Code event.')
+
+	def handle(self, *args, **options):
+		events = Event.objects.filter(rsvp_method=InvitationCode.RSVP_METHOD)
+		if options['events']:
+			events = events.filter(pk__in=options['events'])
+		for eventId in events.values_list('pk', flat=True):
+			created = InvitationCode.generate(eventId)
+			self.stdout.write('Event {0}: {1} new code(s).'.format(eventId, created))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from ct.rsvp.models import GuestTombstone, TOMBSTONE_MAX_AGE_DAYS
+
+
+class Command(BaseCommand):
+	help = ('Deletes change feed tombstones older than RSVP_TOMBSTONE_MAX_AGE_DAYS. Coordinator '
+		'apps that last synced before them will do a full resync. Run it from cron.')
+
+	def add_arguments(self, parser):
+		parser.add_argument('--days', type=int, default=TOMBSTONE_MAX_AGE_DAYS,
+			help='Maximum tombstone age in days. Defaults to {0}.'.format(TOMBSTONE_MAX_AGE_DAYS))
+
+	def handle(self, *args, **options):
+		removed = GuestTombstone.compact(options['days'])
+		self.stdout.write('Compacted {0} tombstone(s).'.format(removed))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ct.rsvp.models import EventSummary
+
+
+class Command(BaseCommand):
+	help = ('Recounts the EventSummary response counters from the guest table. '
+		'With --check, only reports events whose stored counters are wrong.')
+
+	def add_arguments(self, parser):
+		parser.add_argument('events', nargs='*', type=int,
+			help='Event primary keys. Defaults to every event.')
+		parser.add_argument('--check', action='store_true', default=False,
+			help="Compare stored counters against the guest table; don't write anything.")
+
+	def handle(self, *args, **options):
+		eventIds = options['events'] or None
+		if not options['check']:
+			EventSummary.rebuild(eventIds)
+			self.stdout.write('Rebuilt response counters.')
+			return
+
+		actual = EventSummary.count(eventIds)
+		summaries = EventSummary.objects.all()
+		if eventIds is not None:
+			summaries = summaries.filter(event_id__in=eventIds)
+		stored = {summary.event_id: summary.counters() for summary in summaries}
+		empty = dict.fromkeys(EventSummary.COUNTERS, 0)
+		wrong = 0
+		for eventId in sorted(set(stored) | set(actual)):
+			expected = actual.get(eventId, empty)
+			if stored.get(eventId) != expected:
+				wrong += 1
+				self.stdout.write('Event {0}: stored {1}, counted {2}'.format(
+					eventId, stored.get(eventId), expected))
+		if wrong:
+			raise CommandError('{0} event(s) have wrong counters. Run without --check to fix.'.format(wrong))
+		self.stdout.write('All {0} event counters match.'.format(len(stored)))
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventGuest',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('status', models.IntegerField(default=0, choices=[(0, 'Not Responded'), (1, 'Attending'), (2, 'Not Attending')])),
+                ('invitation', models.IntegerField()),
+                ('pfx', models.CharField(max_length=7, blank=True, null=True)),
+                ('first', models.CharField(max_length=50)),
+                ('last', models.CharField(max_length=50, blank=True, null=True)),
+                ('plusOne', models.IntegerField(default=0)),
+                ('orderer', models.IntegerField(default=0)),
+                ('event', models.ForeignKey(to='core.Event')),
+            ],
+            options={
+                'ordering': ('invitation', 'orderer'),
+            },
+        ),
+    ]
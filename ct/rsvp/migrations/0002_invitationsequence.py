@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def backfill_sequences(apps, schema_editor):
+    EventGuest = apps.get_model('rsvp', 'EventGuest')
+    InvitationSequence = apps.get_model('rsvp', 'InvitationSequence')
+    tops = EventGuest.objects.order_by().values('event').annotate(top=Max('invitation'))
+    InvitationSequence.objects.bulk_create([
+        InvitationSequence(event_id=row['event'], next_invitation=row['top'] + 1)
+        for row in tops
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('rsvp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvitationSequence',
+            fields=[
+                ('event', models.OneToOneField(primary_key=True, serialize=False, related_name='invitation_sequence', to='core.Event')),
+                ('next_invitation', models.IntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(backfill_sequences, migrations.RunPython.noop),
+    ]
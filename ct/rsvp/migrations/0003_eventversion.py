@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def create_versions(apps, schema_editor):
+    Event = apps.get_model('core', 'Event')
+    EventVersion = apps.get_model('rsvp', 'EventVersion')
+    EventVersion.objects.bulk_create([
+        EventVersion(event_id=pk, version=1)
+        for pk in Event.objects.values_list('pk', flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('rsvp', '0002_invitationsequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventVersion',
+            fields=[
+                ('event', models.OneToOneField(primary_key=True, serialize=False, related_name='version', to='core.Event')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def count_responses(apps, schema_editor):
+    Event = apps.get_model('core', 'Event')
+    EventGuest = apps.get_model('rsvp', 'EventGuest')
+    EventSummary = apps.get_model('rsvp', 'EventSummary')
+    summaries = {pk: EventSummary(event_id=pk) for pk in Event.objects.values_list('pk', flat=True)}
+    rows = EventGuest.objects.order_by().values('event_id', 'status').annotate(
+        guests=Count('id'), plusOnes=Sum('plusOne'))
+    statusCounters = {0: 'not_responded', 1: 'attending', 2: 'not_attending'}
+    for row in rows:
+        summary = summaries[row['event_id']]
+        plusOnes = row['plusOnes'] or 0
+        if row['status'] in statusCounters:
+            setattr(summary, statusCounters[row['status']], row['guests'])
+        summary.plus_ones_invited += plusOnes
+        if row['status'] == 1:
+            summary.plus_ones += plusOnes
+    EventSummary.objects.bulk_create(summaries.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('rsvp', '0003_eventversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventSummary',
+            fields=[
+                ('event', models.OneToOneField(primary_key=True, serialize=False, related_name='summary', to='core.Event')),
+                ('not_responded', models.IntegerField(default=0)),
+                ('attending', models.IntegerField(default=0)),
+                ('not_attending', models.IntegerField(default=0)),
+                ('plus_ones', models.IntegerField(default=0)),
+                ('plus_ones_invited', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_responses, migrations.RunPython.noop),
+    ]
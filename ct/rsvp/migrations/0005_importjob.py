@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('rsvp', '0004_eventsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, serialize=False)),
+                ('status', models.SmallIntegerField(default=0, choices=[(0, 'Queued'), (1, 'Running'), (2, 'Done'), (3, 'Failed')])),
+                ('path', models.CharField(max_length=255)),
+                ('total_rows', models.IntegerField(blank=True, null=True)),
+                ('rows_processed', models.IntegerField(default=0)),
+                ('guests_created', models.IntegerField(default=0)),
+                ('errors', models.TextField(blank=True, default='')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('started', models.DateTimeField(blank=True, null=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('event', models.ForeignKey(to='core.Event')),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import random
+
+
+def code_existing_invitations(apps, schema_editor):
+    # Historical models don't have InvitationCode.generate, so this repeats it.
+    EventGuest = apps.get_model('rsvp', 'EventGuest')
+    InvitationCode = apps.get_model('rsvp', 'InvitationCode')
+    alphabet, rng, used = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789', random.SystemRandom(), set()
+    pairs = EventGuest.objects.filter(event__rsvp_method=1).order_by(
+        'event', 'invitation').values_list('event_id', 'invitation').distinct()
+    codes = []
+    for eventId, invitation in pairs:
+        code = None
+        while code is None or code in used:
+            code = ''.join(rng.choice(alphabet) for x in range(10))
+        used.add(code)
+        codes.append(InvitationCode(event_id=eventId, invitation=invitation, code=code))
+    InvitationCode.objects.bulk_create(codes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('rsvp', '0005_importjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvitationCode',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('invitation', models.IntegerField()),
+                ('code', models.CharField(max_length=10, unique=True)),
+                ('event', models.ForeignKey(to='core.Event')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='invitationcode',
+            unique_together=set([('event', 'invitation')]),
+        ),
+        migrations.RunPython(code_existing_invitations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rsvp', '0006_invitationcode'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='eventguest',
+            index_together=set([('event', 'invitation', 'orderer', 'id')]),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def stamp_existing_guests(apps, schema_editor):
+    # Existing guests count as changed at their event's current version.
+    EventGuest = apps.get_model('rsvp', 'EventGuest')
+    EventVersion = apps.get_model('rsvp', 'EventVersion')
+    for eventId, version in EventVersion.objects.values_list('event_id', 'version'):
+        EventGuest.objects.filter(event_id=eventId).update(change_seq=version)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_profile_followed_events'),
+        ('rsvp', '0007_eventguest_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GuestTombstone',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('guest_id', models.IntegerField()),
+                ('invitation', models.IntegerField()),
+                ('change_seq', models.BigIntegerField()),
+                ('deleted', models.DateTimeField(default=django.utils.timezone.now)),
+                ('event', models.ForeignKey(to='core.Event')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='eventguest',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='eventversion',
+            name='compacted_through',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(stamp_existing_guests, migrations.RunPython.noop),
+        migrations.AlterIndexTogether(
+            name='eventguest',
+            index_together=set([('event', 'change_seq'), ('event', 'invitation', 'orderer', 'id')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='guesttombstone',
+            index_together=set([('event', 'change_seq')]),
+        ),
+    ]
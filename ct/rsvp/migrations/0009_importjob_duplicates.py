@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rsvp', '0008_change_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='duplicate_rows',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='duplicates',
+            field=models.CharField(max_length=10, blank=True, default='flag'),
+        ),
+    ]
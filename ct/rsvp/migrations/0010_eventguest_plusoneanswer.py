@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rsvp', '0009_importjob_duplicates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventguest',
+            name='plusOneAnswer',
+            field=models.IntegerField(null=True, blank=True),
+        ),
+    ]
@@ -1,6 +1,198 @@
-from django.db import models
+import datetime
+import random
+import uuid
+
+from django.conf import settings
+from django.db import connection, models, transaction, IntegrityError
+from django.db.models import F, Q, Max, Case, When, Value, Count, Sum
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
 from ct.core.models import Event as ctEvent
-from .exceptions import NoEventError
+from .exceptions import NoEventError, StaleInvitationError, MixedInvitationError, PlusOneError
+
+# Guest fields that are safe to hand to public RSVP apps (no attending status).
+PUBLIC_FIELDS = ('id', 'event', 'invitation', 'pfx', 'first', 'last', 'plusOne', 'orderer')
+
+# Changing any of these moves an event's EventSummary counters.
+COUNTED_FIELDS = {'event', 'event_id', 'status', 'plusOne', 'plusOneAnswer'}
+COUNTED_ATTNAMES = ('event_id', 'status', 'plusOne', 'plusOneAnswer')
+
+# Tombstones older than this many days are compacted away (see GuestTombstone).
+TOMBSTONE_MAX_AGE_DAYS = getattr(settings, 'RSVP_TOMBSTONE_MAX_AGE_DAYS', 30)
+
+class EventGuestQuerySet(models.QuerySet):
+	"""
+	Bulk writes skip EventGuest.save/delete, so they bump the EventVersion,
+	stamp change_seq, leave tombstones and keep the EventSummary of every event
+	they touch up to date themselves.
+	"""
+
+	def bulk_create(self, objs, batch_size=None):
+		objs = list(objs)
+		with transaction.atomic(using=self.db, savepoint=False):
+			versions = EventVersion.bump_and_read({guest.event_id for guest in objs})
+			for guest in objs:
+				guest.change_seq = versions[guest.event_id]
+			objs = super(EventGuestQuerySet, self).bulk_create(objs, batch_size=batch_size)
+			EventSummary.record([(None, guest._countedState()) for guest in objs])
+			# Like save(), never hand out an invitation number that's now in use.
+			tops = {}
+			for guest in objs:
+				tops[guest.event_id] = max(tops.get(guest.event_id, 0), guest.invitation)
+			for eventId, top in tops.items():
+				InvitationSequence.observe(eventId, top)
+		return objs
+
+	def bulk_update(self, guests, fields):
+		"""
+		Writes the given fields of already-saved guests back with one
+		UPDATE ... SET field = CASE id WHEN ... END per batch, instead of one
+		save() per guest.
+		"""
+		guests = list(guests)
+		fields = [self.model._meta.get_field(name) for name in fields]
+		if not guests or not fields:
+			return 0
+		# Two parameters per guest per field, plus the id list; SQLite caps us at 999.
+		batchSize = max(1, 900 // (2 * len(fields) + 1))
+		counted = COUNTED_FIELDS.intersection(field.name for field in fields)
+		attnames = {field.attname for field in fields}
+		rows = 0
+		with transaction.atomic(using=self.db, savepoint=False):
+			for start in range(0, len(guests), batchSize):
+				batch = guests[start:start + batchSize]
+				matched = self.filter(pk__in=[guest.pk for guest in batch])
+				# What the rows hold now, not what the guests held when they were
+				# loaded, so the counters move by exact deltas even if somebody else
+				# wrote them in between.
+				before = matched._countedStates() if counted else {}
+				changes = {field.attname: Case(*[When(pk=guest.pk,
+						then=Value(getattr(guest, field.attname))) for guest in batch],
+					output_field=field) for field in fields}
+				rows += matched._tracked_update(changes, recount=False)
+				EventSummary.record([(before[guest.pk], guest._countedState(before[guest.pk],
+					attnames)) for guest in batch if guest.pk in before])
+		return rows
+	bulk_update.alters_data = True
+
+	def update(self, **kwargs):
+		return self._tracked_update(kwargs, recount=bool(COUNTED_FIELDS.intersection(kwargs)))
+	update.alters_data = True
+
+	def delete(self):
+		with transaction.atomic(using=self.db, savepoint=False):
+			doomed = list(self.order_by().values_list('id', 'event_id', 'invitation'))
+			removed = self._tallies()
+			super(EventGuestQuerySet, self).delete()
+			GuestTombstone.bury(doomed)
+			EventSummary.apply(removed, sign=-1)
+	delete.alters_data = True
+	delete.queryset_only = True
+
+	def _tracked_update(self, kwargs, recount):
+		newEventId = None
+		for key in ('event', 'event_id'):
+			if key in kwargs:
+				newEventId = getattr(kwargs[key], 'pk', kwargs[key])
+		with transaction.atomic(using=self.db, savepoint=False):
+			eventIds = self._event_ids()
+			moved = []
+			if newEventId is not None:
+				# Guests moving to another event are deletions as far as the old
+				# event's change feed goes.
+				moved = list(self.exclude(event_id=newEventId).order_by().values_list(
+					'id', 'event_id', 'invitation'))
+				eventIds.add(newEventId)
+			EventVersion.bump_many(eventIds - {row[1] for row in moved})
+			GuestTombstone.bury(moved)
+			kwargs = dict(kwargs, change_seq=EventVersion.current_sql(self.model))
+			rows = super(EventGuestQuerySet, self).update(**kwargs)
+			if recount:
+				# We don't know what the rows held before, so recount their events.
+				EventSummary.rebuild(eventIds)
+		return rows
+
+	def _countedStates(self):
+		"""
+		{id: (event id, status, plusOne, plusOneAnswer)} as the rows hold them now. Locks the
+		rows until the transaction ends, where the database can.
+		"""
+		return {row[0]: row[1:] for row in self.select_for_update().order_by().values_list(
+			'id', *COUNTED_ATTNAMES)}
+
+	def keyset_chunks(self, fields, chunk_size=2000):
+		"""
+		Yields lists of up to chunk_size value dicts, ordered by
+		(invitation, orderer, id). Each chunk is its own query that picks up
+		after the last row of the one before (WHERE (invitation, orderer, id) >
+		last row), so it costs the same at the end of a big event as at the start
+		and nothing holds a cursor open between chunks.
+		"""
+		fields = list(fields) + [key for key in ('invitation', 'orderer', 'id') if key not in fields]
+		ordered = self.order_by('invitation', 'orderer', 'id').values(*fields)
+		page = ordered
+		while True:
+			rows = list(page[:chunk_size])
+			if rows:
+				yield rows
+			if len(rows) < chunk_size:
+				return
+			page = ordered.filter(self.after(rows[-1]))
+
+	@staticmethod
+	def after(row):
+		"""
+		Q for rows sorting after row (a dict) in (invitation, orderer, id) order.
+		"""
+		invitation, orderer, pk = row['invitation'], row['orderer'], row['id']
+		# The redundant invitation >= bound lets SQLite range scan the index.
+		return Q(invitation__gte=invitation) & (Q(invitation__gt=invitation)
+			| Q(invitation=invitation, orderer__gt=orderer)
+			| Q(invitation=invitation, orderer=orderer, id__gt=pk))
+
+	def invitation_page(self, size, after=None):
+		"""
+		Keyset pagination that never splits an invitation. Returns (page, next):
+		page is this queryset narrowed to whole invitations numbered above
+		`after` (all of them, if None), starting with at least `size` guests, in
+		(invitation, orderer, id) order; next is the `after` for the following
+		page, or None on the last one.
+
+		Costs two small index lookups to find where the page ends, however deep
+		into the event it is: no OFFSET over earlier pages.
+		"""
+		rest = self.order_by('invitation', 'orderer', 'id')
+		if after is not None:
+			rest = rest.filter(invitation__gt=after)
+		boundary = list(rest.values_list('invitation', flat=True)[size - 1:size])
+		if not boundary or not rest.filter(invitation__gt=boundary[0]).exists():
+			return rest, None
+		return rest.filter(invitation__lte=boundary[0]), boundary[0]
+
+	def tallies(self):
+		"""
+		EventSummary counters for the guests in this queryset, keyed by event id.
+		"""
+		return self._tallies()
+
+	def _tallies(self):
+		rows = self.order_by().values('event_id', 'status').annotate(guests=Count('id'),
+			plusOnes=Sum('plusOne'), coming=Sum(Coalesce('plusOneAnswer', 'plusOne')))
+		counters = {}
+		for row in rows:
+			add = EventSummary.contribution(row['status'], row['plusOnes'] or 0, row['coming'] or 0,
+				row['guests'])
+			eventCounters = counters.setdefault(row['event_id'], dict.fromkeys(EventSummary.COUNTERS, 0))
+			for name, amount in add.items():
+				eventCounters[name] += amount
+		return counters
+
+	def _event_ids(self):
+		return set(self.order_by().values_list('event_id', flat=True).distinct())
+
 
 class EventGuest(models.Model):
 	"""
@@ -20,9 +212,13 @@ class EventGuest(models.Model):
 	pfx = models.CharField(max_length=7, null=True, blank=True)
 	first = models.CharField(max_length=50)
 	last = models.CharField(max_length=50, null=True, blank=True)
-	plusOne = models.IntegerField(default=0)
+	plusOne = models.IntegerField(default=0) # How many they may bring.
+	plusOneAnswer = models.IntegerField(null=True, blank=True) # How many they said, once they RSVP.
 	orderer = models.IntegerField(default=0)
+	# The event's EventVersion as of this guest's last change; see eventChanges.
+	change_seq = models.BigIntegerField(default=0, editable=False)
 
+	objects = EventGuestQuerySet.as_manager()
 
 	def clean(self):
 		"""
@@ -40,26 +236,223 @@ class EventGuest(models.Model):
 		
 
 
+	def _countedState(self, previous=None, attnames=None):
+		"""
+		(event id, status, plusOne, plusOneAnswer) as EventSummary counts this
+		guest once attnames (all of them by default) are written over previous,
+		what the row held before. Without previous, None if any weren't loaded.
+		"""
+		state = []
+		for n, name in enumerate(COUNTED_ATTNAMES):
+			if name in self.__dict__ and (attnames is None or name in attnames or previous is None):
+				state.append(self.__dict__[name])
+			elif previous is not None:
+				state.append(previous[n])
+			else:
+				return None
+		return tuple(state)
+
+
+	def save(self, *args, **kwargs):
+		attnames = kwargs.get('update_fields')
+		if attnames is not None:
+			if not attnames:
+				return # Django saves nothing, so there's nothing to keep track of.
+			# The change feed finds the write by its change_seq, so that's written too.
+			kwargs['update_fields'] = set(attnames) | {'change_seq'}
+			attnames = {self._meta.get_field(name).attname for name in attnames}
+		with transaction.atomic():
+			self.change_seq = EventVersion.bump_and_read([self.event_id])[self.event_id]
+			# What the row holds now, not what this instance was loaded with, or two
+			# requests making the same change would both count it. None if there's
+			# no row (yet), and then the save is an insert.
+			previous = None
+			if self.pk is not None:
+				previous = type(self).objects.filter(pk=self.pk)._countedStates().get(self.pk)
+			super(EventGuest, self).save(*args, **kwargs)
+			if previous is not None and previous[0] != self.event_id:
+				GuestTombstone.bury([(self.pk, previous[0], self.invitation)])
+			# Hand-numbered invitations must never be handed out again.
+			InvitationSequence.observe(self.event_id, self.invitation)
+			EventSummary.record([(previous, self._countedState(previous, attnames))])
+
+
+	def delete(self, *args, **kwargs):
+		with transaction.atomic():
+			pk = self.pk
+			previous = type(self).objects.filter(pk=pk)._countedStates().get(pk)
+			super(EventGuest, self).delete(*args, **kwargs)
+			if previous is not None:
+				GuestTombstone.bury([(pk, previous[0], self.invitation)])
+				EventSummary.record([(previous, None)])
+		from .search import guest_deleted # search imports this module.
+		guest_deleted(self.event_id if previous is None else previous[0], pk)
+
+
 	@classmethod
-	def nextFreeInvitation(cls, ev):
+	def nextFreeInvitation(cls, ev, count=1):
 		"""
 		Invitations are groups of guests, as in a foreign key relationship, except
 		an actual foreign key would be redundant and wasteful in this case. This
 		method accepts an instance of ct.core.models.Event (or one's pk) and returns 
 		the number of the next "empty" group.
+
+		The number is reserved for the caller (see InvitationSequence), so two
+		concurrent callers never get the same one. Pass count to reserve a block of
+		consecutive numbers at once; the first one is returned.
 		"""
-		if isinstance(ev, ctEvent):
-			eventInstance = ev
-		else:
-			try:
-				eventInstance = ctEvent.objects.get(pk=ev)
-			except:
-				raise NoEventError
-		guests = cls.objects.filter(event=eventInstance)
-		topInvite = max(guests, default=0, key=lambda guest: guest.invitation)
-		if isinstance(topInvite, cls):
-			return 1 + topInvite.invitation
-		return 1
+		if ev is None:
+			raise NoEventError
+		eventId = ev.pk if isinstance(ev, ctEvent) else ev
+		return InvitationSequence.reserve(eventId, count)
+
+
+	@staticmethod
+	def invitationVersion(guests):
+		"""
+		Version token for an invitation, given all of its guests. Any change to
+		a guest on it moves the newest change_seq, and so does adding one;
+		removing one changes the count.
+		"""
+		return '{0}-{1}'.format(max(guest.change_seq for guest in guests), len(guests))
+
+
+	@classmethod
+	def respond(cls, eventId, invitation, version, answers):
+		"""
+		Records a whole invitation's RSVP at once. answers is
+		{guest id: (status, plus-ones)} for guests on the invitation, and version is
+		the invitationVersion they were made against. Changed guests are written
+		with one batched UPDATE in one transaction.
+
+		Raises StaleInvitationError, writing nothing, if the invitation has moved
+		on since version, MixedInvitationError if answers names a guest who isn't
+		on it, and PlusOneError if a guest brings more plus-ones than their plusOne
+		allows. The answer goes in plusOneAnswer, so plusOne stays what they were
+		invited with. Returns how many guests changed.
+		"""
+		with transaction.atomic():
+			guests = list(cls.objects.filter(event_id=eventId, invitation=invitation))
+			if not guests or cls.invitationVersion(guests) != version:
+				raise StaleInvitationError
+			byId = {guest.pk: guest for guest in guests}
+			if not set(answers) <= set(byId):
+				raise MixedInvitationError("Not all the guests answered for are on this invitation.")
+			over = sorted(guestId for guestId, (status, plusOne) in answers.items()
+				if plusOne > byId[guestId].plusOne)
+			if over:
+				raise PlusOneError("Guests {0} can't bring that many plus-ones.".format(over))
+			changed = []
+			for guestId, (status, plusOne) in answers.items():
+				guest = byId[guestId]
+				if (guest.status, guest.plusOneAnswer) != (status, plusOne):
+					guest.status, guest.plusOneAnswer = status, plusOne
+					changed.append(guest)
+			# Only rows nobody has written since we read them get updated, so a
+			# submission racing this one can't slip in between the check and the
+			# write unnoticed.
+			newest = max(guest.change_seq for guest in guests)
+			rows = cls.objects.filter(change_seq__lte=newest).bulk_update(changed,
+				('status', 'plusOneAnswer'))
+			if rows != len(changed):
+				raise StaleInvitationError
+		return len(changed)
+
+	@classmethod
+	def arrange(cls, eventId, invitations, new=()):
+		"""
+		Puts guests on invitations, in order. invitations is
+		{number: [guest id, ...]}, the complete new order of each of those
+		existing invitations, and new is a list of guest id lists that each get
+		a freshly reserved invitation. Guests listed under an invitation they
+		aren't on move to it, orderers become 0, 1, 2... in list order, and no
+		other guest in the event is touched. Guests already in place aren't
+		written; the rest are, with one batched UPDATE in one transaction.
+
+		Raises MixedInvitationError, writing nothing, if an id isn't one of the
+		event's guests or is listed twice, a listed invitation has no guests, or
+		one of its guests was left out (list them where they're going instead),
+		and StaleInvitationError if any of the guests changed while this ran.
+		Returns (rows updated, every invitation number touched, the new ones).
+		"""
+		groups = list(invitations.values()) + list(new)
+		listed = [guestId for members in groups for guestId in members]
+		if len(set(listed)) != len(listed):
+			raise MixedInvitationError("A guest can only be listed once.")
+		with transaction.atomic(savepoint=False):
+			guests = {guest.pk: guest for guest in cls.objects.filter(event_id=eventId).filter(
+				Q(pk__in=listed) | Q(invitation__in=list(invitations)))}
+			unknown = set(listed) - set(guests)
+			if unknown:
+				raise MixedInvitationError("Guests {0} aren't on this event.".format(
+					sorted(unknown)))
+			missing = set(invitations) - {guest.invitation for guest in guests.values()}
+			if missing:
+				raise MixedInvitationError("Invitations {0} don't exist. Put guests on new "
+					"invitations with \"new\".".format(sorted(missing)))
+			leftOut = set(guestId for guestId, guest in guests.items()
+				if guest.invitation in invitations) - set(listed)
+			if leftOut:
+				raise MixedInvitationError("Guests {0} were left off their invitation. List them "
+					"under the invitation they belong on.".format(sorted(leftOut)))
+			numbers = []
+			if new:
+				first = InvitationSequence.reserve(eventId, len(new))
+				numbers = list(range(first, first + len(new)))
+			touched, changed = set(), []
+			for number, members in list(invitations.items()) + list(zip(numbers, new)):
+				for orderer, guestId in enumerate(members):
+					guest = guests[guestId]
+					if (guest.invitation, guest.orderer) != (number, orderer):
+						touched.update((guest.invitation, number))
+						guest.invitation, guest.orderer = number, orderer
+						changed.append(guest)
+			# Same guard as respond(): rows written since we read them aren't
+			# updated, and then the whole thing is rolled back.
+			newest = max(guest.change_seq for guest in guests.values()) if guests else 0
+			rows = cls.objects.filter(change_seq__lte=newest).bulk_update(changed,
+				('invitation', 'orderer'))
+			if rows != len(changed):
+				raise StaleInvitationError
+		return rows, sorted(touched), numbers
+
+	@classmethod
+	def copyGuests(cls, sourceId, targetId, statuses=None, wholeInvitations=False):
+		"""
+		Copies an event's guests onto another event with one INSERT ... SELECT,
+		so the rows never come through Python. Invitation numbers and orderers
+		are kept, statuses go back to Not Responded, plus-one answers are
+		dropped and everything else is copied as is. Pass statuses to copy only guests with one of them (say,
+		(1,) for everyone attending), and wholeInvitations to copy every guest on
+		an invitation where anybody has one.
+
+		Like bulk_create, this bumps the target's version and stamps the copies
+		with it. The caller looks after the target's EventSummary. Returns how
+		many guests were copied.
+		"""
+		quote = connection.ops.quote_name
+		table = quote(cls._meta.db_table)
+		copied = [quote(field.column) for field in cls._meta.concrete_fields
+			if field.name not in ('id', 'event', 'status', 'plusOneAnswer', 'change_seq')]
+		where, params = ['event_id = %s'], [sourceId]
+		if statuses is not None:
+			statuses = list(statuses) or [None]
+			matches = 'status IN ({0})'.format(', '.join(['%s'] * len(statuses)))
+			if wholeInvitations:
+				where.append('invitation IN (SELECT invitation FROM {0} '
+					'WHERE event_id = %s AND {1})'.format(table, matches))
+				params += [sourceId] + statuses
+			else:
+				where.append(matches)
+				params += statuses
+		with transaction.atomic(savepoint=False):
+			version = EventVersion.bump_and_read([targetId])[targetId]
+			sql = ('INSERT INTO {0} (event_id, status, change_seq, {1}) '
+				'SELECT %s, 0, %s, {1} FROM {0} WHERE {2} ORDER BY invitation, orderer, id').format(
+				table, ', '.join(copied), ' AND '.join(where))
+			with connection.cursor() as cursor:
+				cursor.execute(sql, [targetId, version] + params)
+				return cursor.rowcount
 
 
 	class Meta:
@@ -67,4 +460,416 @@ class EventGuest(models.Model):
 		"""
 		Ordering like this isn't a free operation. Can bottleneck performance, but
 		keeps you sane and this app is modest sized anyway.
+
+		Per-event reads in this order (and the keyset pages in invitation_page)
+		walk the composite index below instead of sorting.
+		"""
+		index_together = (('event', 'invitation', 'orderer', 'id'), ('event', 'change_seq'))
+
+
+class InvitationSequence(models.Model):
+	"""
+	Next unused invitation number for an event. Handing out numbers is a single
+	atomic UPDATE on this row, so it costs the same for 10 guests or 100k, and
+	concurrent callers queue on the row lock instead of racing to the same number.
+
+	Rows are created lazily from the event's highest existing invitation the
+	first time a number is needed.
+	"""
+	event = models.OneToOneField(ctEvent, primary_key=True, related_name='invitation_sequence')
+	next_invitation = models.IntegerField(default=1)
+
+	@classmethod
+	def reserve(cls, eventId, count=1):
+		"""
+		Reserves count consecutive invitation numbers for the event and returns
+		the first of them.
+		"""
+		with transaction.atomic(savepoint=False):
+			if not cls._advance(eventId, count):
+				cls._backfill(eventId)
+				cls._advance(eventId, count)
+			top = cls.objects.filter(event_id=eventId).values_list('next_invitation', flat=True)[0]
+		return top - count
+
+	@classmethod
+	def observe(cls, eventId, invitation):
+		"""
+		Moves the sequence past an invitation number that was assigned by hand.
+		"""
+		cls.objects.filter(event_id=eventId, next_invitation__lte=invitation).update(
+			next_invitation=invitation + 1)
+
+	@classmethod
+	def _advance(cls, eventId, count):
+		return cls.objects.filter(event_id=eventId).update(
+			next_invitation=F('next_invitation') + count)
+
+	@classmethod
+	def _backfill(cls, eventId):
+		if not ctEvent.objects.filter(pk=eventId).exists():
+			raise NoEventError
+		top = EventGuest.objects.filter(event_id=eventId).aggregate(
+			top=Max('invitation'))['top'] or 0
+		try:
+			with transaction.atomic():
+				cls.objects.create(event_id=eventId, next_invitation=top + 1)
+		except IntegrityError:
+			pass # Somebody else got here first, which is just as good.
+
+
+class EventVersion(models.Model):
+	"""
+	Counter bumped in the same transaction as every change to an event or its
+	guest list. Read endpoints use it as an ETag, so a client holding the
+	current version can be answered with a 304 from this one row.
+	"""
+	event = models.OneToOneField(ctEvent, primary_key=True, related_name='version')
+	version = models.BigIntegerField(default=0)
+	# Tombstones up to this version have been compacted away.
+	compacted_through = models.BigIntegerField(default=0)
+
+	@classmethod
+	def current(cls, eventId):
+		"""
+		Current version for the event, or None if it has never been bumped.
+		"""
+		return cls.objects.filter(event_id=eventId).values_list('version', flat=True).first()
+
+	@classmethod
+	def current_sql(cls, model):
+		"""
+		Expression for the current version of each row's event, so a queryset
+		update can stamp change_seq without reading versions first.
+		"""
+		return RawSQL('(SELECT {0}.version FROM {0} WHERE {0}.event_id = {1}.event_id)'.format(
+			cls._meta.db_table, model._meta.db_table), [])
+
+	@classmethod
+	def bump_and_read(cls, eventIds):
+		"""
+		Bumps each event and returns {event id: new version}.
+		"""
+		eventIds = set(eventIds)
+		if not eventIds:
+			return {}
+		cls.bump_many(eventIds)
+		return dict(cls.objects.filter(event_id__in=eventIds).values_list('event_id', 'version'))
+
+	@classmethod
+	def bump(cls, eventId):
+		if cls.objects.filter(event_id=eventId).update(version=F('version') + 1):
+			return
+		try:
+			with transaction.atomic():
+				cls.objects.create(event_id=eventId, version=1)
+		except IntegrityError:
+			cls.objects.filter(event_id=eventId).update(version=F('version') + 1)
+
+	@classmethod
+	def bump_many(cls, eventIds):
+		for eventId in eventIds:
+			cls.bump(eventId)
+
+
+@receiver(post_save, sender=ctEvent)
+def eventSaved(sender, instance, raw=False, **kwargs):
+	# Display settings ride along with the guest list, so they version it too.
+	if not raw:
+		EventVersion.bump(instance.pk)
+
+
+class GuestTombstone(models.Model):
+	"""
+	Left behind when a guest is deleted (or moved to another event), so the
+	change feed can tell clients that already have the guest to drop it.
+	change_seq is the event's version as of the deletion.
+
+	Tombstones are only needed until every client has synced past them, so
+	compact() deletes those older than TOMBSTONE_MAX_AGE_DAYS and records how
+	far it got in EventVersion.compacted_through. Clients whose cursor is
+	older than that have to start over with a full list.
+	"""
+	event = models.ForeignKey(ctEvent)
+	guest_id = models.IntegerField()
+	invitation = models.IntegerField()
+	change_seq = models.BigIntegerField()
+	deleted = models.DateTimeField(default=timezone.now)
+
+	class Meta:
+		index_together = (('event', 'change_seq'),)
+
+	@classmethod
+	def bury(cls, guests):
+		"""
+		Bumps the events of, and writes tombstones for, (guest id, event id,
+		invitation) triples that are gone.
+		"""
+		if not guests:
+			return
+		versions = EventVersion.bump_and_read({eventId for guestId, eventId, invitation in guests})
+		now = timezone.now()
+		cls.objects.bulk_create([cls(event_id=eventId, guest_id=guestId, invitation=invitation,
+			change_seq=versions[eventId], deleted=now) for guestId, eventId, invitation in guests])
+
+	@classmethod
+	def compact(cls, maxAgeDays=None):
+		"""
+		Deletes tombstones older than maxAgeDays (TOMBSTONE_MAX_AGE_DAYS by
+		default) and returns how many went.
+		"""
+		days = TOMBSTONE_MAX_AGE_DAYS if maxAgeDays is None else maxAgeDays
+		old = cls.objects.filter(deleted__lt=timezone.now() - datetime.timedelta(days=days))
+		with transaction.atomic():
+			through = list(old.order_by().values('event_id').annotate(
+				through=Max('change_seq'), tombstones=Count('id')))
+			for row in through:
+				EventVersion.objects.filter(event_id=row['event_id'],
+					compacted_through__lt=row['through']).update(compacted_through=row['through'])
+			if through:
+				old.delete()
+		return sum(row['tombstones'] for row in through)
+
+
+class EventSummary(models.Model):
+	"""
+	Response counters for an event's dashboard, kept in step with the guest list
+	in the same transaction as every write that could move them, so reading
+	them is one row instead of a GROUP BY over all the guests.
+
+	plus_ones counts the plus-ones attending guests are bringing (what they
+	answered, or their whole plusOne until they do), so the expected headcount
+	is attending + plus_ones. plus_ones_invited counts everyone's plusOne.
+	"""
+	COUNTERS = ('not_responded', 'attending', 'not_attending', 'plus_ones', 'plus_ones_invited')
+	STATUS_COUNTERS = {0: 'not_responded', 1: 'attending', 2: 'not_attending'}
+
+	event = models.OneToOneField(ctEvent, primary_key=True, related_name='summary')
+	not_responded = models.IntegerField(default=0)
+	attending = models.IntegerField(default=0)
+	not_attending = models.IntegerField(default=0)
+	plus_ones = models.IntegerField(default=0)
+	plus_ones_invited = models.IntegerField(default=0)
+
+	@property
+	def invited(self):
+		return self.not_responded + self.attending + self.not_attending
+
+	@property
+	def headcount(self):
+		return self.attending + self.plus_ones
+
+	def counters(self):
+		return {name: getattr(self, name) for name in self.COUNTERS}
+
+	def report(self):
+		"""
+		What the dashboard endpoints show: the counters plus invited and headcount.
+		"""
+		report = self.counters()
+		report.update({'invited': self.invited, 'headcount': self.headcount})
+		return report
+
+	@classmethod
+	def contribution(cls, status, plusOnes, coming, guests=1):
+		"""
+		What guests with this status add to the counters, given their plusOnes
+		and how many of those are coming (the answer, or plusOne before there is one).
+		"""
+		counters = {'plus_ones_invited': plusOnes,
+			'plus_ones': coming if status == 1 else 0}
+		if status in cls.STATUS_COUNTERS:
+			counters[cls.STATUS_COUNTERS[status]] = guests
+		return counters
+
+	@classmethod
+	def record(cls, changes):
+		"""
+		Takes (old, new) pairs of guest states from EventGuest._countedState,
+		either of which can be None (created, deleted), and moves the counters.
+		"""
+		deltas = {}
+		for old, new in changes:
+			for state, sign in ((old, -1), (new, 1)):
+				if state is None:
+					continue
+				eventId, status, plusOne, answer = state
+				coming = plusOne if answer is None else answer
+				counters = deltas.setdefault(eventId, dict.fromkeys(cls.COUNTERS, 0))
+				for name, amount in cls.contribution(status, plusOne, coming).items():
+					counters[name] += sign * amount
+		cls.apply(deltas)
+
+	@classmethod
+	def apply(cls, deltas, sign=1):
+		"""
+		Adds {event id: {counter: amount}} to the stored counters with one UPDATE
+		per event. Events without a summary row yet are counted from scratch.
+		"""
+		missing = set()
+		for eventId, counters in deltas.items():
+			changes = {name: F(name) + sign * amount for name, amount in counters.items() if amount}
+			if changes and not cls.objects.filter(event_id=eventId).update(**changes):
+				missing.add(eventId)
+		if missing:
+			cls.rebuild(missing)
+
+	@classmethod
+	def count(cls, eventIds=None):
+		"""
+		Counters computed from the guest table, {event id: {counter: value}}.
+		"""
+		guests = EventGuest.objects.all()
+		if eventIds is not None:
+			guests = guests.filter(event_id__in=list(eventIds))
+		return guests.tallies()
+
+	@classmethod
+	def rebuild(cls, eventIds=None):
+		"""
+		Recounts the given events (or all of them) from the guest table.
+		"""
+		if eventIds is None:
+			counted = cls.count()
+			eventIds = set(ctEvent.objects.values_list('pk', flat=True))
+		else:
+			eventIds = set(eventIds)
+			counted = cls.count(eventIds) if eventIds else {}
+		with transaction.atomic():
+			for eventId in eventIds:
+				counters = counted.get(eventId, dict.fromkeys(cls.COUNTERS, 0))
+				if not cls.objects.filter(event_id=eventId).update(**counters):
+					if ctEvent.objects.filter(pk=eventId).exists():
+						cls.objects.create(event_id=eventId, **counters)
+
+	@classmethod
+	def forEvent(cls, eventId):
+		summary = cls.objects.filter(event_id=eventId).first()
+		if summary is None:
+			cls.rebuild([eventId])
+			summary = cls.objects.filter(event_id=eventId).first()
+		return summary
+
+
+class ImportJob(models.Model):
+	"""
+	A guest list upload being loaded in the background (see jobs.py). Live
+	progress is in a file next to the spooled upload while the job runs, because
+	the import's own transaction keeps anything it writes here invisible until
+	it commits.
+	"""
+	QUEUED, RUNNING, DONE, FAILED = range(4)
+	STATUS_CHOICES = ((QUEUED, 'Queued'),
+						(RUNNING, 'Running'),
+						(DONE, 'Done'),
+						(FAILED, 'Failed'),
+						)
+	id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+	event = models.ForeignKey(ctEvent)
+	status = models.SmallIntegerField(choices=STATUS_CHOICES, default=QUEUED)
+	path = models.CharField(max_length=255)
+	total_rows = models.IntegerField(null=True, blank=True)
+	rows_processed = models.IntegerField(default=0)
+	guests_created = models.IntegerField(default=0)
+	errors = models.TextField(blank=True, default='') # JSON.
+	duplicates = models.CharField(max_length=10, blank=True, default='flag') # See GuestImporter.
+	duplicate_rows = models.TextField(blank=True, default='') # JSON, see duplicates.py.
+	created = models.DateTimeField(auto_now_add=True)
+	started = models.DateTimeField(null=True, blank=True)
+	finished = models.DateTimeField(null=True, blank=True)
+
+
+class InvitationCode(models.Model):
+	"""
+	Short random code printed on an invitation for events using the "Code" RSVP
+	method. Guests type it in and get their invitation back from one lookup on
+	the unique index, rather than us searching names.
+
+	Codes are CODE_LENGTH characters from an alphabet without look-alikes
+	(no 0/O, 1/I/L), drawn from the OS random source, so they can't be guessed
+	from each other. They're stored bare and upper case; normalize() turns what
+	a guest typed ("abcde-fghjk") into that form.
+	"""
+	RSVP_METHOD = 1 # See Event.RSVP_METHOD_CHOICES.
+	ALPHABET = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
+	CODE_LENGTH = 10
+	ATTEMPTS = 5
+
+	event = models.ForeignKey(ctEvent)
+	invitation = models.IntegerField()
+	code = models.CharField(max_length=CODE_LENGTH, unique=True)
+
+	_random = random.SystemRandom()
+
+	class Meta:
+		unique_together = (('event', 'invitation'),)
+
+	def __str__(self):
+		return self.formatted
+
+	@property
+	def formatted(self):
+		half = self.CODE_LENGTH // 2
+		return '{0}-{1}'.format(self.code[:half], self.code[half:])
+
+	@classmethod
+	def normalize(cls, text):
+		return ''.join(c for c in (text or '').upper() if c.isalnum())
+
+	@classmethod
+	def newCodes(cls, count):
+		codes = set()
+		while len(codes) < count:
+			codes.add(''.join(cls._random.choice(cls.ALPHABET) for x in range(cls.CODE_LENGTH)))
+		return list(codes)
+
+	@classmethod
+	def generate(cls, eventId, low=None, high=None):
+		"""
+		Gives every invitation on the event (or just those numbered low to high)
+		that doesn't have a code yet a new one. One query finds them and one
+		bulk_create writes them, however many there are. If a code collides with
+		one already taken, or another process got to an invitation first, the
+		insert is rolled back to a savepoint and tried again with fresh codes.
+
+		Returns how many codes were created.
+		"""
+		for attempt in range(cls.ATTEMPTS):
+			guests = EventGuest.objects.filter(event_id=eventId)
+			if low is not None:
+				guests = guests.filter(invitation__gte=low)
+			if high is not None:
+				guests = guests.filter(invitation__lte=high)
+			missing = list(guests.exclude(invitation__in=cls.objects.filter(
+				event_id=eventId).values('invitation')).order_by('invitation').values_list(
+				'invitation', flat=True).distinct())
+			if not missing:
+				return 0
+			codes = [cls(event_id=eventId, invitation=invitation, code=code)
+				for invitation, code in zip(missing, cls.newCodes(len(missing)))]
+			try:
+				with transaction.atomic():
+					cls.objects.bulk_create(codes)
+			except IntegrityError:
+				continue
+			return len(codes)
+		raise IntegrityError('Could not find free invitation codes for event {0}.'.format(eventId))
+
+	@classmethod
+	def lookup(cls, code):
+		"""
+		The PUBLIC_FIELDS of every guest on the invitation with this code, for a
+		"Code" event, in (orderer, id) order. A single query: the code's row is
+		joined to the guest table on (event, invitation) through the unique
+		index on code.
 		"""
+		code = cls.normalize(code)
+		if len(code) != cls.CODE_LENGTH:
+			return []
+		codeTable, guestTable = cls._meta.db_table, EventGuest._meta.db_table
+		return list(EventGuest.objects.filter(event__rsvp_method=cls.RSVP_METHOD).extra(
+			tables=[codeTable],
+			where=['{0}.code = %s'.format(codeTable),
+				'{0}.event_id = {1}.event_id'.format(codeTable, guestTable),
+				'{0}.invitation = {1}.invitation'.format(codeTable, guestTable)],
+			params=[code]).order_by('orderer', 'id').values(*PUBLIC_FIELDS))
@@ -0,0 +1,30 @@
+from rest_framework.permissions import BasePermission, SAFE_METHODS
+
+# See ct.core.models.Profile for what each user_type means.
+SINGLE_EVENT_USER = 0
+EVENT_PLANNER = 1
+STAFF = 2
+
+
+class IsEventCoordinator(BasePermission):
+	"""
+	For coordinator endpoints whose URL carries an event_id.
+
+	Superusers and CheekyTeak staff can do anything. Single event users can read
+	and write the events they follow, and event planners can only read them.
+	"""
+
+	def has_permission(self, request, view):
+		user = request.user
+		if not user.is_authenticated():
+			return False
+		if user.is_superuser:
+			return True
+		profile = getattr(user, 'ctprofile', None)
+		if profile is None:
+			return False
+		if profile.user_type == STAFF:
+			return True
+		if not profile.follows(view.kwargs['event_id']):
+			return False
+		return request.method in SAFE_METHODS or profile.user_type == SINGLE_EVENT_USER
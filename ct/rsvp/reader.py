@@ -0,0 +1,213 @@
+"""
+Parsing of uploaded guest files, for views.uploadRowToDict.
+
+GuestFileReader reads the upload in CHUNK_SIZE byte chunks, so a big file is
+never in memory all at once, and yields one dict per guest with the keys the
+importer wants (FIELDS). It works out for itself:
+
+* the encoding: a BOM if there is one, otherwise UTF-8 if the first chunk is
+  valid UTF-8, otherwise Windows-1252, which is what Excel saves;
+* the format: JSON lines if the file starts with "{", tab separated if the
+  first line has more tabs than commas, otherwise CSV with RFC 4180 quoting
+  (so "Stoutin, Jr." stays one name);
+* the columns: a header row is matched against HEADER_ALIASES in any order
+  (see isHeader for what counts as one), and without one columns are taken to
+  be in FIELDS order, like the upload form's example file.
+
+Short rows get '' for the missing columns. Rows that can't be read at all are
+skipped and recorded in `errors` as (row number, {'__all__': [message]}), the
+same shape as GuestImportError.errors, so the whole file gets checked in one go.
+Each dict carries its row number in the file (header included) under 'row'.
+"""
+import codecs
+import csv
+import json
+import re
+
+FIELDS = ('pfx', 'first', 'last', 'plusOne', 'extends')
+CHUNK_SIZE = 64 * 1024
+FALLBACK_ENCODING = 'cp1252'
+
+HEADER_ALIASES = {
+	'pfx': ('pfx', 'prefix', 'title', 'salutation', 'honorific'),
+	'first': ('first', 'firstname', 'givenname', 'forename'),
+	'last': ('last', 'lastname', 'surname', 'familyname'),
+	'plusOne': ('plusone', 'plusones', '+1', 'plus1'),
+	'extends': ('extends', 'samegroup', 'sameinvitation', 'group'),
+}
+_ALIASES = {alias: field for field, aliases in HEADER_ALIASES.items() for alias in aliases}
+_LONGEST_FIRST = sorted(_ALIASES, key=len, reverse=True)
+_NOT_ALIAS = re.compile(r'[^a-z0-9+]')
+
+BOMS = ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'),
+	(codecs.BOM_UTF16_BE, 'utf-16'))
+
+
+def aliasField(name):
+	"""
+	The field a cell names exactly, or None. 'Last Name', 'SURNAME' and
+	'last_name' all give 'last'.
+	"""
+	return _ALIASES.get(_NOT_ALIAS.sub('', str(name).lower()))
+
+
+def headerField(name):
+	"""
+	The field a header cell names, or None: an alias (see aliasField), or
+	anything starting with one, like 'Plus Ones Invited (number, blank=0)' from
+	the example file. Only for cells already known to be headers, since a
+	surname like 'Firstenberg' starts with one too.
+	"""
+	field = aliasField(name)
+	if field is not None:
+		return field
+	key = _NOT_ALIAS.sub('', str(name).lower())
+	for alias in _LONGEST_FIRST:
+		if key.startswith(alias):
+			return _ALIASES[alias]
+	return None
+
+
+def detectEncoding(sample):
+	for bom, encoding in BOMS:
+		if sample.startswith(bom):
+			return encoding
+	try:
+		# Not final: the chunk may end part way through a character.
+		codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+	except UnicodeDecodeError:
+		return FALLBACK_ENCODING
+	return 'utf-8'
+
+
+def isHeader(cells):
+	"""
+	Whether a first row is a header: at least two of its cells, 'first' among
+	them, are exact aliases, and every other non-blank cell at least starts
+	with one. A row of names that happen to start with an alias isn't.
+	"""
+	exact = {aliasField(cell) for cell in cells} - {None}
+	if 'first' not in exact or len(exact) < 2:
+		return False
+	return all(headerField(cell) is not None for cell in cells if cell.strip())
+
+
+def detectFormat(text):
+	stripped = text.lstrip()
+	if stripped.startswith('{'):
+		return 'jsonl'
+	firstLine = stripped.split('\n', 1)[0]
+	return 'tsv' if firstLine.count('\t') > firstLine.count(',') else 'csv'
+
+
+class GuestFileReader(object):
+	"""
+	Iterate over it for row dicts; see the module docstring. fileobj is a
+	binary file (a Django upload or open(path, 'rb')). Pass encoding or format
+	('csv', 'tsv' or 'jsonl') to skip detecting them.
+	"""
+
+	def __init__(self, fileobj, encoding=None, format=None, chunk_size=CHUNK_SIZE):
+		self.fileobj = fileobj
+		self.encoding = encoding
+		self.format = format
+		self.chunk_size = chunk_size
+		self.errors = []
+		self.rows_read = 0
+
+	def __iter__(self):
+		first = self.fileobj.read(self.chunk_size)
+		if self.encoding is None:
+			self.encoding = detectEncoding(first)
+		decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+		text = decoder.decode(first, final=not first)
+		if self.format is None:
+			self.format = detectFormat(text)
+		lines = self._lines(text, decoder)
+		if self.format == 'jsonl':
+			return self._jsonRows(lines)
+		return self._delimitedRows(lines, '\t' if self.format == 'tsv' else ',')
+
+	def _lines(self, text, decoder):
+		"""
+		Decoded lines, newlines kept, from the chunk already read and the rest
+		of the file. Old Mac files that only use '\r' get split on that.
+		"""
+		newline = '\r' if '\r' in text and '\n' not in text else '\n'
+		pending = ''
+		while text:
+			lines = (pending + text).split(newline)
+			pending = lines.pop()
+			for line in lines:
+				yield line + newline
+			chunk = self.fileobj.read(self.chunk_size)
+			text = decoder.decode(chunk, final=not chunk)
+		if pending:
+			yield pending
+
+	def _error(self, row, message):
+		self.errors.append((row, {'__all__': [message]}))
+
+	def _delimitedRows(self, lines, delimiter):
+		reader = csv.reader(lines, delimiter=delimiter, strict=True)
+		columns = width = None
+		row = 0
+		while True:
+			try:
+				cells = next(reader)
+			except StopIteration:
+				return
+			except csv.Error as e:
+				row += 1
+				self._error(row, 'Unreadable row: {0}.'.format(e))
+				continue
+			row += 1
+			if not any(cell.strip() for cell in cells):
+				continue
+			if columns is None:
+				if isHeader(cells):
+					columns = [(inx, headerField(cell)) for inx, cell in enumerate(cells)
+						if headerField(cell) is not None]
+					width = len(cells)
+					continue
+				columns, width = list(enumerate(FIELDS)), len(FIELDS)
+			if any(cell.strip() for cell in cells[width:]):
+				self._error(row, 'Row has {0} columns but there are only {1}. Put names containing '
+					'a comma in double quotes.'.format(len(cells), width))
+				continue
+			if '\ufffd' in ''.join(cells):
+				self._error(row, "Row isn't valid {0} text.".format(self.encoding))
+				continue
+			guest = dict.fromkeys(FIELDS, '')
+			for inx, field in columns:
+				if inx < len(cells):
+					guest[field] = cells[inx]
+			guest['row'] = row
+			self.rows_read += 1
+			yield guest
+
+	def _jsonRows(self, lines):
+		for row, line in enumerate(lines, 1):
+			if not line.strip():
+				continue
+			try:
+				item = json.loads(line)
+			except ValueError as e:
+				self._error(row, 'Invalid JSON: {0}.'.format(e))
+				continue
+			if not isinstance(item, dict):
+				self._error(row, 'Expected a JSON object.')
+				continue
+			guest = dict.fromkeys(FIELDS, '')
+			for key, value in item.items():
+				field = headerField(key)
+				if field is None:
+					continue
+				if value is None or value is False:
+					value = ''
+				elif value is True:
+					value = 'X'
+				guest[field] = str(value)
+			guest['row'] = row
+			self.rows_read += 1
+			yield guest
@@ -0,0 +1,214 @@
+"""
+In-memory name search for events that use the "Live Search" RSVP method.
+
+Guests type their name into the public app and we answer on every keystroke,
+so instead of querying EventGuest by first/last each time, each worker process
+keeps a per-event index of name tokens. Indexes are built lazily on the first
+search for an event, rebuilt after RSVP_SEARCH_INDEX_TTL seconds (other worker
+processes can't tell us about their writes), and otherwise patched in place by
+the serializers, the importer and EventGuest.delete through the module level
+helpers below.
+
+Only PUBLIC_FIELDS are ever loaded, so attendance status can't leak.
+"""
+import bisect
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+
+from ct.core.models import Event
+from .models import EventGuest, PUBLIC_FIELDS
+
+INDEX_TTL = getattr(settings, 'RSVP_SEARCH_INDEX_TTL', 60)
+DEFAULT_LIMIT = 10
+LIVE_SEARCH = 0 # See Event.RSVP_METHOD_CHOICES.
+
+_APOSTROPHES = re.compile("['’]")
+_WORDS = re.compile(r'\w+')
+
+
+def normalize(text):
+	"""
+	Case and accent insensitive form of a name: 'José' and 'jose' both become
+	'jose', and apostrophes are dropped so "O'Brien" matches "obrien".
+	"""
+	if not text:
+		return ''
+	decomposed = unicodedata.normalize('NFKD', text)
+	stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+	return _APOSTROPHES.sub('', stripped.casefold())
+
+
+def tokenize(text):
+	return _WORDS.findall(normalize(text))
+
+
+class EventSearchIndex(object):
+	"""
+	Sorted (token, guest id) pairs for one event, so a prefix lookup is a
+	bisect plus a short walk. An invitation matches a query when every query
+	term is a prefix of some name token on the invitation.
+	"""
+
+	def __init__(self, eventId):
+		self.eventId = eventId
+		self.guests = {}
+		self.tokens = {}
+		self.invitations = defaultdict(set)
+		self.entries = []
+		self.lock = threading.RLock()
+		self.builtAt = time.monotonic()
+
+	@classmethod
+	def build(cls, eventId):
+		index = cls(eventId)
+		for guest in EventGuest.objects.filter(event_id=eventId).values(*PUBLIC_FIELDS):
+			index._add(guest, sort=False)
+		index.entries.sort()
+		return index
+
+	def expired(self):
+		return time.monotonic() - self.builtAt > INDEX_TTL
+
+	def add(self, guest):
+		with self.lock:
+			self._remove(guest['id'])
+			self._add(guest)
+
+	def remove(self, guestId):
+		with self.lock:
+			self._remove(guestId)
+
+	def replace_invitations(self, invitations, guests):
+		"""
+		Swaps out everything indexed for the given invitation numbers.
+		"""
+		with self.lock:
+			for invitation in invitations:
+				for guestId in list(self.invitations.get(invitation, ())):
+					self._remove(guestId)
+			for guest in guests:
+				self._remove(guest['id'])
+				self._add(guest)
+
+	def search(self, query, limit=DEFAULT_LIMIT):
+		terms = tokenize(query)
+		if not terms:
+			return []
+		with self.lock:
+			matched = None
+			for term in terms:
+				found = {self.guests[guestId]['invitation'] for guestId in self._prefixed(term)}
+				matched = found if matched is None else matched & found
+				if not matched:
+					return []
+			return [self._invitation(number) for number in sorted(matched)[:limit]]
+
+	def _prefixed(self, term):
+		position = bisect.bisect_left(self.entries, (term,))
+		while position < len(self.entries) and self.entries[position][0].startswith(term):
+			yield self.entries[position][1]
+			position += 1
+
+	def _invitation(self, number):
+		guests = sorted((self.guests[guestId] for guestId in self.invitations[number]),
+			key=lambda guest: (guest['orderer'], guest['id']))
+		return {'invitation': number, 'guests': guests}
+
+	def _add(self, guest, sort=True):
+		guest = {field: guest[field] for field in PUBLIC_FIELDS}
+		tokens = tuple(set(tokenize(guest['first']) + tokenize(guest['last'])))
+		self.guests[guest['id']] = guest
+		self.tokens[guest['id']] = tokens
+		self.invitations[guest['invitation']].add(guest['id'])
+		for token in tokens:
+			if sort:
+				bisect.insort(self.entries, (token, guest['id']))
+			else:
+				self.entries.append((token, guest['id']))
+
+	def _remove(self, guestId):
+		guest = self.guests.pop(guestId, None)
+		if guest is None:
+			return
+		for token in self.tokens.pop(guestId):
+			del self.entries[bisect.bisect_left(self.entries, (token, guestId))]
+		members = self.invitations[guest['invitation']]
+		members.discard(guestId)
+		if not members:
+			del self.invitations[guest['invitation']]
+
+
+_indexes = {}
+_registryLock = threading.Lock()
+
+
+def get_index(eventId):
+	"""
+	Returns the index for a Live Search event, building it if needed, or None if
+	the event doesn't exist or uses some other RSVP method.
+	"""
+	eventId = int(eventId)
+	index = _indexes.get(eventId)
+	if index is not None and not index.expired():
+		return index
+	with _registryLock:
+		index = _indexes.get(eventId)
+		if index is None or index.expired():
+			if not Event.objects.filter(pk=eventId, rsvp_method=LIVE_SEARCH).exists():
+				_indexes.pop(eventId, None)
+				return None
+			index = _indexes[eventId] = EventSearchIndex.build(eventId)
+	return index
+
+
+def invalidate(eventId=None):
+	with _registryLock:
+		if eventId is None:
+			_indexes.clear()
+		else:
+			_indexes.pop(int(eventId), None)
+
+
+def _public(guest):
+	if isinstance(guest, EventGuest):
+		return {field: getattr(guest, 'event_id' if field == 'event' else field)
+			for field in PUBLIC_FIELDS}
+	return guest
+
+
+def guest_saved(guest):
+	"""
+	Call after a guest is created or changed. A no-op unless this process has
+	already built an index for the guest's event.
+	"""
+	index = _indexes.get(guest.event_id)
+	if index is not None:
+		index.add(_public(guest))
+
+
+def guest_deleted(eventId, guestId):
+	"""
+	Call after a guest is deleted. Like guest_saved, a no-op without an index.
+	"""
+	index = _indexes.get(int(eventId))
+	if index is not None:
+		index.remove(guestId)
+
+
+def invitations_changed(eventId, low, high=None):
+	"""
+	Re-reads invitations low through high (inclusive) for an event. Meant for
+	bulk paths, where bulk_create doesn't give us primary keys to index.
+	"""
+	index = _indexes.get(int(eventId))
+	if index is None:
+		return
+	high = low if high is None else high
+	guests = EventGuest.objects.filter(event_id=eventId,
+		invitation__gte=low, invitation__lte=high).values(*PUBLIC_FIELDS)
+	index.replace_invitations(range(low, high + 1), guests)
@@ -1,9 +1,13 @@
+from collections import OrderedDict
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import models, transaction
 from rest_framework import serializers
-from ct.rsvp.models import EventGuest
+from ct.rsvp.models import EventGuest, EventSummary, InvitationCode, PUBLIC_FIELDS
 from ct.core.models import Event
 from ct.rsvp.exceptions import MixedInvitationError, NoEventError
-
-PUBLIC_FIELDS = ('id', 'event', 'invitation', 'pfx', 'first', 'last', 'plusOne', 'orderer')
+from ct.rsvp import live, search
 
 class EventDisplayInfoSerializer(serializers.ModelSerializer):
 	"""
@@ -16,25 +20,122 @@ class EventDisplayInfoSerializer(serializers.ModelSerializer):
 				'surname_with_guests', 'and_joiner', 'with_joiner')
 
 
+def groupInvitations(guests):
+	"""
+	Folds guest dicts, already sorted by (invitation, orderer), into a list of
+	{'invitation': number, 'guests': [...]} groups in the same order.
+	"""
+	return [{'invitation': number, 'guests': list(members)}
+		for number, members in groupby(guests, key=itemgetter('invitation'))]
+
+
+class EventField(serializers.PrimaryKeyRelatedField):
+	"""
+	Looks each event up once per serializer, rather than once per guest when
+	validating a list of them.
+	"""
+	def to_internal_value(self, data):
+		events = self.__dict__.setdefault('_events', {})
+		if data not in events:
+			events[data] = super(EventField, self).to_internal_value(data)
+		return events[data]
+
+
+def passesThrough(field, modelField):
+	"""
+	True when field.to_representation would hand back the column value the
+	database gave us unchanged, so the fast path can skip calling it.
+	"""
+	if isinstance(field, serializers.RelatedField):
+		return getattr(field, 'pk_field', None) is None # The column is the pk already.
+	integerColumn = isinstance(modelField, (models.IntegerField, models.AutoField))
+	if type(field) in (serializers.IntegerField, serializers.ChoiceField):
+		return integerColumn
+	if type(field) is serializers.CharField:
+		return isinstance(modelField, models.CharField)
+	return False
+
+
 class GuestFullSerializer(serializers.ModelSerializer):
 	"""
 	Serializer class for arbitrary groups of guests.
 	
 	If you want a group of guests from a particular invitation, use
 	InvitationFullSerializer.
+
+	For big read-only lists, fastRepresentation(queryset) gives the same output
+	as Serializer(queryset, many=True).data without building model instances.
 	"""
+	event = EventField(queryset=Event.objects.all())
+
+	@classmethod
+	def fieldPlan(cls):
+		"""
+		(field name, column, converter or None) for each field this serializer
+		outputs, worked out once per class from the serializer's own fields.
+		"""
+		plan = cls.__dict__.get('_fieldPlan')
+		if plan is None:
+			meta = cls.Meta.model._meta
+			plan = []
+			for name, field in cls().fields.items():
+				if field.write_only:
+					continue
+				modelField = meta.get_field(field.source)
+				plan.append((name, modelField.attname,
+					None if passesThrough(field, modelField) else field.to_representation))
+			plan = cls._fieldPlan = tuple(plan)
+		return plan
+
+	@classmethod
+	def fastRepresentation(cls, queryset):
+		"""
+		Read-only fast path: pulls just the plan's columns with values_list and
+		zips them into the same OrderedDicts DRF would build, in the queryset's
+		order. Respects Meta.fields, so the public serializers still only show
+		PUBLIC_FIELDS.
+		"""
+		plan = cls.fieldPlan()
+		names = [name for name, column, convert in plan]
+		converters = [(inx, convert) for inx, (name, column, convert) in enumerate(plan)
+			if convert is not None]
+		rows = queryset.values_list(*[column for name, column, convert in plan])
+		if not converters:
+			return [OrderedDict(zip(names, row)) for row in rows]
+		result = []
+		for row in rows:
+			row = list(row)
+			for inx, convert in converters:
+				if row[inx] is not None:
+					row[inx] = convert(row[inx])
+			result.append(OrderedDict(zip(names, row)))
+		return result
+
+	def saveWithCode(self, instance):
+		"""
+		Saves the guest, giving their invitation a code if it's a new one on a
+		"Code" event.
+		"""
+		instance.clean()
+		with transaction.atomic():
+			instance.save()
+			if instance.event.rsvp_method == InvitationCode.RSVP_METHOD:
+				InvitationCode.generate(instance.event_id, instance.invitation, instance.invitation)
+
 	def create(self, validated_data):
 		instance = self.Meta.model(**validated_data)
-		instance.clean()
-		instance.save()
+		self.saveWithCode(instance)
+		search.guest_saved(instance)
+		live.publish(instance.event_id)
 		return instance	
 	
 	def update(self, instance, validated_data):
 		for x in validated_data.keys():
 			if x not in {'pk', 'id'}:
 				setattr(instance, x, validated_data[x])
-		instance.clean()
-		instance.save()
+		self.saveWithCode(instance)
+		search.guest_saved(instance)
+		live.publish(instance.event_id)
 		return instance
 	
 	class Meta:
@@ -49,6 +150,191 @@ class GuestPublicSerializer(GuestFullSerializer):
 		fields = PUBLIC_FIELDS
 
 
+class RSVPAnswerSerializer(serializers.Serializer):
+	id = serializers.IntegerField()
+	status = serializers.ChoiceField(choices=EventGuest.STATUS_CHOICES)
+	plusOne = serializers.IntegerField(min_value=0)
+
+
+class RSVPSerializer(serializers.Serializer):
+	"""
+	An invitation's RSVP: the version token it was loaded with (see
+	EventGuest.invitationVersion) and the answers for its guests.
+	"""
+	version = serializers.CharField()
+	guests = RSVPAnswerSerializer(many=True)
+
+	def validate_guests(self, answers):
+		ids = [answer['id'] for answer in answers]
+		if not ids:
+			raise serializers.ValidationError('Answer for at least one guest.')
+		if len(set(ids)) != len(ids):
+			raise serializers.ValidationError('Each guest can only be answered for once.')
+		return answers
+
+	@property
+	def answers(self):
+		return {answer['id']: (answer['status'], answer['plusOne'])
+			for answer in self.validated_data['guests']}
+
+
+class InvitationBatchSerializer(serializers.Serializer):
+	"""
+	Lots of new invitations for one event at once:
+	{"invitations": [{"guests": [{"first": ..., ...}, ...]}, ...]}
+
+	Pass the event as context['event']. Every guest is validated with
+	GuestFullSerializer before anything is written. Errors come back keyed by
+	the index of the invitation they're in, each a list of per-guest errors like
+	a many=True serializer's. save() reserves all the invitation numbers in
+	one step and inserts every guest with one bulk_create, in file order, so
+	it's the same few queries for one invitation or a thousand.
+	"""
+	MAX_GUESTS = 5000
+	invitations = serializers.ListField(child=serializers.DictField())
+
+	def validate_invitations(self, invitations):
+		if not invitations:
+			raise serializers.ValidationError('Send at least one invitation.')
+		flat, sizes, errors = [], [], {}
+		for inx, invitation in enumerate(invitations):
+			guests = invitation.get('guests')
+			if not (isinstance(guests, list) and guests and all(isinstance(g, dict) for g in guests)):
+				errors[inx] = ['Each invitation needs a list of guests.']
+				continue
+			sizes.append((inx, len(guests)))
+			# The real invitation numbers are handed out in create().
+			flat.extend(dict(guest, event=self.context['event'].pk, invitation=0) for guest in guests)
+		if len(flat) > self.MAX_GUESTS:
+			raise serializers.ValidationError('At most {0} guests at a time.'.format(self.MAX_GUESTS))
+		guests = GuestFullSerializer(data=flat, many=True)
+		valid = guests.is_valid()
+		grouped, start = [], 0
+		for inx, size in sizes:
+			if valid:
+				grouped.append(guests.validated_data[start:start + size])
+			elif any(guests.errors[start:start + size]):
+				errors[inx] = guests.errors[start:start + size]
+			start += size
+		if errors:
+			raise serializers.ValidationError(errors)
+		return grouped
+
+	def create(self, validated_data):
+		ev = self.context['event']
+		invitations = validated_data['invitations']
+		first = EventGuest.nextFreeInvitation(ev, count=len(invitations))
+		last = first + len(invitations) - 1
+		guests = []
+		for number, members in enumerate(invitations, first):
+			for data in members:
+				guest = EventGuest(**dict(data, event=ev, invitation=number))
+				guest.clean()
+				guests.append(guest)
+		with transaction.atomic():
+			EventGuest.objects.bulk_create(guests)
+			if ev.rsvp_method == InvitationCode.RSVP_METHOD:
+				InvitationCode.generate(ev.pk, first, last)
+		search.invitations_changed(ev.pk, first, last)
+		live.publish(ev.pk)
+		self.numbers = (first, last)
+		return guests
+
+
+class ArrangementSerializer(serializers.Serializer):
+	"""
+	New guest order for some of an event's invitations, moves between them
+	included: {"invitations": {"<number>": [guest id, ...], ...},
+	"new": [[guest id, ...], ...]}. See EventGuest.arrange. Pass the event as
+	context['event']. save() returns the number of guests that changed and
+	sets self.touched (every invitation number affected) and self.numbers
+	(the new invitations').
+	"""
+	# Ids and invitation numbers all go in one IN (...), and SQLite stops at 999.
+	MAX_GUESTS = 900
+	invitations = serializers.DictField(
+		child=serializers.ListField(child=serializers.IntegerField()), required=False)
+	new = serializers.ListField(child=serializers.ListField(child=serializers.IntegerField()),
+		required=False)
+
+	def validate_invitations(self, invitations):
+		arranged = {}
+		for number, members in invitations.items():
+			try:
+				number = int(number)
+			except ValueError:
+				number = 0
+			if number < 1:
+				raise serializers.ValidationError('Invitation numbers are positive integers.')
+			arranged[number] = members
+		return arranged
+
+	def validate_new(self, new):
+		if not all(new):
+			raise serializers.ValidationError('New invitations need at least one guest.')
+		return new
+
+	def validate(self, data):
+		invitations, new = data.get('invitations', {}), data.get('new', [])
+		if not invitations and not new:
+			raise serializers.ValidationError('Send "invitations", "new" or both.')
+		size = len(invitations) + sum(len(members) for members in list(invitations.values()) + new)
+		if size > self.MAX_GUESTS:
+			raise serializers.ValidationError('At most {0} guests and invitations at a time.'.format(
+				self.MAX_GUESTS))
+		return {'invitations': invitations, 'new': new}
+
+	def create(self, validated_data):
+		ev = self.context['event']
+		with transaction.atomic():
+			updated, self.touched, self.numbers = EventGuest.arrange(ev.pk,
+				validated_data['invitations'], validated_data['new'])
+			if self.numbers and ev.rsvp_method == InvitationCode.RSVP_METHOD:
+				InvitationCode.generate(ev.pk, self.numbers[0], self.numbers[-1])
+		if updated:
+			for number in self.touched:
+				search.invitations_changed(ev.pk, number)
+			live.publish(ev.pk)
+		return updated
+
+
+class EventCloneSerializer(serializers.Serializer):
+	"""
+	How to copy an event: {"name": .., "event_date": .., "statuses": [..],
+	"whole_invitations": ..}, all optional. name and event_date default to the
+	source's, and statuses and whole_invitations pick which guests come along
+	(see EventGuest.copyGuests). Pass the source as context['event']. save()
+	returns the new event and sets self.copied to how many guests it got.
+	"""
+	name = serializers.CharField(max_length=60, required=False)
+	event_date = serializers.DateField(required=False)
+	statuses = serializers.ListField(
+		child=serializers.ChoiceField(choices=EventGuest.STATUS_CHOICES), required=False)
+	whole_invitations = serializers.BooleanField(default=False)
+
+	def validate_statuses(self, statuses):
+		if not statuses:
+			raise serializers.ValidationError('Leave statuses out to copy every guest.')
+		return statuses
+
+	def create(self, validated_data):
+		source = self.context['event']
+		clone = Event(**{field.attname: getattr(source, field.attname)
+			for field in Event._meta.concrete_fields if not field.primary_key})
+		clone.name = validated_data.get('name', source.name)
+		clone.event_date = validated_data.get('event_date', source.event_date)
+		with transaction.atomic():
+			clone.save()
+			# Whoever coordinates the original gets to run the copy too.
+			clone.followers.add(*source.followers.values_list('pk', flat=True))
+			self.copied = EventGuest.copyGuests(source.pk, clone.pk, validated_data.get('statuses'),
+				validated_data['whole_invitations'])
+			EventSummary.rebuild([clone.pk])
+			if clone.rsvp_method == InvitationCode.RSVP_METHOD:
+				InvitationCode.generate(clone.pk)
+		return clone
+
+
 class InvitationListSerializer(serializers.ListSerializer):
 	"""
 	A list serializer for lists of guests who all share the same invitation.
@@ -59,8 +345,6 @@ class InvitationListSerializer(serializers.ListSerializer):
 	An exception will be raised unless all the guests share the same invitation
 	or lack an assigned invitation number. (In which case, they'll all be given 
 	the same one.)
-	
-	At present, this is practically pseudo-code. It doesn't work.
 	"""
 	
 	def validate_same_invitation(self, guestObjectsList, guestDictList=None):
@@ -69,41 +353,107 @@ class InvitationListSerializer(serializers.ListSerializer):
 		an arbitrary list of guests not on the same invitation, use a "guest" serializer,
 		not an "invite" one.
 		"""
-		if len({guest.invitation for guest in guestObjectsList}) > 1:
+		invitations = {guest.invitation for guest in guestObjectsList}
+		if len(invitations) > 1:
 			raise MixedInvitationError("Not all the guests serialized share same invitation.")
 		if guestDictList is not None:
-			if not (all('invitation' not in [item.keys() for item in guestDictList]) or
-					len({item['invitation'] for item in guestDictList}) > 1):
-				raise MixedInvitationError	
+			invitations.update(item['invitation'] for item in guestDictList
+				if item.get('invitation') is not None)
+			if len(invitations) > 1:
+				raise MixedInvitationError("Guest data doesn't match the invitation being updated.")
 		
 	
 	def create(self, validated_data):
 		guests = [EventGuest(**item) for item in validated_data]
 		self.validate_same_invitation(guests)
-		inviteNumber = EventGuest.nextFreeInvitation(guests[0].event if len(guests) > 0 else None)
-		for guest in guests:
-			guest.invitation = inviteNumber
-		return EventGuest.objects.bulk_create(guests)
+		with transaction.atomic():
+			# Reserved only once the guests are valid, and given back if the insert fails.
+			inviteNumber = EventGuest.nextFreeInvitation(guests[0].event if len(guests) > 0 else None)
+			for guest in guests:
+				guest.invitation = inviteNumber
+			created = EventGuest.objects.bulk_create(guests)
+			if guests[0].event.rsvp_method == InvitationCode.RSVP_METHOD:
+				InvitationCode.generate(guests[0].event_id, inviteNumber, inviteNumber)
+		if guests:
+			search.invitations_changed(guests[0].event_id, inviteNumber)
+			live.publish(guests[0].event_id)
+		return created
 	
 		
 	def update(self, instance, validated_data):
+		"""
+		Works out which guests are new, changed or gone in memory, then applies
+		that with one bulk_create, one batched UPDATE and one DELETE inside a
+		transaction. Guests are matched on the "id" in the submitted data (DRF
+		drops read-only fields from validated_data, so it comes from initial_data).
+		An id that isn't one of the invitation's guests, or that's listed twice, is
+		a ValidationError.
+
+		Row counts end up in self.counts, as {'created': n, 'updated': n, 'deleted': n}.
+		"""
+		instance = list(instance)
 		self.validate_same_invitation(instance, guestDictList=validated_data)
 		guest_mapping = {guest.id: guest for guest in instance}
-		data_mapping = {item['id']: item for item in validated_data}
+		ids = []
+		for item in self.initial_data:
+			guest_id = item.get('id')
+			if guest_id is not None and guest_id != '':
+				try:
+					guest_id = int(guest_id)
+				except (TypeError, ValueError):
+					raise serializers.ValidationError('Guest ids are integers.')
+			ids.append(guest_id if guest_id != '' else None)
+		listed = [guest_id for guest_id in ids if guest_id is not None]
+		if len(set(listed)) != len(listed):
+			raise serializers.ValidationError('Each guest can only be listed once.')
+		unknown = set(listed) - set(guest_mapping)
+		if unknown:
+			raise serializers.ValidationError("Guests {0} aren't on this invitation. Leave the id "
+				"out to add a guest.".format(sorted(unknown)))
 		
-		out = []
-		for guest_id, data in data_mapping.items():
+		toCreate, toUpdate, changedFields, kept = [], [], set(), set()
+		for guest_id, data in zip(ids, validated_data):
 			existing_guest = guest_mapping.get(guest_id, None)
 			if existing_guest is None:
-				out.append(self.child.create(data))
-			else:
-				out.append(self.child.update(existing_guest, data))
+				guest = EventGuest(**data)
+				guest.clean()
+				toCreate.append(guest)
+				continue
+			kept.add(guest_id)
+			# Compare on attnames (event_id, not event) so we don't fetch events.
+			attnames = {field: EventGuest._meta.get_field(field).attname for field in data}
+			before = {field: getattr(existing_guest, attnames[field]) for field in data}
+			for field, value in data.items():
+				setattr(existing_guest, field, value)
+			existing_guest.clean()
+			changed = {field for field in data
+				if getattr(existing_guest, attnames[field]) != before[field]}
+			if changed:
+				toUpdate.append(existing_guest)
+				changedFields |= changed
+		toDelete = [guest_id for guest_id in guest_mapping if guest_id not in kept]
 		
-		for guest_id, guest in guest_mapping.items():
-			if guest_id not in data_mapping:
-				guest.delete()
+		with transaction.atomic():
+			EventGuest.objects.bulk_create(toCreate)
+			EventGuest.objects.bulk_update(toUpdate, changedFields)
+			if toDelete:
+				EventGuest.objects.filter(id__in=toDelete).delete()
+			# A PUT to an unused number opens a new invitation, which needs a code.
+			if toCreate and toCreate[0].event.rsvp_method == InvitationCode.RSVP_METHOD:
+				InvitationCode.generate(toCreate[0].event_id, toCreate[0].invitation,
+					toCreate[0].invitation)
+		self.counts = {'created': len(toCreate), 'updated': len(toUpdate), 'deleted': len(toDelete)}
 		
-		return out
+		# bulk_create doesn't hand back primary keys, so re-read the invitation.
+		if not (instance or toCreate):
+			return []
+		reference = (instance + toCreate)[0]
+		for guest_id in toDelete:
+			search.guest_deleted(reference.event_id, guest_id)
+		search.invitations_changed(reference.event_id, reference.invitation)
+		live.publish(reference.event_id)
+		return list(EventGuest.objects.filter(event_id=reference.event_id,
+			invitation=reference.invitation))
 			
 
 class InvitationFullSerializer(GuestFullSerializer):
@@ -165,10 +515,15 @@ class InvitationFullSerializer(GuestFullSerializer):
 					raise MixedInvitationError('All Numbered invitations must be same.')
 				numberToAssign = integerInvitations[0]
 			
+			elif args and args[0]: #updating, so keep the invitation we already have.
+				existing = args[0]
+				numberToAssign = (existing if isinstance(existing, EventGuest) else existing[0]).invitation
 			else: #usually means invitations == [None,]*len(data):
-				numberToAssign = EventGuest.nextFreeInvitation(eventNumber)
-			for representation in data:
-				representation['invitation'] = numberToAssign
+				# InvitationListSerializer.create reserves one once the data is valid.
+				numberToAssign = None
+			if numberToAssign is not None:
+				for representation in data:
+					representation['invitation'] = numberToAssign
 			
 			# put our work back in the keyword args dict, which we'll use below.
 			kwargs['data'] = data
@@ -181,6 +536,8 @@ class InvitationFullSerializer(GuestFullSerializer):
 			
 		# finally make the serializer, knowing the above is done.
 		child = cls(*args, **kwargs)
+		if 'data' in kwargs and numberToAssign is None:
+			child.fields['invitation'].required = False
 		list_kwargs = {'child': child,}
 		list_kwargs.update({
 			key: value for key, value in kwargs.items()
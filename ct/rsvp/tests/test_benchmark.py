@@ -0,0 +1,33 @@
+from django.test import TestCase
+import json
+import random
+
+from django.core.management import call_command
+from django.utils.six import StringIO
+
+from ct.core.models import Event
+from ct.rsvp.benchmark import parseSizes, syntheticCSV
+
+
+class TestBenchmark(TestCase):
+
+	def test_synthetic_csv_follows_sizes(self):
+		content = syntheticCSV(30, parseSizes('3:1'), random.Random(1)).decode('utf-8')
+		rows = content.splitlines()[1:]
+		self.assertEqual(len(rows), 30)
+		self.assertEqual(sum(1 for row in rows if not row.endswith('X')), 10)
+
+	def test_command_reports_every_phase(self):
+		out = StringIO()
+		call_command('rsvp_benchmark', guests=[50], lookups=5, allocations=5, stdout=out)
+		results = json.loads(out.getvalue())
+		phases = {phase['phase']: phase for phase in results['runs'][0]['phases']}
+		self.assertEqual(set(phases), {'parse_upload', 'upload', 'duplicate_check',
+			'next_free_invitation', 'serialize_guests', 'serialize_guests_fast',
+			'serialize_invitations', 'name_lookup_db', 'search_index_build', 'name_lookup_index'})
+		self.assertGreater(phases['upload']['queries'], 0)
+		self.assertEqual(phases['parse_upload']['queries'], 0)
+		self.assertEqual(phases['name_lookup_db']['queries'], 5)
+		self.assertEqual(phases['serialize_invitations']['queries'], 1)
+		self.assertIsNotNone(phases['serialize_guests']['peak_memory'])
+		self.assertFalse(Event.objects.exists())
@@ -0,0 +1,111 @@
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from unittest import mock
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from ct.core.models import Event
+from ct.rsvp.models import EventGuest
+from ct.rsvp.cache import FileBackend, MemoryBackend, ResponseCache, responses
+
+
+class TestMemoryBackend(TestCase):
+
+	def test_evicts_least_recently_used(self):
+		backend = MemoryBackend(max_entries=2)
+		backend.set((1, 'a', 1), {'x': 1})
+		backend.set((2, 'a', 1), {'x': 2})
+		backend.get((1, 'a', 1))
+		self.assertEqual(backend.set((3, 'a', 1), {'x': 3}), 1)
+		self.assertIsNone(backend.get((2, 'a', 1)))
+		self.assertEqual(backend.get((1, 'a', 1)), {'x': 1})
+
+	def test_bounded_by_bytes_and_replaces_old_versions(self):
+		backend = MemoryBackend(max_bytes=30)
+		backend.set((1, 'a', 1), {'x': 'a' * 10})
+		backend.set((1, 'a', 2), {'x': 'b' * 10})
+		self.assertIsNone(backend.get((1, 'a', 1)))
+		self.assertEqual(backend.usage()['entries'], 1)
+		backend.set((2, 'a', 1), {'x': 'c' * 10})
+		self.assertEqual(backend.usage()['entries'], 1)
+		self.assertLessEqual(backend.usage()['bytes'], 30)
+
+
+class TestFileBackend(TestCase):
+
+	def setUp(self):
+		self.path = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.path)
+
+	def test_round_trip_and_eviction(self):
+		backend = FileBackend(self.path, max_bytes=50)
+		backend.set((1, 'a', 1), {'guests': ['Dave'], 'n': 1})
+		self.assertEqual(backend.get((1, 'a', 1)), {'guests': ['Dave'], 'n': 1})
+		old = os.path.join(self.path, '1-a', '1.json')
+		os.utime(old, (time.time() - 60, time.time() - 60))
+		backend.set((2, 'a', 1), {'guests': ['Mitchell'], 'n': 2})
+		self.assertEqual(backend.set((3, 'a', 1), {'guests': ['Sharon'], 'n': 3}), 1)
+		self.assertIsNone(backend.get((1, 'a', 1)))
+		backend.set((2, 'a', 2), {'n': 4})
+		self.assertFalse(os.path.exists(os.path.join(self.path, '2-a', '1.json')))
+
+	def test_sweeps_are_spread_out(self):
+		backend = FileBackend(self.path, max_bytes=1600) # Sweeps every 100 bytes written.
+		with mock.patch.object(backend, '_evict', wraps=backend._evict) as evict:
+			for n in range(12):
+				backend.set((n, 'a', 1), {'guests': ['Mitch']}) # 20 bytes each.
+		self.assertEqual(evict.call_count, 3)
+		self.assertEqual(backend.usage()['entries'], 12)
+
+
+class TestResponseCache(TestCase):
+
+	def setUp(self):
+		self.ev = Event(name='Test Event', event_date=datetime.date.today())
+		self.ev.save()
+		EventGuest(event=self.ev, invitation=1, first='Mitchell', last='Stoutin').save()
+		self.url = '/api/events/{0}/invitations/'.format(self.ev.pk)
+		self.c = Client()
+		responses.clear()
+		responses.reset_stats()
+
+	def test_counts_hits_and_misses(self):
+		cache = ResponseCache(MemoryBackend())
+		build = lambda: ({'n': 1}, 3)
+		cache.get_or_build(1, 'a', None, build)
+		cache.get_or_build(1, 'a', 3, build)
+		cache.get_or_build(1, 'a', 4, build)
+		report = cache.report()
+		self.assertEqual((report['hits'], report['misses'], report['stores']), (1, 2, 2))
+		self.assertEqual(report['entries'], 1)
+
+	def test_repeat_request_costs_one_query(self):
+		first = self.c.get(self.url)
+		with self.assertNumQueries(1):
+			second = self.c.get(self.url)
+		self.assertEqual(first.content, second.content)
+
+	def test_writes_change_the_key(self):
+		self.c.get(self.url)
+		EventGuest.objects.bulk_create([EventGuest(event=self.ev, invitation=2, first='Dave')])
+		names = [i['guests'][0]['first'] for i in self.c.get(self.url).data['invitations']]
+		self.assertEqual(names, ['Mitchell', 'Dave'])
+		self.ev.and_joiner = 'and'
+		self.ev.save()
+		self.assertEqual(self.c.get(self.url).data['display']['and_joiner'], 'and')
+		self.assertEqual(responses.report()['misses'], 3)
+
+	def test_stats_view(self):
+		self.c.get(self.url)
+		self.c.get(self.url)
+		User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+		self.c.login(username='admin', password='pw')
+		report = json.loads(self.c.get('/stats/cache/').content.decode('utf-8'))
+		self.assertEqual((report['hits'], report['misses']), (1, 1))
+		self.assertEqual(report['backend'], 'MemoryBackend')
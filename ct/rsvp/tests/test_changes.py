@@ -0,0 +1,92 @@
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
+from django.utils.six import StringIO
+import datetime
+
+from ct.core.models import Event
+from ct.rsvp.models import EventGuest, EventVersion, GuestTombstone
+
+
+class TestChangeFeed(TestCase):
+
+	def setUp(self):
+		self.ev = Event(name='Test Event', event_date=datetime.date.today())
+		self.ev.save()
+		self.mitchell = EventGuest(event=self.ev, invitation=1, first='Mitchell')
+		self.mitchell.save()
+		self.dave = EventGuest(event=self.ev, invitation=2, first='Dave')
+		self.dave.save()
+		self.url = '/api/events/{0}/changes/'.format(self.ev.pk)
+		self.c = Client()
+		User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+		self.c.login(username='admin', password='pw')
+
+	def changes(self, since=None):
+		response = self.c.get(self.url, {} if since is None else {'since': since})
+		self.assertEqual(response.status_code, 200)
+		return response.data
+
+	def test_change_seq_increases_on_every_write_path(self):
+		seqs = [self.mitchell.change_seq, self.dave.change_seq]
+		self.assertLess(seqs[0], seqs[1])
+		EventGuest.objects.filter(pk=self.mitchell.pk).update(status=1)
+		updated = EventGuest.objects.get(pk=self.mitchell.pk).change_seq
+		self.assertGreater(updated, seqs[1])
+		EventGuest.objects.bulk_create([EventGuest(event=self.ev, invitation=3, first='Sharon')])
+		self.assertGreater(EventGuest.objects.get(first='Sharon').change_seq, updated)
+		self.assertEqual(EventGuest.objects.get(first='Sharon').change_seq,
+			EventVersion.current(self.ev.pk))
+
+	def test_full_sync_then_deltas(self):
+		first = self.changes()
+		self.assertTrue(first['reset'])
+		self.assertEqual(len(first['guests']), 2)
+		self.mitchell.status = 1
+		self.mitchell.save()
+		EventGuest.objects.filter(pk=self.dave.pk).delete()
+		delta = self.changes(first['cursor'])
+		self.assertFalse(delta['reset'])
+		self.assertEqual([g['first'] for g in delta['guests']], ['Mitchell'])
+		self.assertEqual(delta['guests'][0]['status'], 1)
+		self.assertEqual(delta['deleted'], [self.dave.pk])
+		self.assertGreater(delta['cursor'], first['cursor'])
+
+	def test_saving_some_fields_still_shows_up(self):
+		cursor = self.changes()['cursor']
+		self.dave.status = 2
+		self.dave.save(update_fields=['status'])
+		self.assertEqual(EventGuest.objects.get(pk=self.dave.pk).change_seq,
+			EventVersion.current(self.ev.pk))
+		delta = self.changes(cursor)
+		self.assertEqual([(g['first'], g['status']) for g in delta['guests']], [('Dave', 2)])
+
+	def test_in_sync_client_gets_empty_response(self):
+		cursor = self.changes()['cursor']
+		with self.assertNumQueries(3): # Session, user, version.
+			response = self.c.get(self.url, {'since': cursor})
+		self.assertEqual(response.data, {'cursor': cursor, 'reset': False, 'guests': [],
+			'deleted': []})
+
+	def test_instance_delete_and_moves_leave_tombstones(self):
+		cursor = self.changes()['cursor']
+		mitchellId = self.mitchell.pk
+		self.mitchell.delete()
+		other = Event.objects.create(name='Other', event_date=datetime.date.today())
+		self.dave.event = other
+		self.dave.save()
+		self.assertEqual(sorted(self.changes(cursor)['deleted']), sorted([mitchellId, self.dave.pk]))
+
+	def test_compaction_forces_reset(self):
+		cursor = self.changes()['cursor']
+		self.dave.delete()
+		GuestTombstone.objects.update(deleted=timezone.now() - datetime.timedelta(days=60))
+		out = StringIO()
+		call_command('rsvp_compact_tombstones', days=30, stdout=out)
+		self.assertIn('Compacted 1', out.getvalue())
+		self.assertFalse(GuestTombstone.objects.exists())
+		self.assertTrue(self.changes(cursor)['reset'])
+
+	def test_bad_since(self):
+		self.assertEqual(self.c.get(self.url, {'since': 'x'}).status_code, 400)
@@ -0,0 +1,92 @@
+from django.test import TestCase, Client
+from django.core.management import call_command
+from django.utils.six import StringIO
+import datetime
+
+from ct.core.models import Event
+from ct.rsvp.importer import GuestImporter
+from ct.rsvp.models import EventGuest, InvitationCode
+from ct.rsvp.serializers import GuestFullSerializer, InvitationFullSerializer
+
+
+def row(first, last='', extends=''):
+	return {'pfx': '', 'first': first, 'last': last, 'plusOne': '', 'extends': extends}
+
+
+class TestInvitationCodes(TestCase):
+
+	def setUp(self):
+		self.ev = Event(name='Code Event', event_date=datetime.date.today(), rsvp_method=1)
+		self.ev.save()
+		self.c = Client()
+
+	def test_import_codes_every_invitation_in_bulk(self):
+		rows = [row('Mitchell', 'Stoutin'), row('Jaqueline', 'Stoutin', 'X'), row('Dave', 'Collier')]
+		GuestImporter(self.ev).run(iter(rows))
+		codes = InvitationCode.objects.filter(event=self.ev)
+		self.assertEqual(sorted(codes.values_list('invitation', flat=True)), [1, 2])
+		for code in codes:
+			self.assertEqual(len(code.code), InvitationCode.CODE_LENGTH)
+			self.assertTrue(set(code.code) <= set(InvitationCode.ALPHABET))
+
+	def test_generate_is_one_bulk_insert(self):
+		EventGuest.objects.bulk_create([EventGuest(event=self.ev, invitation=n, first='Guest')
+			for n in range(1, 301)])
+		with self.assertNumQueries(4): # Lookup, savepoint, INSERT, release.
+			self.assertEqual(InvitationCode.generate(self.ev.pk), 300)
+		self.assertEqual(InvitationCode.generate(self.ev.pk), 0)
+
+	def test_serializer_create_gets_a_code(self):
+		s = InvitationFullSerializer(data=[{'event': self.ev.pk, 'first': 'Dave'},
+			{'event': self.ev.pk, 'first': 'Sharon'}], many=True)
+		self.assertTrue(s.is_valid())
+		guests = s.save()
+		self.assertTrue(InvitationCode.objects.filter(event=self.ev,
+			invitation=guests[0].invitation).exists())
+
+	def test_every_serializer_path_to_a_new_invitation_gets_a_code(self):
+		s = GuestFullSerializer(data={'event': self.ev.pk, 'invitation': 4, 'first': 'Dave'})
+		self.assertTrue(s.is_valid(), s.errors)
+		dave = s.save()
+		s = GuestFullSerializer(dave, data={'invitation': 5}, partial=True)
+		self.assertTrue(s.is_valid(), s.errors)
+		s.save()
+		s = InvitationFullSerializer([], data=[{'event': self.ev.pk, 'invitation': 7,
+			'first': 'Sharon'}], many=True)
+		self.assertTrue(s.is_valid(), s.errors)
+		s.save()
+		self.assertEqual(sorted(InvitationCode.objects.filter(event=self.ev)
+			.values_list('invitation', flat=True)), [4, 5, 7])
+
+	def test_lookup_in_one_query(self):
+		GuestImporter(self.ev).run(iter([row('Mitchell', 'Stoutin'),
+			row('Jaqueline', 'Stoutin', 'X')]))
+		code = InvitationCode.objects.get(event=self.ev)
+		typed = code.formatted.lower()
+		with self.assertNumQueries(1):
+			response = self.c.get('/api/codes/{0}/'.format(typed))
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.data['invitation'], code.invitation)
+		self.assertEqual([g['first'] for g in response.data['guests']], ['Mitchell', 'Jaqueline'])
+		self.assertNotIn('status', response.data['guests'][0])
+
+	def test_unknown_code_or_method_is_404(self):
+		GuestImporter(self.ev).run(iter([row('Mitchell', 'Stoutin')]))
+		code = InvitationCode.objects.get(event=self.ev).code
+		self.assertEqual(self.c.get('/api/codes/AAAAA-AAAAA/').status_code, 404)
+		self.ev.rsvp_method = 0
+		self.ev.save()
+		self.assertEqual(self.c.get('/api/codes/{0}/'.format(code)).status_code, 404)
+
+	def test_live_search_events_get_no_codes(self):
+		self.ev.rsvp_method = 0
+		self.ev.save()
+		GuestImporter(self.ev).run(iter([row('Mitchell', 'Stoutin')]))
+		self.assertFalse(InvitationCode.objects.exists())
+
+	def test_command_backfills(self):
+		EventGuest(event=self.ev, invitation=1, first='Dave').save()
+		out = StringIO()
+		call_command('rsvp_codes', stdout=out)
+		self.assertIn('1 new code', out.getvalue())
+		self.assertEqual(InvitationCode.objects.filter(event=self.ev).count(), 1)
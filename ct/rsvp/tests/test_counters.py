@@ -0,0 +1,99 @@
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.core.management import call_command, CommandError
+from django.utils.six import StringIO
+import datetime
+
+from ct.core.models import Event
+from ct.rsvp.models import EventGuest, EventSummary
+from ct.rsvp.importer import GuestImporter
+from ct.rsvp.serializers import GuestFullSerializer
+
+
+class TestEventSummaryCounters(TestCase):
+
+	def setUp(self):
+		self.ev = Event(name='Test Event', event_date=datetime.date.today())
+		self.ev.save()
+		self.guest = EventGuest(event=self.ev, invitation=1, first='Mitchell', plusOne=2)
+		self.guest.save()
+		EventGuest(event=self.ev, invitation=1, first='Jaqueline', status=2).save()
+
+	def assertCountersMatch(self):
+		stored = EventSummary.objects.get(event=self.ev).counters()
+		self.assertEqual(stored, EventSummary.count([self.ev.pk])[self.ev.pk])
+		return stored
+
+	def test_save_and_delete_move_counters(self):
+		counters = self.assertCountersMatch()
+		self.assertEqual((counters['not_responded'], counters['not_attending']), (1, 1))
+		guest = EventGuest.objects.get(pk=self.guest.pk)
+		guest.status = 1
+		guest.save()
+		counters = self.assertCountersMatch()
+		self.assertEqual((counters['attending'], counters['plus_ones']), (1, 2))
+		guest.delete()
+		counters = self.assertCountersMatch()
+		self.assertEqual((counters['attending'], counters['plus_ones_invited']), (0, 0))
+
+	def test_stale_instances_count_a_change_once(self):
+		# Two requests load the guest, then both mark them attending.
+		first, second = [EventGuest.objects.get(pk=self.guest.pk) for n in range(2)]
+		first.status = second.status = 1
+		first.save()
+		second.save()
+		self.assertEqual(self.assertCountersMatch()['attending'], 1)
+		first.status = second.status = 2
+		EventGuest.objects.bulk_update([first], ['status'])
+		EventGuest.objects.bulk_update([second], ['status'])
+		self.assertEqual(self.assertCountersMatch()['not_attending'], 2)
+		first.delete()
+		second.delete()
+		self.assertEqual(self.assertCountersMatch()['not_attending'], 1)
+		# Only status is written, so the plusOne this instance holds isn't counted.
+		stale = EventGuest.objects.exclude(pk=self.guest.pk).get()
+		EventGuest.objects.filter(pk=stale.pk).update(plusOne=3)
+		stale.status, stale.plusOne = 1, 0
+		stale.save(update_fields=['status'])
+		counters = self.assertCountersMatch()
+		self.assertEqual((counters['attending'], counters['plus_ones']), (1, 3))
+
+	def test_serializer_update_moves_counters(self):
+		s = GuestFullSerializer(self.guest, data={'event': self.ev.pk, 'invitation': 1,
+			'first': 'Mitchell', 'status': 1, 'plusOne': 1})
+		self.assertTrue(s.is_valid())
+		s.save()
+		self.assertEqual(self.assertCountersMatch()['plus_ones'], 1)
+
+	def test_bulk_paths_move_counters(self):
+		GuestImporter(self.ev).run(iter([{'pfx': '', 'first': 'Dave', 'last': '',
+			'plusOne': '1', 'extends': ''}]))
+		self.assertEqual(self.assertCountersMatch()['not_responded'], 2)
+		EventGuest.objects.filter(event=self.ev, status=0).update(status=1)
+		self.assertEqual(self.assertCountersMatch()['attending'], 2)
+		guests = list(EventGuest.objects.filter(event=self.ev))
+		for guest in guests:
+			guest.status = 2
+		EventGuest.objects.bulk_update(guests, ['status'])
+		self.assertEqual(self.assertCountersMatch()['not_attending'], 3)
+		EventGuest.objects.filter(event=self.ev, first='Dave').delete()
+		self.assertEqual(self.assertCountersMatch()['not_attending'], 2)
+
+	def test_check_command_finds_and_fixes_drift(self):
+		EventSummary.objects.filter(event=self.ev).update(attending=40)
+		with self.assertRaises(CommandError):
+			call_command('rsvp_counters', check=True, stdout=StringIO())
+		call_command('rsvp_counters', stdout=StringIO())
+		call_command('rsvp_counters', str(self.ev.pk), check=True, stdout=StringIO())
+		self.assertCountersMatch()
+
+	def test_summary_endpoint_reads_one_row(self):
+		User.objects.create_superuser('tester', 'test@testing.com', 'testme')
+		c = Client()
+		c.login(username='tester', password='testme')
+		url = '/api/events/{0}/summary/'.format(self.ev.pk)
+		c.get(url)
+		with self.assertNumQueries(3): # session, user, summary.
+			response = c.get(url)
+		self.assertEqual(response.data['invited'], 2)
+		self.assertEqual(response.data['headcount'], 0)
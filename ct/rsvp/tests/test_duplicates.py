@@ -0,0 +1,62 @@
+from django.test import TestCase
+import datetime
+
+from ct.core.models import Event
+from ct.rsvp.duplicates import DuplicateFinder, withinDistance, EXACT, NEAR
+from ct.rsvp.importer import GuestImporter
+from ct.rsvp.models import EventGuest
+
+
+def row(first, last='', extends=''):
+	return {'pfx': '', 'first': first, 'last': last, 'plusOne': '', 'extends': extends}
+
+
+class TestDuplicateFinder(TestCase):
+
+	def setUp(self):
+		self.ev = Event.objects.create(name='Test Event', event_date=datetime.date.today())
+		self.jaqueline = EventGuest.objects.create(event=self.ev, invitation=1, first='Jaqueline',
+			last='Stoutin')
+		EventGuest.objects.create(event=self.ev, invitation=2, first='José', last="O'Brien")
+
+	def test_exact_near_and_repeated_rows(self):
+		finder = DuplicateFinder(self.ev.pk)
+		self.assertEqual(finder.check(2, '  JOSE ', 'obrien')['kind'], EXACT)
+		near = finder.check(3, 'Jacqueline', 'Stoutin')
+		self.assertEqual((near['kind'], near['guest'], near['invitation']), (NEAR, self.jaqueline.pk, 1))
+		self.assertEqual(finder.check(4, 'Dave', 'Collier'), None)
+		self.assertEqual(finder.check(5, 'Davey', 'Collier')['matches_row'], 4)
+		self.assertIsNone(finder.check(6, 'Mitchell', 'Stoutin'))
+		self.assertEqual([match['row'] for match in finder.matches], [2, 3, 5])
+
+	def test_distance(self):
+		self.assertTrue(withinDistance('kitten', 'sitting', 3))
+		self.assertFalse(withinDistance('kitten', 'sitting', 2))
+		self.assertFalse(withinDistance('al', 'alexander', 2))
+
+
+class TestImportDuplicates(TestCase):
+
+	def setUp(self):
+		self.ev = Event.objects.create(name='Test Event', event_date=datetime.date.today())
+		GuestImporter(self.ev).run(iter([row('Mitchell', 'Stoutin'), row('Jaqueline', 'Stoutin', 'X')]))
+		self.second = [row('Mitchell', 'Stoutin'), row('Jacqueline', 'Stoutin', 'X'),
+			row('Dave', 'Collier')]
+
+	def test_flag_loads_and_reports(self):
+		stats = GuestImporter(self.ev).run(iter(self.second))
+		self.assertEqual([(m['row'], m['kind']) for m in stats.duplicates], [(1, EXACT), (2, NEAR)])
+		self.assertEqual(EventGuest.objects.filter(event=self.ev).count(), 5)
+
+	def test_skip_exact(self):
+		stats = GuestImporter(self.ev, duplicates=GuestImporter.SKIP_EXACT).run(iter(self.second))
+		self.assertEqual(stats.duplicates_skipped, 1)
+		self.assertEqual(EventGuest.objects.filter(event=self.ev, first='Mitchell').count(), 1)
+		self.assertEqual(EventGuest.objects.filter(event=self.ev).count(), 4)
+
+	def test_dry_run_reports_without_loading(self):
+		stats = GuestImporter(self.ev, dry_run=True).run(iter(self.second))
+		self.assertEqual(stats.guests_created, 3)
+		self.assertEqual(len(stats.duplicates), 2)
+		self.assertEqual(EventGuest.objects.filter(event=self.ev).count(), 2)
+		self.assertEqual(EventGuest.nextFreeInvitation(self.ev), 2)
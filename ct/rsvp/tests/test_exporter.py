@@ -0,0 +1,59 @@
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+import datetime
+import io
+import json
+
+from ct.core.models import Event
+from ct.rsvp.models import EventGuest
+from ct.rsvp.importer import GuestImporter
+from ct.rsvp.views import uploadRowToDict
+from ct.rsvp import exporter
+
+
+class TestGuestExport(TestCase):
+
+	def setUp(self):
+		self.ev = Event(name='Test Event', event_date=datetime.date.today())
+		self.ev.save()
+		guests = [(1, 'Mr.', 'Mitchell', 'Stoutin', 0), (1, 'Mrs.', 'Jaqueline', 'Stoutin', 0),
+			(2, None, 'Dave', 'Collier', 1), (3, 'Dr.', 'Brian', 'McCarthy', 0),
+			(3, 'Mrs.', 'Sharon', 'McCarthy', 0), (3, None, 'Baby', None, 0)]
+		EventGuest.objects.bulk_create([EventGuest(event=self.ev, invitation=inv, pfx=pfx,
+			first=first, last=last, plusOne=plusOne, orderer=x)
+			for x, (inv, pfx, first, last, plusOne) in enumerate(guests)])
+
+	def test_chunks_follow_invitation_order_without_gaps(self):
+		chunks = list(EventGuest.objects.filter(event=self.ev).keyset_chunks(['first'], chunk_size=4))
+		self.assertEqual([len(chunk) for chunk in chunks], [4, 2])
+		self.assertEqual([row['first'] for chunk in chunks for row in chunk],
+			['Mitchell', 'Jaqueline', 'Dave', 'Brian', 'Sharon', 'Baby'])
+
+	def test_csv_round_trips_through_importer(self):
+		exported = ''.join(exporter.streamCSV(self.ev, chunk_size=2)).encode('utf-8')
+		copy = Event(name='Copy', event_date=datetime.date.today())
+		copy.save()
+		GuestImporter(copy).run(uploadRowToDict(io.BytesIO(exported)))
+		original = EventGuest.objects.filter(event=self.ev)
+		copied = EventGuest.objects.filter(event=copy)
+		self.assertEqual([(g.pfx or '', g.first, g.last or '', g.plusOne) for g in original],
+			[(g.pfx or '', g.first, g.last or '', g.plusOne) for g in copied])
+		self.assertEqual(len({g.invitation for g in copied}), 3)
+
+	def test_json_lines_use_upload_layout(self):
+		lines = ''.join(exporter.streamJSONLines(self.ev)).splitlines()
+		rows = [json.loads(line) for line in lines]
+		self.assertEqual(len(rows), 6)
+		self.assertEqual(set(rows[0].keys()), set(exporter.EXPORT_FIELDS))
+		self.assertEqual([row['extends'] for row in rows], ['', 'X', '', '', 'X', 'X'])
+
+	def test_export_endpoint_streams(self):
+		User.objects.create_superuser('tester', 'test@testing.com', 'testme')
+		c = Client()
+		c.login(username='tester', password='testme')
+		response = c.get('/api/events/{0}/export.csv'.format(self.ev.pk))
+		self.assertEqual(response.status_code, 200)
+		self.assertTrue(response.streaming)
+		content = b''.join(response.streaming_content).decode('utf-8')
+		self.assertTrue(content.startswith('Prefix,First Name,Last Name'))
+		self.assertEqual(len(content.splitlines()), 7)
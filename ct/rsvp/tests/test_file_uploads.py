@@ -88,3 +88,19 @@ class TestFileUploadOnFile2(TestCase):
 		self.assertEqual(EventGuest.objects.filter(event=self.ev, pfx='Mrs.').count(), 2)
 		self.assertEqual(EventGuest.objects.filter(event=self.ev, pfx='Miss').count(), 1)
 
+
+
+class TestDryRunUpload(TestCase):
+
+	def test_reports_duplicates_and_loads_nothing(self):
+		ev = Event.objects.create(name='Test Event', event_date=datetime.date.today())
+		EventGuest.objects.create(event=ev, invitation=1, first='Mitchell', last='Stoutin')
+		User.objects.create_superuser('tester', 'test@testing.com', 'testme')
+		c = Client()
+		c.login(username='tester', password='testme')
+		with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testfiles/test1.csv')) as f:
+			response = c.post('/uploadGuests/', {'event': ev.pk, 'csvfile': f, 'dry_run': 'on'})
+		self.assertEqual(response.status_code, 200)
+		self.assertContains(response, 'Would load 8 guests')
+		self.assertEqual(response.context['stats'].duplicates[0]['name'], 'Mitchell Stoutin')
+		self.assertEqual(EventGuest.objects.filter(event=ev).count(), 1)
@@ -0,0 +1,66 @@
+from django.test import TestCase
+import datetime
+import io
+
+from ct.core.models import Event
+from ct.rsvp.models import EventGuest
+from ct.rsvp.exceptions import GuestImportError
+from ct.rsvp.importer import GuestImporter
+from ct.rsvp.reader import GuestFileReader
+
+
+def row(pfx='', first='', last='', plusOne='', extends=''):
+	return {'pfx': pfx, 'first': first, 'last': last, 'plusOne': plusOne, 'extends': extends}
+
+
+class TestGuestImporter(TestCase):
+
+	def setUp(self):
+		self.ev = Event(name='Test Event', event_date=datetime.date.today())
+		self.ev.save()
+		self.rows = [
+			row('Prefix', 'First Name', 'Last Name', 'Plus Ones', 'Same Group'),
+			row('Mr', 'Mitchell', 'Stoutin'),
+			row('Mrs', 'Jaqueline ', 'Stoutin', extends='X'),
+			row('', 'Dave', 'Collier', '1'),
+			row('Dr', 'Brian', 'McCarthy', extends='\n'),
+			row('Ms', 'Sharon', 'McCarthy', extends='x'),
+		]
+
+	def test_imports_in_batches_and_counts_rows(self):
+		stats = GuestImporter(self.ev, batch_size=2).run(iter(self.rows))
+		self.assertEqual(stats.rows_read, 6)
+		self.assertEqual(stats.rows_skipped, 1)
+		self.assertEqual(stats.guests_created, 5)
+		self.assertEqual(stats.invitations_created, 3)
+		self.assertEqual(stats.batches, 3)
+		self.assertEqual(set(stats.timings.keys()), {'parse', 'clean', 'write'})
+		self.assertEqual(EventGuest.objects.filter(event=self.ev).count(), 5)
+
+	def test_groups_and_cleans_like_the_model(self):
+		GuestImporter(self.ev, batch_size=2).run(iter(self.rows))
+		stoutins = EventGuest.objects.filter(event=self.ev, last='Stoutin')
+		self.assertEqual(len({guest.invitation for guest in stoutins}), 1)
+		self.assertEqual({guest.pfx for guest in stoutins}, {'Mr.', 'Mrs.'})
+		self.assertTrue(EventGuest.objects.filter(event=self.ev, first='Jaqueline').exists())
+		self.assertEqual(EventGuest.objects.get(event=self.ev, first='Dave').plusOne, 1)
+
+	def test_reader_rows_are_never_taken_for_a_header(self):
+		stats = GuestImporter(self.ev).run(GuestFileReader(io.BytesIO(
+			b'Mr,Firstina,Lastly,0,\nMs,Ann,Lee,,\n')))
+		self.assertEqual((stats.guests_created, stats.rows_skipped), (2, 0))
+		self.assertTrue(EventGuest.objects.filter(event=self.ev, first='Firstina').exists())
+
+	def test_first_invitation_is_next_free_one(self):
+		EventGuest(event=self.ev, invitation=7, first='Earlier').save()
+		GuestImporter(self.ev).run(iter(self.rows))
+		self.assertEqual(EventGuest.objects.get(event=self.ev, first='Mitchell').invitation, 8)
+
+	def test_bad_batch_rolls_back_whole_import(self):
+		self.rows.append(row('Mr', 'x' * 51, 'Toolong'))
+		with self.assertRaises(GuestImportError) as caught:
+			GuestImporter(self.ev, batch_size=2).run(iter(self.rows))
+		self.assertEqual(caught.exception.batch, 4)
+		self.assertEqual(caught.exception.errors[0][0], 7)
+		self.assertIn('first', caught.exception.errors[0][1])
+		self.assertEqual(EventGuest.objects.filter(event=self.ev).count(), 0)
@@ -0,0 +1,142 @@
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth.models import User
+from django.db import OperationalError
+from unittest import mock
+import datetime
+import json
+import os
+import threading
+import time
+
+from ct.core.models import Event
+from ct.rsvp.models import EventGuest, ImportJob
+from ct.rsvp import jobs
+from ct.rsvp.importer import GuestImporter
+
+TESTFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testfiles/test1.csv')
+
+
+@override_settings(RSVP_IMPORT_JOBS_EAGER=True)
+class TestBackgroundUpload(TestCase):
+
+	def setUp(self):
+		self.ev = Event(name='Test Event', event_date=datetime.date.today())
+		self.ev.save()
+		User.objects.create_superuser('tester', 'test@testing.com', 'testme')
+		self.c = Client()
+		self.c.login(username='tester', password='testme')
+
+	def status(self, response):
+		url = json.loads(response.content.decode('utf-8'))['status_url']
+		return json.loads(self.c.get(url).content.decode('utf-8'))
+
+	def upload(self, f):
+		return self.c.post('/uploadGuests/', {'event': self.ev.pk, 'csvfile': f, 'background': 'on'})
+
+	def test_upload_returns_job_and_loads_guests(self):
+		with open(TESTFILE) as f:
+			response = self.upload(f)
+		self.assertEqual(response.status_code, 202)
+		status = self.status(response)
+		self.assertEqual(status['status'], 'Done')
+		self.assertEqual(status['rows_processed'], 9)
+		self.assertEqual(status['guests_created'], 8)
+		self.assertEqual(EventGuest.objects.filter(event=self.ev).count(), 8)
+		job = ImportJob.objects.get()
+		self.assertFalse(os.path.exists(job.path))
+
+	def test_locked_database_retries_instead_of_failing(self):
+		importerRun = GuestImporter.run
+		calls = []
+
+		def lockedOnce(importer, *args, **kwargs):
+			calls.append(1)
+			if len(calls) == 1:
+				raise OperationalError('database is locked')
+			return importerRun(importer, *args, **kwargs)
+
+		with mock.patch.object(GuestImporter, 'run', autospec=True, side_effect=lockedOnce), \
+				mock.patch.object(jobs.time, 'sleep'), self.assertLogs(jobs.logger, 'WARNING'):
+			with open(TESTFILE) as f:
+				response = self.upload(f)
+		self.assertEqual(self.status(response)['status'], 'Done')
+		self.assertEqual(len(calls), 2)
+		self.assertEqual(EventGuest.objects.filter(event=self.ev).count(), 8)
+
+	def test_bad_rows_fail_the_job(self):
+		with open(TESTFILE) as f:
+			rows = f.read() + 'Mr,{0},Long,,,,\n'.format('x' * 60)
+		spooled = os.path.join(jobs.SPOOL_DIR, 'bad.csv')
+		os.makedirs(jobs.SPOOL_DIR, exist_ok=True)
+		with open(spooled, 'w') as f:
+			f.write(rows)
+		with open(spooled) as f:
+			response = self.upload(f)
+		os.remove(spooled)
+		status = self.status(response)
+		self.assertEqual(status['status'], 'Failed')
+		self.assertEqual(status['errors'][0]['row'], 10)
+		self.assertEqual(EventGuest.objects.filter(event=self.ev).count(), 0)
+
+
+class FakeJob(object):
+	def __init__(self, pk, event_id):
+		self.pk, self.event_id = pk, event_id
+
+
+class FakeResult(object):
+	def __init__(self, status):
+		self.status = status
+
+
+class TestJobScheduling(TestCase):
+	"""
+	Scheduling only; runJob is swapped out so no database is involved.
+	"""
+
+	def setUp(self):
+		self.log = []
+		self.gates = {name: threading.Event() for name in ('a', 'b', 'c')}
+		self.done = threading.Semaphore(0)
+		self.locked = set()
+
+	def fakeRun(self, jobId, lastTry):
+		self.log.append(('start', jobId))
+		self.gates[jobId].wait(5)
+		self.log.append(('end', jobId))
+		self.done.release()
+		if jobId in self.locked:
+			self.locked.discard(jobId)
+			raise OperationalError('database is locked')
+		return FakeResult(ImportJob.DONE)
+
+	def runJobs(self, *jobIds):
+		runs = len(jobIds) + len(self.locked)
+		with mock.patch.object(jobs, 'runJob', self.fakeRun), \
+				mock.patch.object(jobs.connection, 'close'), \
+				mock.patch.object(jobs.time, 'sleep') as sleep:
+			for jobId, eventId in jobIds:
+				jobs.submit(FakeJob(jobId, eventId))
+			for gate in self.gates.values():
+				gate.set()
+			for n in range(runs):
+				self.assertTrue(self.done.acquire(timeout=5))
+			for n in range(50):
+				if not jobs._running:
+					break
+				time.sleep(0.01)
+		self.assertFalse(jobs._running)
+		self.assertEqual(list(jobs._queue), [])
+		return [jobId for event, jobId in self.log if event == 'start'], sleep.call_count
+
+	def test_one_job_at_a_time_in_order(self):
+		started, sleeps = self.runJobs(('a', 1), ('b', 1), ('c', 2))
+		self.assertEqual(started, ['a', 'b', 'c'])
+		self.assertEqual([event for event, jobId in self.log], ['start', 'end'] * 3)
+		self.assertEqual(sleeps, 0)
+
+	def test_locked_database_requeues_the_job(self):
+		self.locked.add('a')
+		started, sleeps = self.runJobs(('a', 1), ('b', 2))
+		self.assertEqual(started, ['a', 'b', 'a'])
+		self.assertEqual(sleeps, 1)
@@ -0,0 +1,108 @@
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from unittest import mock
+import datetime
+import json
+import time
+
+from ct.core.models import Event
+from ct.rsvp.models import EventGuest, EventVersion
+from ct.rsvp.serializers import GuestFullSerializer
+from ct.rsvp.views import changesSince
+from ct.rsvp import live
+
+
+def events(chunks):
+	"""
+	(event, id, data) for each server-sent event in chunks, skipping comments.
+	"""
+	for chunk in chunks:
+		fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n')
+			if line and not line.startswith(':'))
+		if 'event' in fields:
+			yield fields['event'], int(fields['id']), json.loads(fields['data'])
+
+
+class TestHub(TestCase):
+
+	def test_publish_wakes_subscribers_of_that_event_only(self):
+		hub = live.Hub()
+		mine, other = hub.subscribe(1), hub.subscribe(2)
+		hub.publish(1)
+		self.assertEqual(len(mine.wait(0)), 1)
+		self.assertEqual(other.wait(0), [])
+		hub.unsubscribe(mine)
+		hub.unsubscribe(other)
+		self.assertEqual(hub.report()['subscribers'], 0)
+
+	def test_slow_consumers_coalesce_then_get_dropped(self):
+		hub = live.Hub()
+		slow = hub.subscribe(1, size=3)
+		for x in range(5):
+			hub.publish(1)
+		self.assertEqual((len(slow.pending), slow.coalesced), (3, 2))
+		with mock.patch.object(live, 'STALL_SECONDS', 0):
+			hub.publish(1)
+		self.assertTrue(slow.closed)
+		self.assertEqual(hub.report()['disconnected'], 1)
+		self.assertEqual(hub.report()['subscribers'], 0)
+
+
+class TestEventStream(TestCase):
+
+	def setUp(self):
+		self.ev = Event(name='Test Event', event_date=datetime.date.today())
+		self.ev.save()
+		self.mitchell = EventGuest(event=self.ev, invitation=1, first='Mitchell')
+		self.mitchell.save()
+		self.url = '/api/events/{0}/stream/'.format(self.ev.pk)
+		self.c = Client()
+		User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+
+	def stream(self, cursor):
+		return live.stream(self.ev.pk, cursor, lambda since: changesSince(self.ev.pk, since),
+			maxSeconds=30, pollSeconds=30)
+
+	def test_local_writes_are_pushed_without_waiting_for_the_poll(self):
+		body = self.stream(EventVersion.current(self.ev.pk))
+		self.assertTrue(next(body).startswith('retry:'))
+		self.assertEqual(next(events([next(body)]))[0], 'ready')
+		self.assertEqual(next(body), ': keepalive\n\n')
+		serializer = GuestFullSerializer(self.mitchell, data={'status': 1}, partial=True)
+		serializer.is_valid(raise_exception=True)
+		serializer.save()
+		started = time.monotonic()
+		event, cursor, data = next(events([next(body)]))
+		self.assertLess(time.monotonic() - started, 5)
+		self.assertEqual(event, 'changes')
+		self.assertEqual([(g['first'], g['status']) for g in data['guests']], [('Mitchell', 1)])
+		self.assertEqual(cursor, EventVersion.current(self.ev.pk))
+		body.close()
+		self.assertEqual(live.hub.report()['subscribers'], 0)
+
+	def test_stream_ends_when_the_event_is_deleted(self):
+		cursor = EventVersion.current(self.ev.pk)
+		body = self.stream(cursor)
+		next(body)
+		next(body)
+		self.ev.delete()
+		self.assertEqual(list(events(body)), [('gone', cursor, {'cursor': cursor})])
+		self.assertEqual(live.hub.report()['subscribers'], 0)
+
+	def test_reconnect_resumes_from_last_event_id(self):
+		self.c.login(username='admin', password='pw')
+		cursor = EventVersion.current(self.ev.pk)
+		EventGuest.objects.filter(pk=self.mitchell.pk).delete()
+		response = self.c.get(self.url, HTTP_LAST_EVENT_ID=str(cursor))
+		self.assertEqual(response['Content-Type'], 'text/event-stream')
+		body = iter(response.streaming_content)
+		chunks = [next(body).decode('utf-8') for x in range(3)]
+		response.close()
+		received = list(events(chunks))
+		self.assertEqual(received[0], ('ready', cursor, {'cursor': cursor}))
+		event, newCursor, data = received[1]
+		self.assertEqual((event, data['deleted'], data['reset']), ('changes', [self.mitchell.pk], False))
+		self.assertGreater(newCursor, cursor)
+
+	def test_coordinators_only(self):
+		self.assertEqual(self.c.get(self.url).status_code, 403)
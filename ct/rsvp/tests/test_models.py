@@ -45,4 +45,27 @@ class TestEventGuestModel(TestCase):
 			guest.save()
 			self.assertTrue(guest.invitation > latest)
 			latest = guest.invitation
-		
\ No newline at end of file
+		
+	def test_nextFreeInvitation_reserves_blocks(self):
+		ev = Event(name='Test Event', event_date=datetime.date.today())
+		ev.save()
+		EventGuest(event=ev, invitation=3, first='FirstName').save()
+		first = EventGuest.nextFreeInvitation(ev.pk, count=5)
+		self.assertEqual(first, 4)
+		self.assertEqual(EventGuest.nextFreeInvitation(ev), 9)
+
+	def test_hand_numbered_invitations_move_the_sequence(self):
+		ev = Event(name='Test Event', event_date=datetime.date.today())
+		ev.save()
+		self.assertEqual(EventGuest.nextFreeInvitation(ev), 1)
+		EventGuest(event=ev, invitation=40, first='FirstName').save()
+		self.assertEqual(EventGuest.nextFreeInvitation(ev), 41)
+
+	def test_nextFreeInvitation_is_constant_queries(self):
+		ev = Event(name='Test Event', event_date=datetime.date.today())
+		ev.save()
+		EventGuest.objects.bulk_create([EventGuest(event=ev, invitation=x, first='F')
+			for x in range(1, 200)])
+		EventGuest.nextFreeInvitation(ev)
+		with self.assertNumQueries(2):
+			self.assertEqual(EventGuest.nextFreeInvitation(ev), 201)
@@ -0,0 +1,82 @@
+from django.test import TestCase
+import datetime
+import io
+import json
+
+from ct.core.models import Event
+from ct.rsvp.exceptions import GuestImportError
+from ct.rsvp.importer import GuestImporter
+from ct.rsvp.models import EventGuest
+from ct.rsvp.reader import GuestFileReader, headerField
+
+
+def read(data, **kwargs):
+	reader = GuestFileReader(io.BytesIO(data), **kwargs)
+	return [(row['first'], row['last']) for row in reader], reader
+
+
+class TestGuestFileReader(TestCase):
+
+	def test_quoted_commas_and_newlines(self):
+		rows, reader = read(b'Mr,"Dave, Jr.",Collier,1,\nMs,Sharon,"Blair\nSmith",,X\n')
+		self.assertEqual(rows, [('Dave, Jr.', 'Collier'), ('Sharon', 'Blair\nSmith')])
+		self.assertEqual(reader.errors, [])
+
+	def test_short_rows_and_header_aliases_in_any_order(self):
+		data = 'Surname\tGiven Name\tSame Group\r\nCollier\tDave\r\nKym\tBrian\tX\r\n'.encode('utf-8')
+		reader = GuestFileReader(io.BytesIO(data))
+		rows = list(reader)
+		self.assertEqual(reader.format, 'tsv')
+		self.assertEqual([(r['first'], r['last'], r['extends'], r['row']) for r in rows],
+			[('Dave', 'Collier', '', 2), ('Brian', 'Kym', 'X', 3)])
+		self.assertEqual(headerField('Plus Ones Invited (number, blank=0)'), 'plusOne')
+
+	def test_names_starting_with_an_alias_are_not_a_header(self):
+		rows, reader = read(b'Mr,Dave,Firstenberg,,\nMs,Ann,Lee,,\n')
+		self.assertEqual(rows, [('Dave', 'Firstenberg'), ('Ann', 'Lee')])
+		rows, reader = read(b'Ms,First,Lastname,,\n')
+		self.assertEqual(rows, [('First', 'Lastname')])
+
+	def test_encodings(self):
+		text = 'Mr,José,Álvarez,,\n'
+		for data, encoding in ((text.encode('utf-8-sig'), 'utf-8-sig'),
+				(text.encode('utf-16'), 'utf-16'), (text.encode('cp1252'), 'cp1252')):
+			rows, reader = read(data)
+			self.assertEqual(rows, [('José', 'Álvarez')])
+			self.assertEqual(reader.encoding, encoding)
+
+	def test_chunk_boundaries(self):
+		data = ''.join('Mr,"Zoë, {0}",Müller,,\r\n'.format(n) for n in range(50)).encode('utf-8')
+		rows, reader = read(data, chunk_size=7)
+		self.assertEqual(rows, [('Zoë, {0}'.format(n), 'Müller') for n in range(50)])
+
+	def test_json_lines(self):
+		lines = [json.dumps({'first': 'Dave', 'Last Name': 'Collier', 'plusOne': 1}),
+			json.dumps({'first': 'Sharon', 'extends': True}), '[1, 2]', '{"first": ']
+		reader = GuestFileReader(io.BytesIO('\n'.join(lines).encode('utf-8')))
+		rows = list(reader)
+		self.assertEqual([(r['first'], r['plusOne'], r['extends']) for r in rows],
+			[('Dave', '1', ''), ('Sharon', '', 'X')])
+		self.assertEqual([row for row, error in reader.errors], [3, 4])
+
+	def test_bad_rows_are_reported_not_fatal(self):
+		rows, reader = read(b'Mr,Dave,Collier,1,,\nMr,Stoutin, Jr.,Mitchell,0,X,\n'
+			b'Ms,"Sharon"x,Blair,,\nMs,Rachel,McCarthy,,\n')
+		self.assertEqual(rows, [('Dave', 'Collier'), ('Rachel', 'McCarthy')])
+		self.assertEqual([row for row, error in reader.errors], [2, 3])
+
+
+class TestImportReport(TestCase):
+
+	def test_every_bad_row_is_reported_and_nothing_loaded(self):
+		ev = Event.objects.create(name='Test Event', event_date=datetime.date.today())
+		lines = ['Prefix,First Name,Last Name,Plus Ones,Same Group']
+		lines += ['Mr,Guest {0},Smith,,'.format(n) for n in range(10)]
+		lines[3] = 'Mr,,Smith,,'
+		lines[8] = 'Mr,Smith, Jr.,Kym,1,X'
+		with self.assertRaises(GuestImportError) as caught:
+			GuestImporter(ev, batch_size=2).run(GuestFileReader(io.BytesIO(
+				'\n'.join(lines).encode('utf-8'))))
+		self.assertEqual([row for row, fields in caught.exception.errors], [4, 9])
+		self.assertIn('first', caught.exception.errors[0][1])
+		self.assertEqual(EventGuest.objects.filter(event=ev).count(), 0)
@@ -0,0 +1,125 @@
+from django.test import TestCase, Client
+from unittest import mock
+import datetime
+import json
+
+from ct.core.models import Event
+from ct.rsvp.exceptions import PlusOneError, StaleInvitationError
+from ct.rsvp.models import EventGuest, EventGuestQuerySet, EventSummary, InvitationCode
+
+
+class TestInvitationRSVP(TestCase):
+
+	def setUp(self):
+		self.ev = Event(name='Test Event', event_date=datetime.date.today())
+		self.ev.save()
+		self.mitchell = EventGuest(event=self.ev, invitation=1, first='Mitchell', plusOne=1)
+		self.mitchell.save()
+		self.jaqueline = EventGuest(event=self.ev, invitation=1, first='Jaqueline', orderer=1)
+		self.jaqueline.save()
+		EventGuest(event=self.ev, invitation=2, first='Dave').save()
+		self.url = '/api/events/{0}/invitations/1/rsvp/'.format(self.ev.pk)
+		self.c = Client()
+
+	def post(self, version, answers, url=None):
+		return self.c.post(url or self.url, json.dumps({'version': version, 'guests': answers}),
+			content_type='application/json')
+
+	def answers(self, mitchell=1, jaqueline=2):
+		return [{'id': self.mitchell.pk, 'status': mitchell, 'plusOne': 1},
+			{'id': self.jaqueline.pk, 'status': jaqueline, 'plusOne': 0}]
+
+	def test_answers_whole_invitation(self):
+		state = self.c.get(self.url).data
+		self.assertEqual([g['first'] for g in state['guests']], ['Mitchell', 'Jaqueline'])
+		self.assertNotIn('status', state['guests'][0])
+		response = self.post(state['version'], self.answers())
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.data['updated'], 2)
+		self.assertNotEqual(response.data['version'], state['version'])
+		self.assertEqual(list(EventGuest.objects.filter(invitation=1).values_list('status', flat=True)),
+			[1, 2])
+		report = EventSummary.objects.get(event=self.ev).report()
+		self.assertEqual((report['attending'], report['headcount']), (1, 2))
+
+	def test_one_batched_update(self):
+		version = self.c.get(self.url).data['version']
+		# Event, savepoint, guests, what they're counted as now, their events,
+		# version bump, the one UPDATE, counters, release, and re-reading the
+		# invitation for the response.
+		with self.assertNumQueries(10):
+			self.post(version, self.answers())
+
+	def test_conflicting_submission_is_rejected(self):
+		version = self.c.get(self.url).data['version']
+		self.assertEqual(self.post(version, self.answers(mitchell=1)).status_code, 200)
+		response = self.post(version, self.answers(mitchell=2))
+		self.assertEqual(response.status_code, 409)
+		self.assertEqual(EventGuest.objects.get(pk=self.mitchell.pk).status, 1)
+		retry = self.post(response.data['version'], self.answers(mitchell=2))
+		self.assertEqual(retry.status_code, 200)
+
+	def test_race_between_check_and_write_is_caught(self):
+		version = EventGuest.invitationVersion(list(EventGuest.objects.filter(invitation=1)))
+		checkVersion = EventGuest.invitationVersion
+
+		def writeThenCheck(guests):
+			# Someone else's write lands on a guest after respond() has read the
+			# invitation, so the version check passes and the guarded UPDATE has to
+			# catch it.
+			EventGuest.objects.filter(pk=self.jaqueline.pk).update(status=1)
+			return checkVersion(guests)
+
+		with mock.patch.object(EventGuest, 'invitationVersion', side_effect=writeThenCheck), \
+				mock.patch.object(EventGuestQuerySet, 'bulk_update',
+					autospec=True, side_effect=EventGuestQuerySet.bulk_update) as bulkUpdate:
+			with self.assertRaises(StaleInvitationError):
+				EventGuest.respond(self.ev.pk, 1, version, {self.mitchell.pk: (1, 1),
+					self.jaqueline.pk: (2, 0)})
+		self.assertEqual(bulkUpdate.call_count, 1)
+		self.assertEqual(list(EventGuest.objects.filter(invitation=1).values_list('status', flat=True)),
+			[0, 0])
+
+	def test_plus_ones_are_capped_at_the_allowance(self):
+		version = self.c.get(self.url).data['version']
+		response = self.post(version, [{'id': self.jaqueline.pk, 'status': 1, 'plusOne': 1}])
+		self.assertEqual(response.status_code, 400)
+		self.assertEqual(EventGuest.objects.get(pk=self.jaqueline.pk).status, 0)
+		with self.assertRaises(PlusOneError):
+			EventGuest.respond(self.ev.pk, 1, version, {self.mitchell.pk: (1, 2)})
+		self.assertEqual(self.post(version, [{'id': self.mitchell.pk, 'status': 1, 'plusOne': 1}])
+			.status_code, 200)
+
+	def test_answering_fewer_plus_ones_keeps_the_allowance(self):
+		version = self.c.get(self.url).data['version']
+		response = self.post(version, [{'id': self.mitchell.pk, 'status': 1, 'plusOne': 0}])
+		self.assertEqual(response.status_code, 200)
+		report = EventSummary.objects.get(event=self.ev).report()
+		self.assertEqual((report['plus_ones_invited'], report['headcount']), (1, 1))
+		response = self.post(response.data['version'], [{'id': self.mitchell.pk, 'status': 1,
+			'plusOne': 1}])
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(EventGuest.objects.get(pk=self.mitchell.pk).plusOne, 1)
+		stored = EventSummary.objects.get(event=self.ev)
+		self.assertEqual(stored.counters(), EventSummary.count([self.ev.pk])[self.ev.pk])
+		self.assertEqual((stored.report()['plus_ones_invited'], stored.report()['headcount']), (1, 2))
+
+	def test_guests_must_be_on_the_invitation(self):
+		version = self.c.get(self.url).data['version']
+		dave = EventGuest.objects.get(first='Dave')
+		response = self.post(version, [{'id': dave.pk, 'status': 1, 'plusOne': 0}])
+		self.assertEqual(response.status_code, 400)
+		self.assertEqual(EventGuest.objects.get(pk=dave.pk).status, 0)
+		self.assertEqual(self.post(version, [{'id': dave.pk, 'status': 7, 'plusOne': 0}]).status_code,
+			400)
+
+	def test_code_events_answer_by_code(self):
+		self.ev.rsvp_method = InvitationCode.RSVP_METHOD
+		self.ev.save()
+		self.assertEqual(self.c.get(self.url).status_code, 404)
+		InvitationCode.generate(self.ev.pk)
+		code = InvitationCode.objects.get(event=self.ev, invitation=1).formatted
+		url = '/api/codes/{0}/rsvp/'.format(code)
+		state = self.c.get(url).data
+		self.assertEqual(state['invitation'], 1)
+		self.assertEqual(self.post(state['version'], self.answers(), url=url).status_code, 200)
@@ -0,0 +1,117 @@
+from django.test import TestCase, Client
+import datetime
+
+from ct.core.models import Event
+from ct.rsvp.models import EventGuest, PUBLIC_FIELDS
+from ct.rsvp.serializers import GuestFullSerializer, InvitationFullSerializer
+from ct.rsvp.importer import GuestImporter
+from ct.rsvp import search
+
+
+class TestNormalize(TestCase):
+
+	def test_case_accents_and_apostrophes(self):
+		self.assertEqual(search.normalize("José"), 'jose')
+		self.assertEqual(search.tokenize("Renée O'Brien-Smith"), ['renee', 'obrien', 'smith'])
+
+
+class TestEventSearchIndex(TestCase):
+
+	def setUp(self):
+		search.invalidate()
+		self.ev = Event(name='Test Event', event_date=datetime.date.today())
+		self.ev.save()
+		defaults = {'event': self.ev, 'status': 1}
+		EventGuest(invitation=1, first='Mitchell', last='Stoutin', **defaults).save()
+		EventGuest(invitation=1, first='Jaqueline', last='Stoutin', orderer=1, **defaults).save()
+		EventGuest(invitation=2, first='José', last='Álvarez', **defaults).save()
+
+	def tearDown(self):
+		search.invalidate()
+
+	def test_prefix_matches_whole_invitation(self):
+		results = search.get_index(self.ev.pk).search('stou')
+		self.assertEqual(len(results), 1)
+		self.assertEqual([g['first'] for g in results[0]['guests']], ['Mitchell', 'Jaqueline'])
+
+	def test_every_term_must_match(self):
+		index = search.get_index(self.ev.pk)
+		self.assertEqual(len(index.search('jaq stoutin')), 1)
+		self.assertEqual(index.search('jose stoutin'), [])
+		self.assertEqual(index.search('ALVA')[0]['invitation'], 2)
+
+	def test_results_only_carry_public_fields(self):
+		guest = search.get_index(self.ev.pk).search('mitch')[0]['guests'][0]
+		self.assertEqual(set(guest.keys()), set(PUBLIC_FIELDS))
+
+	def test_warm_index_costs_no_queries(self):
+		search.get_index(self.ev.pk)
+		with self.assertNumQueries(0):
+			search.get_index(self.ev.pk).search('m')
+
+	def test_not_built_for_other_rsvp_methods(self):
+		self.ev.rsvp_method = 1
+		self.ev.save()
+		self.assertIsNone(search.get_index(self.ev.pk))
+
+	def test_serializer_writes_update_the_index(self):
+		index = search.get_index(self.ev.pk)
+		s = GuestFullSerializer(data={'invitation': 3, 'first': 'Dave', 'last': 'Collier',
+			'event': self.ev.pk})
+		self.assertTrue(s.is_valid())
+		dave = s.save()
+		self.assertEqual(index.search('coll')[0]['invitation'], 3)
+
+		s = GuestFullSerializer(dave, data={'invitation': 3, 'first': 'Dave', 'last': 'Kym',
+			'event': self.ev.pk})
+		self.assertTrue(s.is_valid())
+		s.save()
+		self.assertEqual(index.search('coll'), [])
+		self.assertEqual(len(index.search('kym')), 1)
+
+	def test_invitation_serializer_and_importer_update_the_index(self):
+		index = search.get_index(self.ev.pk)
+		s = InvitationFullSerializer(data=[
+			{'first': 'Brian', 'last': 'McCarthy', 'event': self.ev.pk},
+			{'first': 'Sharon', 'last': 'McCarthy', 'event': self.ev.pk}], many=True)
+		self.assertTrue(s.is_valid())
+		s.save()
+		self.assertEqual(len(index.search('mccarthy')[0]['guests']), 2)
+
+		GuestImporter(self.ev).run(iter([{'pfx': '', 'first': 'Rachel', 'last': 'Kym',
+			'plusOne': '', 'extends': ''}]))
+		self.assertEqual(index.search('rach')[0]['guests'][0]['last'], 'Kym')
+
+
+	def test_deletes_update_the_index(self):
+		index = search.get_index(self.ev.pk)
+		EventGuest.objects.get(first='José').delete()
+		self.assertEqual(index.search('jose'), [])
+		guests = list(EventGuest.objects.filter(invitation=1))
+		data = [{'id': guests[0].pk, 'event': self.ev.pk, 'invitation': 1, 'first': 'Mitchell',
+			'last': 'Stoutin'}]
+		s = InvitationFullSerializer(guests, data=data, many=True)
+		self.assertTrue(s.is_valid(), s.errors)
+		s.save()
+		self.assertEqual(index.search('jaq'), [])
+		self.assertEqual(len(index.search('stoutin')[0]['guests']), 1)
+
+class TestLiveSearchView(TestCase):
+
+	def setUp(self):
+		search.invalidate()
+		self.ev = Event(name='Test Event', event_date=datetime.date.today())
+		self.ev.save()
+		EventGuest(event=self.ev, invitation=1, first='Mitchell', last='Stoutin', status=2).save()
+
+	def test_search_endpoint(self):
+		response = Client().get('/api/events/{0}/search/'.format(self.ev.pk), {'q': 'mit'})
+		self.assertEqual(response.status_code, 200)
+		self.assertNotIn(b'status', response.content)
+		self.assertIn(b'Mitchell', response.content)
+
+	def test_search_endpoint_404s_for_code_events(self):
+		self.ev.rsvp_method = 1
+		self.ev.save()
+		response = Client().get('/api/events/{0}/search/'.format(self.ev.pk), {'q': 'mit'})
+		self.assertEqual(response.status_code, 404)
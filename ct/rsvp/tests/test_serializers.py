@@ -1,12 +1,16 @@
 from django.test import TestCase, Client
 import datetime
 
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+
 from ct.core.models import Event
 from ct.rsvp.models import EventGuest
 from ct.rsvp.exceptions import MixedInvitationError, NoEventError
 
 from ct.rsvp.serializers import (GuestFullSerializer, GuestPublicSerializer, 
-	InvitationPublicSerializer, InvitationFullSerializer, InvitationListSerializer)
+	InvitationPublicSerializer, InvitationFullSerializer, InvitationListSerializer,
+	groupInvitations)
 
 
 
@@ -89,6 +93,38 @@ class TestGuestSerializersFromPythonObjects(TestCase):
 		
 
 	
+class TestFastRepresentation(TestCase):
+
+	def setUp(self):
+		self.ev = Event(name='Test Event', event_date=datetime.date.today())
+		self.ev.save()
+		EventGuest.objects.bulk_create([
+			EventGuest(event=self.ev, invitation=2, pfx='Dr.', first='Brian', last='McCarthy',
+				orderer=1, status=1, plusOne=2),
+			EventGuest(event=self.ev, invitation=1, pfx=None, first='José', last=None),
+			EventGuest(event=self.ev, invitation=2, pfx='', first='Sharon', last="O'Brien",
+				status=2),
+		])
+		self.guests = EventGuest.objects.filter(event=self.ev)
+
+	def assertSameBytes(self, serializerClass):
+		renderer = JSONRenderer()
+		self.assertEqual(renderer.render(serializerClass.fastRepresentation(self.guests.all())),
+			renderer.render(serializerClass(self.guests.all(), many=True).data))
+
+	def test_full_matches_drf_output(self):
+		self.assertSameBytes(GuestFullSerializer)
+
+	def test_public_matches_drf_output(self):
+		self.assertSameBytes(GuestPublicSerializer)
+		self.assertNotIn('status', GuestPublicSerializer.fastRepresentation(self.guests)[0])
+
+	def test_one_query_no_instances(self):
+		with self.assertNumQueries(1):
+			rows = GuestFullSerializer.fastRepresentation(self.guests)
+		self.assertEqual(len(rows), 3)
+
+
 class TestInvitationListSerializer(TestCase):
 	
 	def setUp(self):
@@ -121,4 +157,93 @@ class TestInvitationListSerializer(TestCase):
 		self.assertEqual(qs.count(), 3)
 		invitation = {l.invitation for l in qs}
 		self.assertEqual(len(invitation), 1)
-		
\ No newline at end of file
+
+	def test_invalid_data_reserves_no_number(self):
+		for n in range(3):
+			s = InvitationFullSerializer(data=[{'event': self.ev.pk, 'plusOne': -1}], many=True)
+			self.assertFalse(s.is_valid())
+		s = InvitationFullSerializer(data=[dict(self.a, event=self.ev.pk)], many=True)
+		self.assertTrue(s.is_valid(), s.errors)
+		self.assertEqual(s.save()[0].invitation, 1)
+
+
+class TestGroupInvitations(TestCase):
+
+	def test_groups_consecutive_invitations(self):
+		guests = [{'invitation': 1, 'first': 'a'}, {'invitation': 1, 'first': 'b'},
+			{'invitation': 3, 'first': 'c'}]
+		groups = groupInvitations(guests)
+		self.assertEqual([g['invitation'] for g in groups], [1, 3])
+		self.assertEqual([g['first'] for g in groups[0]['guests']], ['a', 'b'])
+
+
+class TestInvitationListUpdate(TestCase):
+
+	def setUp(self):
+		self.ev = Event(name='Test Event', event_date=datetime.date.today())
+		self.ev.save()
+		for x, name in enumerate(['Mitchell', 'Jaqueline', 'Baby', 'Grandma']):
+			EventGuest(event=self.ev, invitation=3, first=name, last='Stoutin', orderer=x).save()
+		self.guests = list(EventGuest.objects.filter(event=self.ev))
+
+	def representation(self, guest, **changes):
+		data = {'id': guest.id, 'event': self.ev.pk, 'invitation': guest.invitation,
+			'first': guest.first, 'last': guest.last, 'orderer': guest.orderer,
+			'status': guest.status, 'plusOne': guest.plusOne, 'pfx': guest.pfx}
+		data.update(changes)
+		return data
+
+	def test_update_applies_diff_and_reports_counts(self):
+		mitchell, jaqueline, baby, grandma = self.guests
+		data = [
+			self.representation(mitchell, status=1),
+			self.representation(jaqueline),
+			self.representation(baby, first=' Daylen ', status=1),
+			{'event': self.ev.pk, 'first': 'Dave', 'last': 'Collier', 'pfx': 'mr', 'orderer': 4},
+		]
+		s = InvitationFullSerializer(self.guests, data=data, many=True)
+		self.assertTrue(s.is_valid(), s.errors)
+		result = s.save()
+		self.assertEqual(s.counts, {'created': 1, 'updated': 2, 'deleted': 1})
+		self.assertEqual([g.first for g in result], ['Mitchell', 'Jaqueline', 'Daylen', 'Dave'])
+		self.assertEqual({g.invitation for g in result}, {3})
+		self.assertEqual(EventGuest.objects.get(first='Dave').pfx, 'mr.')
+		self.assertFalse(EventGuest.objects.filter(first='Grandma').exists())
+		self.assertEqual(EventGuest.objects.get(first='Mitchell').status, 1)
+
+	def test_update_writes_are_batched(self):
+		data = [self.representation(guest, plusOne=2) for guest in self.guests]
+		s = InvitationFullSerializer(self.guests, data=data, many=True)
+		with self.assertNumQueries(1): # The event, looked up once for all guests.
+			self.assertTrue(s.is_valid(), s.errors)
+		with self.assertNumQueries(8):
+			s.save()
+		self.assertEqual(s.counts, {'created': 0, 'updated': 4, 'deleted': 0})
+
+	def test_update_matches_ids_sent_as_strings(self):
+		data = [self.representation(guest, id=str(guest.id)) for guest in self.guests]
+		data[0]['status'] = 1
+		s = InvitationFullSerializer(self.guests, data=data, many=True)
+		self.assertTrue(s.is_valid(), s.errors)
+		s.save()
+		self.assertEqual(s.counts, {'created': 0, 'updated': 1, 'deleted': 0})
+		self.assertEqual(EventGuest.objects.get(pk=self.guests[0].pk).status, 1)
+
+	def test_update_rejects_duplicate_and_unknown_ids(self):
+		other = EventGuest.objects.create(event=self.ev, invitation=4, first='Dave')
+		for data in ([self.representation(guest) for guest in self.guests + self.guests[:1]],
+				[self.representation(guest) for guest in self.guests] + [self.representation(other,
+					invitation=3)]):
+			s = InvitationFullSerializer(self.guests, data=data, many=True)
+			self.assertTrue(s.is_valid(), s.errors)
+			with self.assertRaises(ValidationError):
+				s.save()
+		self.assertEqual(EventGuest.objects.filter(event=self.ev).count(), 5)
+		self.assertEqual(EventGuest.objects.get(pk=other.pk).invitation, 4)
+
+	def test_update_rejects_other_invitations(self):
+		data = [self.representation(guest, invitation=9) for guest in self.guests]
+		s = InvitationFullSerializer(self.guests, data=data, many=True)
+		self.assertTrue(s.is_valid(), s.errors)
+		with self.assertRaises(MixedInvitationError):
+			s.save()
@@ -0,0 +1,116 @@
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from unittest import mock
+import datetime
+import json
+import os
+import tempfile
+import threading
+
+from ct.core.models import Event
+from ct.rsvp import throttles
+from ct.rsvp.coalesce import Coalescer
+from ct.rsvp.models import EventGuest, InvitationCode
+from ct.rsvp.throttles import MemoryBuckets, SharedBuckets
+
+
+class TestBuckets(TestCase):
+
+	def check(self, first, second):
+		self.assertEqual([first.take('k', 1, 2, 0), second.take('k', 1, 2, 0)], [0, 0])
+		self.assertEqual(first.take('k', 1, 2, 0), 1)
+		self.assertAlmostEqual(second.take('k', 1, 2, 0.5), 0.5)
+		self.assertEqual(first.take('k', 1, 2, 1.5), 0)
+		self.assertEqual(first.take('other', 1, 2, 1.5), 0)
+
+	def test_memory(self):
+		buckets = MemoryBuckets()
+		self.check(buckets, buckets)
+
+	def test_shared_between_processes(self):
+		handle, path = tempfile.mkstemp(suffix='.sqlite3')
+		os.close(handle)
+		self.addCleanup(os.remove, path)
+		self.check(SharedBuckets(path), SharedBuckets(path))
+
+
+class TestCoalescer(TestCase):
+
+	def test_concurrent_requests_share_one_build(self):
+		coalescer = Coalescer()
+		release = threading.Event()
+		builds, results = [], []
+
+		def build():
+			builds.append(1)
+			release.wait(5)
+			return {'answer': 42}
+
+		def request():
+			results.append(coalescer.run(('search', 1, 'mitch'), build))
+
+		threads = [threading.Thread(target=request) for n in range(4)]
+		threads[0].start()
+		while not coalescer.report()['in_flight']:
+			pass
+		for thread in threads[1:]:
+			thread.start()
+		while coalescer.report()['shared'] < 3:
+			pass
+		release.set()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(len(builds), 1)
+		self.assertEqual(results, [{'answer': 42}] * 4)
+		self.assertEqual(coalescer.report(), {'builds': 1, 'shared': 3, 'in_flight': 0})
+		self.assertEqual(coalescer.run(('search', 1, 'mitch'), lambda: 'fresh'), 'fresh')
+
+	def test_errors_are_raised_not_kept(self):
+		coalescer = Coalescer()
+		with self.assertRaises(KeyError):
+			coalescer.run(('code', 'X'), lambda: {}['X'])
+		self.assertEqual(coalescer.run(('code', 'X'), lambda: 1), 1)
+
+
+class TestThrottledEndpoints(TestCase):
+
+	def setUp(self):
+		ev = Event.objects.create(name='Test Event', event_date=datetime.date.today(),
+			rsvp_method=InvitationCode.RSVP_METHOD)
+		EventGuest.objects.create(event=ev, invitation=1, first='Mitchell')
+		InvitationCode.generate(ev.pk)
+		self.code = InvitationCode.objects.get(event=ev).formatted
+		self.searchUrl = '/api/events/{0}/search/'.format(ev.pk)
+		throttles.buckets.clear()
+		throttles.buckets.reset_stats()
+		self.addCleanup(throttles.buckets.clear)
+
+	def test_client_bucket(self):
+		c = Client()
+		url = '/api/codes/{0}/'.format(self.code)
+		with mock.patch.dict(throttles.buckets.rates, client=(0.5, 2)):
+			self.assertEqual([c.get(url).status_code for n in range(2)], [200, 200])
+			response = c.get(url)
+			self.assertEqual(response.status_code, 429)
+			self.assertEqual(response['Retry-After'], '2')
+			self.assertEqual(c.get(url, REMOTE_ADDR='10.0.0.2').status_code, 200)
+		counts = throttles.buckets.report()['scopes']['client']
+		self.assertEqual((counts['allowed'], counts['throttled']), (3, 1))
+
+	def test_event_bucket_covers_every_client(self):
+		c = Client()
+		with mock.patch.dict(throttles.buckets.rates, event=(0.1, 3)):
+			codes = [c.get(self.searchUrl, {'q': 'm'}, REMOTE_ADDR='10.0.0.{0}'.format(n)).status_code
+				for n in range(4)]
+			self.assertEqual(codes, [404, 404, 404, 429])
+			# Code lookups have no event in the URL, so only the client bucket applies.
+			self.assertEqual(c.get('/api/codes/{0}/'.format(self.code)).status_code, 200)
+
+	def test_stats_view(self):
+		User.objects.create_superuser('tester', 'test@testing.com', 'testme')
+		c = Client()
+		c.login(username='tester', password='testme')
+		c.get('/api/codes/{0}/'.format(self.code))
+		report = json.loads(c.get('/stats/throttles/').content.decode('utf-8'))
+		self.assertEqual(report['throttles']['scopes']['client']['allowed'], 1)
+		self.assertIn('shared', report['coalescing'])
@@ -0,0 +1,419 @@
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from unittest import mock
+import datetime
+import json
+
+from ct.core.models import Event, Profile
+from ct.rsvp.models import (EventGuest, EventGuestQuerySet, EventSummary, EventVersion,
+	InvitationCode)
+from ct.rsvp import cache
+
+
+class TestEventInvitationsView(TestCase):
+
+	def setUp(self):
+		cache.responses.clear()
+		self.ev = Event(name='Test Event', event_date=datetime.date.today())
+		self.ev.save()
+		defaults = {'event': self.ev, 'status': 1}
+		EventGuest(invitation=2, first='Dave', last='Collier', **defaults).save()
+		EventGuest(invitation=1, first='Jaqueline', last='Stoutin', orderer=1, **defaults).save()
+		EventGuest(invitation=1, first='Mitchell', last='Stoutin', **defaults).save()
+		self.url = '/api/events/{0}/invitations/'.format(self.ev.pk)
+		self.c = Client()
+
+	def test_groups_by_invitation_and_orderer(self):
+		response = self.c.get(self.url)
+		self.assertEqual(response.status_code, 200)
+		invitations = response.data['invitations']
+		self.assertEqual([i['invitation'] for i in invitations], [1, 2])
+		self.assertEqual([g['first'] for g in invitations[0]['guests']], ['Mitchell', 'Jaqueline'])
+		self.assertEqual(response.data['display']['and_joiner'], '&')
+		self.assertNotIn('status', invitations[0]['guests'][0])
+
+	def test_fixed_number_of_queries(self):
+		with self.assertNumQueries(3):
+			self.c.get(self.url)
+		for x in range(20):
+			EventGuest(event=self.ev, invitation=10 + x, first='Guest').save()
+		with self.assertNumQueries(3):
+			self.c.get(self.url)
+
+	def test_unchanged_list_is_304(self):
+		etag = self.c.get(self.url)['ETag']
+		with self.assertNumQueries(1):
+			response = self.c.get(self.url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 304)
+
+	def test_guest_and_event_changes_change_the_etag(self):
+		etag = self.c.get(self.url)['ETag']
+		EventGuest.objects.filter(event=self.ev, first='Dave').update(plusOne=1)
+		self.assertEqual(self.c.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+		etag = self.c.get(self.url)['ETag']
+		self.ev.and_joiner = 'and'
+		self.ev.save()
+		self.assertEqual(self.c.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+	def test_bulk_writes_bump_version(self):
+		before = EventVersion.current(self.ev.pk)
+		EventGuest.objects.bulk_create([EventGuest(event=self.ev, invitation=5, first='A')])
+		EventGuest.objects.filter(event=self.ev, invitation=5).delete()
+		self.assertEqual(EventVersion.current(self.ev.pk), before + 2)
+
+	def test_not_public_for_code_events(self):
+		self.ev.rsvp_method = 1
+		self.ev.save()
+		self.assertEqual(self.c.get(self.url).status_code, 404)
+		etag = '"{0}-{1}"'.format(self.ev.pk, EventVersion.current(self.ev.pk))
+		self.assertEqual(self.c.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+
+class TestInvitationDetailView(TestCase):
+
+	def setUp(self):
+		self.ev = Event(name='Test Event', event_date=datetime.date.today())
+		self.ev.save()
+		EventGuest(event=self.ev, invitation=1, first='Mitchell', last='Stoutin').save()
+		EventGuest(event=self.ev, invitation=1, first='Jaqueline', last='Stoutin', orderer=1).save()
+		self.url = '/api/events/{0}/invitations/1/'.format(self.ev.pk)
+		self.c = Client()
+
+	def login(self, user_type, following=None):
+		user = User.objects.create_user('coordinator', 'c@testing.com', 'testme')
+		profile = Profile.objects.create(user=user, user_type=user_type)
+		profile.followed_events.add(self.ev if following is None else following)
+		self.c.login(username='coordinator', password='testme')
+
+	def put(self, data):
+		return self.c.put(self.url, json.dumps(data), content_type='application/json')
+
+	def test_put_applies_diff(self):
+		self.login(0)
+		mitchell = self.c.get(self.url).data['guests'][0]
+		mitchell['status'] = 1
+		response = self.put([mitchell, {'first': 'Daylen', 'last': 'Stoutin', 'orderer': 2}])
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual((response.data['created'], response.data['updated'], response.data['deleted']),
+			(1, 1, 1))
+		self.assertEqual([g['first'] for g in response.data['guests']], ['Mitchell', 'Daylen'])
+
+	def test_put_to_a_new_number_takes_it_out_of_the_sequence(self):
+		self.login(0)
+		self.url = '/api/events/{0}/invitations/5/'.format(self.ev.pk)
+		self.assertEqual(self.put([{'first': 'Dave', 'last': 'Collier'}]).status_code, 200)
+		self.assertEqual(EventGuest.nextFreeInvitation(self.ev), 6)
+
+	def test_planners_can_read_but_not_write(self):
+		self.login(1)
+		self.assertEqual(self.c.get(self.url).status_code, 200)
+		self.assertEqual(self.put([]).status_code, 403)
+
+	def test_other_events_are_off_limits(self):
+		other = Event.objects.create(name='Other Event', event_date=datetime.date.today())
+		self.login(0, following=other)
+		self.assertEqual(self.c.get(self.url).status_code, 403)
+
+	def test_anonymous_users_are_refused(self):
+		self.assertEqual(self.c.get(self.url).status_code, 403)
+
+
+class TestKeysetPagination(TestCase):
+
+	def setUp(self):
+		cache.responses.clear()
+		self.ev = Event(name='Test Event', event_date=datetime.date.today())
+		self.ev.save()
+		guests = []
+		for invitation in range(1, 41):
+			for orderer in range(invitation % 3 + 1): # Invitations of 1 to 3 guests.
+				guests.append(EventGuest(event=self.ev, invitation=invitation, orderer=orderer,
+					first='Guest {0}.{1}'.format(invitation, orderer)))
+		EventGuest.objects.bulk_create(guests)
+		self.total = len(guests)
+		self.c = Client()
+		User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+		self.c.login(username='admin', password='pw')
+
+	def pages(self, url):
+		while url:
+			response = self.c.get(url)
+			self.assertEqual(response.status_code, 200)
+			yield response.data
+			url = response.data['next']
+
+	def test_guest_pages_cover_everything_without_splitting_invitations(self):
+		url = '/api/events/{0}/guests/?page_size=7'.format(self.ev.pk)
+		pages = [page['results'] for page in self.pages(url)]
+		seen = [(g['invitation'], g['orderer']) for page in pages for g in page]
+		self.assertEqual(len(seen), self.total)
+		self.assertEqual(seen, sorted(seen))
+		for before, after in zip(pages, pages[1:]):
+			self.assertGreaterEqual(len(before), 7)
+			self.assertLess(before[-1]['invitation'], after[0]['invitation'])
+		self.assertIn('status', pages[0][0])
+
+	def test_late_pages_cost_the_same_as_the_first(self):
+		url = '/api/events/{0}/guests/?page_size=5'.format(self.ev.pk)
+		first = self.c.get(url)
+		cursor = self.c.get(url + '&cursor=30')
+		self.assertEqual(cursor.data['results'][0]['invitation'], 31)
+		# Session, user, event, where the page ends, whether there's more, the page.
+		with self.assertNumQueries(6):
+			self.c.get(url)
+		with self.assertNumQueries(6):
+			self.c.get(url + '&cursor=30')
+
+	def test_invitation_pages(self):
+		self.c.logout()
+		url = '/api/events/{0}/invitations/?page_size=10'.format(self.ev.pk)
+		pages = list(self.pages(url))
+		numbers = [i['invitation'] for page in pages for i in page['invitations']]
+		self.assertEqual(numbers, list(range(1, 41)))
+		self.assertIsNone(pages[-1]['next'])
+		self.assertNotIn('next', self.c.get('/api/events/{0}/invitations/'.format(self.ev.pk)).data)
+
+	def test_bad_cursor(self):
+		url = '/api/events/{0}/guests/?cursor=abc'.format(self.ev.pk)
+		self.assertEqual(self.c.get(url).status_code, 400)
+
+
+class TestPlannerDashboard(TestCase):
+
+	def setUp(self):
+		user = User.objects.create_user('planner', 'p@testing.com', 'testme')
+		self.profile = Profile.objects.create(user=user, user_type=1)
+		self.c = Client()
+		self.c.login(username='planner', password='testme')
+
+	def follow(self, count):
+		for x in range(count):
+			ev = Event.objects.create(name='Event {0}'.format(x),
+				event_date=datetime.date.today() + datetime.timedelta(days=count - x))
+			EventGuest(event=ev, invitation=1, first='Dave', status=1, plusOne=1).save()
+			EventGuest(event=ev, invitation=2, first='Sharon').save()
+			self.profile.followed_events.add(ev)
+
+	def test_lists_followed_events_with_summaries(self):
+		self.follow(2)
+		Event.objects.create(name='Unfollowed', event_date=datetime.date.today())
+		events = self.c.get('/api/dashboard/').data['events']
+		self.assertEqual([ev['name'] for ev in events], ['Event 1', 'Event 0'])
+		self.assertEqual(events[0]['summary']['invited'], 2)
+		self.assertEqual(events[0]['summary']['headcount'], 2)
+
+	def test_constant_queries(self):
+		self.follow(2)
+		with self.assertNumQueries(4): # Session, user, profile, events.
+			self.c.get('/api/dashboard/')
+		self.follow(10)
+		with self.assertNumQueries(4):
+			self.assertEqual(len(self.c.get('/api/dashboard/').data['events']), 12)
+
+	def test_following_is_indexed_relation(self):
+		self.follow(1)
+		ev = self.profile.followed_events.get()
+		self.assertTrue(self.profile.follows(ev.pk))
+		self.assertFalse(self.profile.follows(ev.pk + 1))
+		self.assertEqual(self.profile.followedEventIds(), {ev.pk})
+
+
+class TestBulkInvitationCreate(TestCase):
+
+	def setUp(self):
+		self.ev = Event.objects.create(name='Test Event', event_date=datetime.date.today())
+		EventGuest(event=self.ev, invitation=1, first='Dave').save()
+		self.url = '/api/events/{0}/invitations/bulk/'.format(self.ev.pk)
+		self.c = Client()
+		User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+		self.c.login(username='admin', password='pw')
+
+	def post(self, count):
+		invitations = [{'guests': [{'first': 'Guest {0}'.format(n), 'last': 'Smith', 'pfx': 'mr'},
+			{'first': 'Partner {0}'.format(n), 'orderer': 1}]} for n in range(count)]
+		return self.c.post(self.url, json.dumps({'invitations': invitations}),
+			content_type='application/json')
+
+	def test_creates_numbered_invitations(self):
+		response = self.post(3)
+		self.assertEqual(response.status_code, 201)
+		invitations = response.data['invitations']
+		self.assertEqual([i['invitation'] for i in invitations], [2, 3, 4])
+		self.assertEqual([g['first'] for g in invitations[1]['guests']], ['Guest 1', 'Partner 1'])
+		self.assertEqual(invitations[0]['guests'][0]['pfx'], 'mr.')
+		self.assertIsNotNone(invitations[0]['guests'][0]['id'])
+		self.assertEqual(EventGuest.objects.filter(event=self.ev).count(), 7)
+
+	def test_constant_queries(self):
+		self.post(1)
+		# Session, user, event, event for validation, reserving numbers (advance,
+		# read), inserting (savepoint, version bump and read, INSERT, counters,
+		# sequence, release), and reading the invitations back. SQLite splits the
+		# INSERT every 999 parameters, so keep to 90 guests here.
+		with self.assertNumQueries(14):
+			self.post(2)
+		with self.assertNumQueries(14):
+			self.post(45)
+
+	def test_invalid_guest_creates_nothing(self):
+		body = {'invitations': [{'guests': [{'first': 'Fine'}]}, {'guests': [{'last': 'No First'}]},
+			{'guests': []}]}
+		response = self.c.post(self.url, json.dumps(body), content_type='application/json')
+		self.assertEqual(response.status_code, 400)
+		errors = response.data['invitations']
+		self.assertEqual(sorted(errors), [1, 2])
+		self.assertIn('first', errors[1][0])
+		self.assertEqual(EventGuest.objects.filter(event=self.ev).count(), 1)
+
+	def test_code_events_get_codes(self):
+		self.ev.rsvp_method = 1
+		self.ev.save()
+		invitations = self.post(2).data['invitations']
+		self.assertEqual(len({i['code'] for i in invitations}), 2)
+
+
+class TestArrangeInvitations(TestCase):
+
+	def setUp(self):
+		self.ev = Event.objects.create(name='Test Event', event_date=datetime.date.today())
+		self.g = {}
+		invitations = ((1, ('Mitchell', 'Jaqueline', 'Sharon', 'Dave')), (2, ('Brian', 'Kym')),
+			(3, ('Rachel',)))
+		for invitation, names in invitations:
+			for orderer, name in enumerate(names):
+				self.g[name] = EventGuest.objects.create(event=self.ev, invitation=invitation,
+					orderer=orderer, first=name).pk
+		self.url = '/api/events/{0}/invitations/arrange/'.format(self.ev.pk)
+		self.c = Client()
+		User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+		self.c.login(username='admin', password='pw')
+
+	def post(self, body):
+		return self.c.post(self.url, json.dumps(body), content_type='application/json')
+
+	def ids(self, *names):
+		return [self.g[name] for name in names]
+
+	def order(self, invitation):
+		return list(EventGuest.objects.filter(event=self.ev, invitation=invitation).order_by(
+			'orderer').values_list('first', flat=True))
+
+	def test_reorder_in_one_update(self):
+		body = {'invitations': {'1': self.ids('Dave', 'Mitchell', 'Jaqueline', 'Sharon')}}
+		# Session, user, event, savepoint, reading the guests, their events,
+		# version bump, the one UPDATE, release, and reading the result back.
+		with self.assertNumQueries(10):
+			response = self.post(body)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.data['updated'], 4)
+		self.assertEqual(self.order(1), ['Dave', 'Mitchell', 'Jaqueline', 'Sharon'])
+
+	def test_moves_between_and_onto_new_invitations(self):
+		version = EventVersion.objects.get(event=self.ev).version
+		response = self.post({'invitations': {'1': self.ids('Mitchell', 'Jaqueline'),
+			'2': self.ids('Brian', 'Sharon', 'Kym')}, 'new': [self.ids('Dave')]})
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.data['new'], [4])
+		self.assertEqual(response.data['invitations'][2], self.ids('Brian', 'Sharon', 'Kym'))
+		self.assertEqual((self.order(1), self.order(2), self.order(4)),
+			(['Mitchell', 'Jaqueline'], ['Brian', 'Sharon', 'Kym'], ['Dave']))
+		self.assertEqual(self.order(3), ['Rachel'])
+		self.assertGreater(EventVersion.objects.get(event=self.ev).version, version)
+		self.assertEqual(EventGuest.nextFreeInvitation(self.ev), 5)
+
+	def test_write_landing_mid_arrangement_is_409(self):
+		bulkUpdate = EventGuestQuerySet.bulk_update
+
+		def writeThenUpdate(queryset, guests, fields):
+			# Someone else edits a guest after arrange() has read them.
+			EventGuest.objects.filter(pk=self.g['Sharon']).update(last='Collier')
+			return bulkUpdate(queryset, guests, fields)
+
+		with mock.patch.object(EventGuestQuerySet, 'bulk_update', autospec=True,
+				side_effect=writeThenUpdate):
+			response = self.post({'invitations': {'1': self.ids('Sharon', 'Dave', 'Mitchell')},
+				'new': [self.ids('Jaqueline')]})
+		self.assertEqual(response.status_code, 409)
+		self.assertEqual(self.order(1), ['Mitchell', 'Jaqueline', 'Sharon', 'Dave'])
+		self.assertEqual(EventGuest.nextFreeInvitation(self.ev), 4)
+
+	def test_bad_arrangements_change_nothing(self):
+		stranger = EventGuest.objects.create(event=Event.objects.create(name='Other',
+			event_date=datetime.date.today()), invitation=1, first='Stranger').pk
+		for body in ({'invitations': {'2': self.ids('Brian')}},
+				{'invitations': {'2': self.ids('Brian', 'Kym', 'Rachel'), '3': self.ids('Rachel')}},
+				{'invitations': {'9': self.ids('Rachel')}},
+				{'invitations': {'3': self.ids('Rachel') + [stranger]}}):
+			self.assertEqual(self.post(body).status_code, 400)
+		for body in ({}, {'new': [[]]}, {'invitations': {'x': self.ids('Rachel')}}):
+			self.assertEqual(self.post(body).status_code, 400)
+		self.assertEqual(self.order(2), ['Brian', 'Kym'])
+		self.assertEqual(self.order(3), ['Rachel'])
+
+
+class TestCloneEvent(TestCase):
+
+	def setUp(self):
+		self.ev = Event.objects.create(name='Wedding', event_date=datetime.date(2026, 6, 6),
+			and_joiner='and', rsvp_method=1)
+		guests = ((1, 'Mitchell', 1, 1), (1, 'Jaqueline', 1, 0), (2, 'Dave', 2, 0),
+			(2, 'Sharon', 1, 0), (3, 'Brian', 0, 2))
+		for orderer, (invitation, name, status, plusOne) in enumerate(guests):
+			EventGuest.objects.create(event=self.ev, invitation=invitation, orderer=5 - orderer,
+				first=name, status=status, plusOne=plusOne)
+		self.user = User.objects.create_user('coordinator', 'c@example.com', 'pw')
+		Profile.objects.create(user=self.user, user_type=0).followed_events.add(self.ev)
+		self.c = Client()
+		self.c.login(username='coordinator', password='pw')
+		self.url = '/api/events/{0}/clone/'.format(self.ev.pk)
+
+	def post(self, body):
+		return self.c.post(self.url, json.dumps(body), content_type='application/json')
+
+	def guests(self, eventId):
+		return list(EventGuest.objects.filter(event_id=eventId).order_by('invitation',
+			'orderer').values_list('invitation', 'first', 'status', 'plusOne'))
+
+	def test_copies_everything_with_statuses_reset(self):
+		response = self.post({'name': 'Brunch', 'event_date': '2026-06-07'})
+		self.assertEqual(response.status_code, 201)
+		self.assertEqual(response.data['guests'], 5)
+		clone = Event.objects.get(pk=response.data['event'])
+		self.assertEqual((clone.name, clone.event_date, clone.and_joiner, clone.rsvp_method),
+			('Brunch', datetime.date(2026, 6, 7), 'and', 1))
+		self.assertEqual(self.guests(clone.pk),
+			[(i, name, 0, p) for i, name, s, p in self.guests(self.ev.pk)])
+		self.assertEqual(EventSummary.objects.get(event=clone).report()['not_responded'], 5)
+		self.assertEqual(InvitationCode.objects.filter(event=clone).count(), 3)
+		self.assertEqual(EventGuest.nextFreeInvitation(clone), 4)
+		versions = set(EventGuest.objects.filter(event=clone).values_list('change_seq', flat=True))
+		self.assertEqual(versions, {EventVersion.current(clone.pk)})
+		# The coordinator follows the copy, so they can run it.
+		self.assertEqual(self.c.get('/api/events/{0}/summary/'.format(clone.pk)).status_code, 200)
+
+	def test_only_attending(self):
+		clone = self.post({'statuses': [1]}).data['event']
+		self.assertEqual([g[1] for g in self.guests(clone)], ['Jaqueline', 'Mitchell', 'Sharon'])
+		clone = self.post({'statuses': [1], 'whole_invitations': True}).data['event']
+		self.assertEqual([g[1] for g in self.guests(clone)],
+			['Jaqueline', 'Mitchell', 'Sharon', 'Dave'])
+		self.assertEqual(Event.objects.get(pk=clone).name, 'Wedding')
+
+	def test_set_based(self):
+		for n in range(200):
+			EventGuest(event=self.ev, invitation=10 + n, first='Guest {0}'.format(n)).save()
+		# Session, user, profile, follow check and event; then in one
+		# transaction the new event and its version (4), followers (3), version
+		# bump and read, the one INSERT ... SELECT for the guests, counters (6)
+		# and codes (4). The same however many guests there are, apart from
+		# the codes INSERT, which SQLite splits every 333 invitations.
+		with self.assertNumQueries(28):
+			self.assertEqual(self.post({}).data['guests'], 205)
+
+	def test_bad_options_and_planners(self):
+		self.assertEqual(self.post({'statuses': [7]}).status_code, 400)
+		self.assertEqual(self.post({'statuses': []}).status_code, 400)
+		self.user.ctprofile.user_type = 1
+		self.user.ctprofile.save()
+		self.assertEqual(self.post({}).status_code, 403)
+		self.assertEqual(Event.objects.count(), 1)
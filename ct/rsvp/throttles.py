@@ -0,0 +1,223 @@
+"""
+Token bucket rate limits for the public RSVP endpoints.
+
+When the wedding site's link goes out, every guest hits live search and the
+invitation endpoints at once. Each request takes a token from two buckets: one
+for the client (by IP, see DRF's NUM_PROXIES setting for what counts as the
+client behind a proxy) and one for the event. A bucket holds up to BURST
+tokens and refills at RATE tokens a second; a request that finds its bucket
+empty gets a 429 with a Retry-After of however long the next token takes. The
+client bucket is checked first, so one busy client doesn't use up the event's
+tokens. Endpoints found by invitation code have no event id in the URL, and
+working it out would cost the query we're trying to save, so they only have
+the client bucket.
+
+Configure with settings.RSVP_THROTTLE, e.g.
+
+	RSVP_THROTTLE = {'BACKEND': 'shared', 'PATH': '/var/run/cheekyteak/throttle.sqlite3',
+		'CLIENT': (10, 60), 'EVENT': (200, 1000)}
+
+CLIENT and EVENT are (RATE, BURST). BACKEND is 'memory' (the default, buckets
+per worker process, so each worker allows the full rate), 'shared' (one SQLite
+file for every worker on the box) or None to turn throttling off.
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+THROTTLE_SETTINGS = getattr(settings, 'RSVP_THROTTLE', {})
+DEFAULT_RATES = {'client': (10, 60), 'event': (200, 1000)}
+DEFAULT_MAX_KEYS = 100000
+
+
+def refill(tokens, stamp, now, rate, burst):
+	"""
+	Tokens in a bucket that held `tokens` at `stamp`, at `now`.
+	"""
+	return min(burst, tokens + (now - stamp) * rate)
+
+
+class MemoryBuckets(object):
+	"""
+	Buckets in this process. Keeps the max_keys most recently used; a bucket
+	that falls off the end just starts full again next time.
+	"""
+
+	def __init__(self, max_keys=DEFAULT_MAX_KEYS):
+		self.max_keys = max_keys
+		self.lock = threading.Lock()
+		self.buckets = OrderedDict()
+
+	def take(self, key, rate, burst, now):
+		"""
+		Takes a token from key's bucket. Returns 0 if there was one, otherwise
+		how many seconds until there will be.
+		"""
+		with self.lock:
+			tokens, stamp = self.buckets.pop(key, (burst, now))
+			tokens = refill(tokens, stamp, now, rate, burst)
+			wait = 0
+			if tokens >= 1:
+				tokens -= 1
+			else:
+				wait = (1 - tokens) / rate
+			self.buckets[key] = (tokens, now)
+			while len(self.buckets) > self.max_keys:
+				self.buckets.popitem(last=False)
+			return wait
+
+	def clear(self):
+		with self.lock:
+			self.buckets = OrderedDict()
+
+	def usage(self):
+		return {'buckets': len(self.buckets)}
+
+
+class SharedBuckets(object):
+	"""
+	Buckets in a SQLite file shared by every worker process on the box. Each
+	take() is one short write transaction. Buckets that have had time to fill
+	up again are the same as no bucket, so they're pruned now and then.
+	"""
+
+	PRUNE_EVERY = 1000
+
+	def __init__(self, path=None):
+		self.path = path or os.path.join(tempfile.gettempdir(), 'cheekyteak-throttle.sqlite3')
+		self.local = threading.local()
+		self.takes = 0
+		with self.connection() as db:
+			db.execute('CREATE TABLE IF NOT EXISTS bucket '
+				'(key TEXT PRIMARY KEY, tokens REAL NOT NULL, stamp REAL NOT NULL, full REAL NOT NULL)')
+
+	def connection(self):
+		db = getattr(self.local, 'db', None)
+		if db is None:
+			db = self.local.db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+			db.execute('PRAGMA journal_mode=WAL')
+			db.execute('PRAGMA synchronous=OFF')
+		return db
+
+	def take(self, key, rate, burst, now):
+		db = self.connection()
+		db.execute('BEGIN IMMEDIATE')
+		try:
+			row = db.execute('SELECT tokens, stamp FROM bucket WHERE key = ?', (key,)).fetchone()
+			tokens = refill(row[0], row[1], now, rate, burst) if row else burst
+			wait = 0
+			if tokens >= 1:
+				tokens -= 1
+			else:
+				wait = (1 - tokens) / rate
+			db.execute('INSERT OR REPLACE INTO bucket VALUES (?, ?, ?, ?)',
+				(key, tokens, now, now + (burst - tokens) / rate))
+			self.takes += 1
+			if self.takes % self.PRUNE_EVERY == 0:
+				db.execute('DELETE FROM bucket WHERE full < ?', (now,))
+			db.execute('COMMIT')
+		except Exception:
+			db.execute('ROLLBACK')
+			raise
+		return wait
+
+	def clear(self):
+		self.connection().execute('DELETE FROM bucket')
+
+	def usage(self):
+		return {'buckets': self.connection().execute('SELECT count(*) FROM bucket').fetchone()[0]}
+
+
+def makeBackend(options):
+	kind = options.get('BACKEND', 'memory')
+	if kind is None:
+		return None
+	if kind == 'memory':
+		return MemoryBuckets(options.get('MAX_KEYS', DEFAULT_MAX_KEYS))
+	if kind == 'shared':
+		return SharedBuckets(options.get('PATH'))
+	raise ValueError('Unknown RSVP_THROTTLE backend {0!r}.'.format(kind))
+
+
+class Throttles(object):
+	"""
+	The backend, each scope's (rate, burst) and allowed/throttled counters.
+	"""
+
+	def __init__(self, backend, rates):
+		self.backend = backend
+		self.rates = rates
+		self.lock = threading.Lock()
+		self.reset_stats()
+
+	def reset_stats(self):
+		with self.lock:
+			self.counts = {scope: {'allowed': 0, 'throttled': 0} for scope in self.rates}
+
+	def take(self, scope, ident):
+		"""
+		0 if the request may go ahead, otherwise the seconds it should wait.
+		"""
+		if self.backend is None:
+			return 0
+		rate, burst = self.rates[scope]
+		wait = self.backend.take('{0}:{1}'.format(scope, ident), rate, burst, time.time())
+		with self.lock:
+			self.counts[scope]['throttled' if wait else 'allowed'] += 1
+		return wait
+
+	def clear(self):
+		if self.backend is not None:
+			self.backend.clear()
+
+	def report(self):
+		with self.lock:
+			report = {
+				'backend': type(self.backend).__name__ if self.backend is not None else None,
+				'scopes': {scope: dict(self.counts[scope], rate=rate, burst=burst)
+					for scope, (rate, burst) in self.rates.items()},
+			}
+		if self.backend is not None:
+			report.update(self.backend.usage())
+		return report
+
+
+buckets = Throttles(makeBackend(THROTTLE_SETTINGS), {
+	'client': tuple(THROTTLE_SETTINGS.get('CLIENT', DEFAULT_RATES['client'])),
+	'event': tuple(THROTTLE_SETTINGS.get('EVENT', DEFAULT_RATES['event'])),
+})
+
+
+class BucketThrottle(BaseThrottle):
+	scope = None
+
+	def ident(self, request, view):
+		raise NotImplementedError
+
+	def allow_request(self, request, view):
+		ident = self.ident(request, view)
+		self.delay = buckets.take(self.scope, ident) if ident is not None else 0
+		return not self.delay
+
+	def wait(self):
+		return self.delay
+
+
+class ClientRateThrottle(BucketThrottle):
+	scope = 'client'
+
+	def ident(self, request, view):
+		return self.get_ident(request)
+
+
+class EventRateThrottle(BucketThrottle):
+	scope = 'event'
+
+	def ident(self, request, view):
+		return view.kwargs.get('event_id')
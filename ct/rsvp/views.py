@@ -1,23 +1,159 @@
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import user_passes_test
+from django.core.urlresolvers import reverse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework import status
+from rest_framework.response import Response
 
+from ct.core.db import readFromReplica
+from ct.core.instrumentation import timed
 from ct.core.models import Event
-from .models import EventGuest
+from .exceptions import GuestImportError, MixedInvitationError, PlusOneError, StaleInvitationError
+from . import cache, exporter, jobs, live, throttles
+from .coalesce import coalescer
 from .forms import UploadFileForm
+from .importer import GuestImporter
+from .models import (EventGuest, EventVersion, EventSummary, GuestTombstone, ImportJob,
+	InvitationCode, PUBLIC_FIELDS)
+from .permissions import IsEventCoordinator
+from .reader import GuestFileReader
+from .serializers import (ArrangementSerializer, EventCloneSerializer, EventDisplayInfoSerializer,
+	GuestFullSerializer, GuestPublicSerializer, InvitationBatchSerializer, InvitationFullSerializer,
+	RSVPSerializer, groupInvitations)
+from . import search
 
 
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
 ######### HELPER FUNCTIONS ##########
+def eventVersionETag(request, event_id, *args, **kwargs):
+	"""
+	ETag for the invitation list of a "Live Search" event, from its guest list
+	and display settings. None for other events, so they get their 404 rather
+	than a 304.
+	"""
+	version = EventVersion.objects.filter(event_id=event_id,
+		event__rsvp_method=search.LIVE_SEARCH).values_list('version', flat=True).first()
+	request.eventVersion = version # Saves the view reading it again.
+	if version is None:
+		return None
+	etag = '{0}-{1}'.format(event_id, version)
+	if 'cursor' in request.GET or 'page_size' in request.GET:
+		# Each keyset page is its own representation.
+		etag += '-{0}-{1}'.format(request.GET.get('cursor', ''), request.GET.get('page_size', ''))
+	return etag
+
 def uploadRowToDict(fileobj):
 	"""
-	Helper Generator function. Unfortunately csv.DictReader doesn't play nice with djagno's
-	uploaded file classes, so this acts as a parser.
+	Row dicts from an uploaded guest file, CSV, tab separated or JSON lines.
+	See reader.py; rows it couldn't read end up in the result's errors.
 	"""
-	for row in fileobj:
-		rowlist = row.decode('utf-8').split(',')
-		returndict = {}
-		for inx, x in enumerate(['pfx', 'first', 'last', 'plusOne', 'extends']):
-			returndict[x] = rowlist[inx]
-		yield returndict
+	return GuestFileReader(fileobj)
+
+def pageParams(request, required=False):
+	"""
+	(cursor, page size) from ?cursor=&page_size=, or None if the request gave
+	neither and required is False. Raises ValueError if either isn't a number.
+	"""
+	params = request.query_params
+	if not required and 'cursor' not in params and 'page_size' not in params:
+		return None
+	size = max(1, min(int(params.get('page_size', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+	cursor = int(params['cursor']) if params.get('cursor') else None
+	return cursor, size
+
+def keysetPage(request, guests, params):
+	"""
+	The page of guests (see EventGuestQuerySet.invitation_page) that
+	pageParams asked for, and a link to the next page or None.
+	"""
+	cursor, size = params
+	page, after = guests.invitation_page(size, after=cursor)
+	if after is None:
+		return page, None
+	query = request.GET.copy()
+	query['cursor'] = after
+	query['page_size'] = size
+	return page, request.build_absolute_uri('{0}?{1}'.format(request.path, query.urlencode()))
+
+def changesSince(event_id, since):
+	"""
+	The change feed payload for an event since a cursor (see eventChanges), or
+	None if there's no such event.
+	"""
+	row = EventVersion.objects.filter(event_id=event_id).values_list(
+		'version', 'compacted_through').first()
+	if row is None:
+		return None
+	cursor, compactedThrough = row
+	reset = since is None or since < compactedThrough
+	changes = {'cursor': cursor, 'reset': reset, 'guests': [], 'deleted': []}
+	if not reset and since >= cursor:
+		return changes
+
+	guests = EventGuest.objects.filter(event_id=event_id)
+	if not reset:
+		guests = guests.filter(change_seq__gt=since)
+		changes['deleted'] = list(GuestTombstone.objects.filter(event_id=event_id,
+			change_seq__gt=since).order_by('change_seq').values_list('guest_id', flat=True))
+	with timed('serializer'):
+		changes['guests'] = GuestFullSerializer.fastRepresentation(guests)
+	return changes
+
+def rsvpState(event_id, invitation):
+	"""
+	What the public app needs to answer for an invitation: its guests'
+	PUBLIC_FIELDS and the version token to send back with the answers. None if
+	the invitation has no guests.
+	"""
+	guests = list(EventGuest.objects.filter(event_id=event_id, invitation=invitation))
+	if not guests:
+		return None
+	return {
+		'event': int(event_id),
+		'invitation': int(invitation),
+		'version': EventGuest.invitationVersion(guests),
+		'guests': GuestPublicSerializer(guests, many=True).data,
+	}
+
+def answerInvitation(request, event_id, invitation):
+	"""
+	GET the invitation's rsvpState, or POST
+	{"version": <its version>, "guests": [{"id": .., "status": .., "plusOne": ..}, ..]}
+	to answer for any of its guests in one go. If someone else has answered
+	for the invitation in the meantime, nothing is written and the response is
+	409 with the current state, so the app can show it and ask again.
+	"""
+	if request.method == 'GET':
+		state = coalescer.run(('rsvp', int(event_id), int(invitation)),
+			lambda: rsvpState(event_id, invitation))
+		if state is None:
+			raise Http404
+		return Response(state)
+
+	serializer = RSVPSerializer(data=request.data)
+	serializer.is_valid(raise_exception=True)
+	try:
+		updated = EventGuest.respond(event_id, invitation, serializer.validated_data['version'],
+			serializer.answers)
+	except (MixedInvitationError, PlusOneError) as e:
+		return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+	except StaleInvitationError:
+		state = rsvpState(event_id, invitation)
+		if state is None:
+			raise Http404
+		state['detail'] = 'This invitation has changed since it was loaded.'
+		return Response(state, status=status.HTTP_409_CONFLICT)
+	if updated:
+		search.invitations_changed(event_id, invitation)
+		live.publish(event_id)
+	state = rsvpState(event_id, invitation)
+	state['updated'] = updated
+	return Response(state)
 
 ####### REGULAR VIEWS #######
 @user_passes_test(lambda x: x.is_superuser)
@@ -26,9 +162,15 @@ def loadEventWithGuests(request):
 	Form that submits a CSV of guests to be loaded into an event.
 	For a reference on the CSV file, see the html page this view renders on GET.
 
-	Note that this is very pared down for convenience. Allows me to feed in a
-	big list for the demo. A production version would have a lot more validity
-	checks and helpful error handling.
+	Rows are cleaned and bulk inserted in batches inside a single transaction
+	(see importer.GuestImporter), so a file with a bad row loads nothing at all.
+
+	Tick "background" to load a big file as an ImportJob instead: the response
+	is a 202 with the job id right away, and importJobStatus reports progress.
+
+	Rows that look like guests the event already has are listed on the result
+	page (see duplicates.py), and can be left out if they match exactly. A dry
+	run checks the file and shows that report without loading anything.
 
 	Locked down to superuser, because even in the demo, I don't want other people
 	using this. (My database rows are limited in free tier!)
@@ -43,24 +185,427 @@ def loadEventWithGuests(request):
 		form = UploadFileForm(request.POST, request.FILES)
 		if form.is_valid():
 			ev = get_object_or_404(Event, pk=form.cleaned_data['event'])
-			guests = EventGuest.objects.filter(event=ev)
-			NextInvite = EventGuest.nextFreeInvitation(ev)
-			falseExtends = {'n', 'f', 'no', 'false', ''}
 			csvFile = request.FILES['csvfile']
-			for index, reader in enumerate(uploadRowToDict(csvFile)):
-				#CSV headers aren't guests.
-				if not (index==0 and 'first' in reader['first'].lower() and 'last' in reader['last'].lower()):
-					if reader['extends'] in falseExtends:
-						NextInvite += 1
-					try:
-						plusOne = int(reader['plusOne'])
-					except ValueError:
-						plusOne = 0
-					guest = EventGuest(event=ev, status=0, invitation=NextInvite,
-						pfx=reader['pfx'], first=reader['first'], last=reader['last'],
-						plusOne=plusOne)
-					guest.clean() # Does a bit of custom validation, see model.
-					guest.save()
-			return render(request, 'thanks.html')
+			duplicates = form.cleaned_data['duplicates'] or GuestImporter.FLAG
+			dryRun = form.cleaned_data['dry_run']
+			if form.cleaned_data['background'] and not dryRun:
+				job = ImportJob.objects.create(event=ev, path=jobs.spool(csvFile),
+					duplicates=duplicates)
+				jobs.submit(job)
+				return JsonResponse({'job': str(job.pk),
+					'status_url': reverse('import_job_status', args=[job.pk])}, status=202)
+			try:
+				stats = GuestImporter(ev, duplicates=duplicates, dry_run=dryRun).run(
+					uploadRowToDict(csvFile))
+			except GuestImportError as e:
+				# Nothing was written; the importer rolled the whole file back.
+				return render(request, 'fileParseError.html',
+					context={'errors': e.errors}, status=400)
+			return render(request, 'thanks.html', context={'stats': stats, 'dry_run': dryRun})
 		else:
 			return render(request, 'fileParseError.html'), 500
+
+
+@user_passes_test(lambda x: x.is_superuser)
+def cacheStats(request):
+	"""
+	Hit/miss counters and size of this process's response cache. POST to
+	reset the counters.
+	"""
+	if request.method == 'POST':
+		cache.responses.reset_stats()
+	return JsonResponse(cache.responses.report())
+
+
+@user_passes_test(lambda x: x.is_superuser)
+def throttleStats(request):
+	"""
+	Allowed/throttled counts per bucket scope on the public endpoints, and how
+	many of their answers were built versus shared with a coalesced request
+	(see throttles.py and coalesce.py). Per process, apart from the shared
+	backend's bucket count. POST to reset the counters.
+	"""
+	if request.method == 'POST':
+		throttles.buckets.reset_stats()
+		coalescer.reset_stats()
+	return JsonResponse({'throttles': throttles.buckets.report(), 'coalescing': coalescer.report()})
+
+
+@user_passes_test(lambda x: x.is_superuser)
+def importJobStatus(request, job_id):
+	"""
+	Poll this for a background upload's progress: rows processed, rows per
+	second, ETA and, if it failed, which rows were bad.
+	"""
+	job = get_object_or_404(ImportJob, pk=job_id)
+	return JsonResponse(jobs.jobStatus(job))
+
+
+####### API VIEWS #######
+@readFromReplica
+@api_view(['GET'])
+@permission_classes((AllowAny,))
+@throttle_classes((throttles.ClientRateThrottle, throttles.EventRateThrottle))
+def liveSearch(request, event_id):
+	"""
+	Public name search for "Live Search" events, called on every keystroke.
+	GET ?q=<what the guest has typed so far>&limit=<max invitations, default 10>
+
+	Answers from the in-process index in search.py, so a warm index costs no
+	queries. Guests only carry PUBLIC_FIELDS.
+	"""
+	try:
+		limit = max(1, min(int(request.query_params.get('limit', search.DEFAULT_LIMIT)), 50))
+	except ValueError:
+		limit = search.DEFAULT_LIMIT
+	query = request.query_params.get('q', '')
+
+	def build():
+		index = search.get_index(event_id)
+		if index is None:
+			raise Http404
+		return index.search(query, limit)
+
+	key = ('search', int(event_id), tuple(search.tokenize(query)), limit)
+	return Response({'results': coalescer.run(key, build)})
+
+
+@readFromReplica
+@api_view(['GET'])
+@permission_classes((AllowAny,))
+@throttle_classes((throttles.ClientRateThrottle, throttles.EventRateThrottle))
+def invitationByCode(request, code):
+	"""
+	Public lookup for "Code" events: the invitation printed with this code and
+	its guests' PUBLIC_FIELDS. Dashes, spaces and case in the code don't matter.
+	One query.
+	"""
+	def build():
+		guests = InvitationCode.lookup(code)
+		if not guests:
+			raise Http404
+		invitation = groupInvitations(guests)[0]
+		invitation['event'] = guests[0]['event']
+		return invitation
+
+	return Response(coalescer.run(('code', InvitationCode.normalize(code)), build))
+
+
+@readFromReplica
+@api_view(['GET', 'POST'])
+@permission_classes((AllowAny,))
+@throttle_classes((throttles.ClientRateThrottle, throttles.EventRateThrottle))
+def codeRSVP(request, code):
+	"""
+	Public RSVP for "Code" events, by the invitation's code. See answerInvitation.
+	"""
+	row = InvitationCode.objects.filter(code=InvitationCode.normalize(code),
+		event__rsvp_method=InvitationCode.RSVP_METHOD).values_list('event_id', 'invitation').first()
+	if row is None:
+		raise Http404
+	return answerInvitation(request, *row)
+
+
+@readFromReplica
+@api_view(['GET', 'POST'])
+@permission_classes((AllowAny,))
+@throttle_classes((throttles.ClientRateThrottle, throttles.EventRateThrottle))
+def invitationRSVP(request, event_id, invitation):
+	"""
+	Public RSVP for "Live Search" events, by invitation number. See
+	answerInvitation.
+	"""
+	if not Event.objects.filter(pk=event_id, rsvp_method=search.LIVE_SEARCH).exists():
+		raise Http404
+	return answerInvitation(request, event_id, invitation)
+
+
+@readFromReplica
+@condition(etag_func=eventVersionETag)
+@api_view(['GET'])
+@permission_classes((AllowAny,))
+@throttle_classes((throttles.ClientRateThrottle, throttles.EventRateThrottle))
+def eventInvitations(request, event_id):
+	"""
+	Every invitation on a "Live Search" event, grouped and ordered by
+	(invitation, orderer), plus the event's display settings.
+
+	Payloads are cached per event version (see cache.py), so a repeat request
+	costs the one version query whether or not the client sent an If-None-Match
+	we could answer with a 304. Building the payload takes two more.
+
+	Pass ?page_size=<guests> (and then ?cursor=<the "next" link's cursor>) for
+	keyset pages of whole invitations instead; "next" links to the following
+	page until the last one.
+	"""
+	try:
+		params = pageParams(request)
+	except ValueError:
+		return Response({'detail': 'cursor and page_size must be integers.'},
+			status=status.HTTP_400_BAD_REQUEST)
+
+	def build():
+		ev = get_object_or_404(Event.objects.select_related('version'),
+			pk=event_id, rsvp_method=search.LIVE_SEARCH)
+		guests = EventGuest.objects.filter(event=ev).order_by('invitation', 'orderer', 'id')
+		if params is not None:
+			guests, nextPage = keysetPage(request, guests, params)
+		with timed('serializer'):
+			payload = {
+				'event': ev.pk,
+				'version': ev.version.version,
+				'display': EventDisplayInfoSerializer(ev).data,
+				'invitations': groupInvitations(guests.values(*PUBLIC_FIELDS)),
+			}
+		if params is not None:
+			payload['next'] = nextPage
+		return payload, ev.version.version
+
+	name = 'invitations'
+	if params is not None:
+		name = 'invitations_after{0}_size{1}'.format(params[0] or 0, params[1])
+	version = getattr(request, 'eventVersion', None)
+	return Response(coalescer.run(('invitations', int(event_id), name, version),
+		lambda: cache.responses.get_or_build(event_id, name, version, build)))
+
+
+@api_view(['GET'])
+@permission_classes((IsEventCoordinator,))
+def eventGuests(request, event_id):
+	"""
+	Coordinator list of an event's guests, status included, in keyset pages
+	of ?page_size= guests (default 500) that never split an invitation.
+	Follow "next" for the following page; it's null on the last one.
+	"""
+	ev = get_object_or_404(Event, pk=event_id)
+	try:
+		params = pageParams(request, required=True)
+	except ValueError:
+		return Response({'detail': 'cursor and page_size must be integers.'},
+			status=status.HTTP_400_BAD_REQUEST)
+	page, nextPage = keysetPage(request, EventGuest.objects.filter(event=ev), params)
+	with timed('serializer'):
+		return Response({'next': nextPage, 'results': GuestFullSerializer.fastRepresentation(page)})
+
+
+@api_view(['POST'])
+@permission_classes((IsEventCoordinator,))
+def createInvitations(request, event_id):
+	"""
+	POST {"invitations": [{"guests": [...]}, ...]} to add many invitations at
+	once (see serializers.InvitationBatchSerializer). All or nothing: if any
+	guest is invalid the response is a 400 and nothing is created. Otherwise
+	it's a 201 with the new invitations, numbered and grouped like
+	eventInvitations, guest ids and status included, and each one's code on
+	"Code" events. The same number of queries however many are sent.
+	"""
+	ev = get_object_or_404(Event, pk=event_id)
+	serializer = InvitationBatchSerializer(data=request.data, context={'event': ev})
+	with timed('serializer'):
+		serializer.is_valid(raise_exception=True)
+		serializer.save()
+		first, last = serializer.numbers
+		guests = EventGuest.objects.filter(event=ev, invitation__gte=first,
+			invitation__lte=last).order_by('invitation', 'orderer', 'id')
+		invitations = groupInvitations(GuestFullSerializer.fastRepresentation(guests))
+	if ev.rsvp_method == InvitationCode.RSVP_METHOD:
+		codes = dict(InvitationCode.objects.filter(event=ev, invitation__gte=first,
+			invitation__lte=last).values_list('invitation', 'code'))
+		for invitation in invitations:
+			invitation['code'] = InvitationCode(code=codes[invitation['invitation']]).formatted
+	return Response({'invitations': invitations}, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes((IsEventCoordinator,))
+def arrangeInvitations(request, event_id):
+	"""
+	POST {"invitations": {"<number>": [guest id, ...]}, "new": [[guest id, ...]]}
+	to reorder guests within invitations and move them between invitations in
+	bulk (see serializers.ArrangementSerializer and EventGuest.arrange). Each
+	listed invitation's guests are set to exactly that order, and every guest
+	in "new" goes on a new invitation. Only guests that move are written, in
+	one transaction with one batched UPDATE. The response has how many
+	guests changed, the new invitation numbers and, in order, the guest ids
+	of every invitation that changed. A 409 means someone else changed one of
+	the guests meanwhile; nothing was written.
+	"""
+	ev = get_object_or_404(Event, pk=event_id)
+	serializer = ArrangementSerializer(data=request.data, context={'event': ev})
+	serializer.is_valid(raise_exception=True)
+	try:
+		updated = serializer.save()
+	except MixedInvitationError as e:
+		return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+	except StaleInvitationError:
+		return Response({'detail': 'Some of these guests have changed since they were loaded.'},
+			status=status.HTTP_409_CONFLICT)
+	guests = EventGuest.objects.filter(event=ev, invitation__in=serializer.touched).order_by(
+		'invitation', 'orderer', 'id').values_list('invitation', 'id')
+	invitations = {number: [] for number in serializer.touched}
+	for number, guestId in guests:
+		invitations[number].append(guestId)
+	return Response({'updated': updated, 'new': serializer.numbers, 'invitations': invitations})
+
+
+@api_view(['GET', 'PUT'])
+@permission_classes((IsEventCoordinator,))
+def invitationDetail(request, event_id, invitation):
+	"""
+	Coordinator view of one invitation, status included.
+
+	PUT the complete list of guests the invitation should have. Guests carrying
+	the "id" of an existing guest are updated, ones without are created, and
+	existing guests left out are deleted, all in one transaction. The response
+	has the resulting guests and created/updated/deleted row counts.
+	"""
+	ev = get_object_or_404(Event, pk=event_id)
+	guests = list(EventGuest.objects.filter(event=ev, invitation=invitation))
+	if request.method == 'GET':
+		if not guests:
+			raise Http404
+		with timed('serializer'):
+			return Response({'guests': InvitationFullSerializer(guests, many=True).data})
+
+	if not (isinstance(request.data, list) and all(isinstance(item, dict) for item in request.data)):
+		return Response({'detail': 'Expected a list of guests.'}, status=status.HTTP_400_BAD_REQUEST)
+	data = [dict(item, event=ev.pk, invitation=int(invitation)) for item in request.data]
+	serializer = InvitationFullSerializer(guests, data=data, many=True)
+	with timed('serializer'):
+		serializer.is_valid(raise_exception=True)
+		try:
+			serializer.save()
+		except MixedInvitationError as e:
+			return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+		response = {'guests': serializer.data}
+	response.update(serializer.counts)
+	return Response(response)
+
+
+@api_view(['GET'])
+@permission_classes((IsEventCoordinator,))
+def eventChanges(request, event_id):
+	"""
+	Change feed for the coordinator app. GET ?since=<the cursor from last time>
+	returns the guests created or changed since then (status included) and the
+	ids of guests deleted since then, plus a new cursor to send next time.
+	Apply "deleted" before "guests".
+
+	Without since, or when since is older than the tombstones we still keep,
+	"reset" is true and "guests" is the whole list: replace what you have. An
+	up to date client gets an empty response for one query.
+	"""
+	try:
+		since = int(request.query_params['since']) if request.query_params.get('since') else None
+	except ValueError:
+		return Response({'detail': 'since must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+	response = changesSince(event_id, since)
+	if response is None:
+		raise Http404
+	return Response(response)
+
+
+@api_view(['GET'])
+@permission_classes((IsEventCoordinator,))
+def eventStream(request, event_id):
+	"""
+	The change feed pushed as server-sent events, for an EventSource. Each
+	"changes" event's data is what GET changes/?since=<its id> would have
+	returned, and its id is the new cursor, so a reconnecting EventSource (its
+	Last-Event-ID header) or ?since= picks up where it left off. Without either,
+	the stream starts from now. A "gone" event ends it if the event is deleted.
+	See live.py.
+	"""
+	since = request.META.get('HTTP_LAST_EVENT_ID') or request.query_params.get('since')
+	try:
+		since = int(since) if since else None
+	except ValueError:
+		return Response({'detail': 'since must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+	current = EventVersion.objects.filter(event_id=event_id).values_list('version', flat=True).first()
+	if current is None:
+		raise Http404
+	if since is None:
+		since = current
+	response = StreamingHttpResponse(live.stream(event_id, since,
+		lambda cursor: changesSince(event_id, cursor)), content_type='text/event-stream')
+	response['Cache-Control'] = 'no-cache'
+	response['X-Accel-Buffering'] = 'no' # Don't let nginx sit on the events.
+	return response
+
+
+@api_view(['POST'])
+@permission_classes((IsEventCoordinator,))
+def cloneEvent(request, event_id):
+	"""
+	POST {"name": .., "event_date": .., "statuses": [..], "whole_invitations": ..}
+	(see serializers.EventCloneSerializer) to start a new event from this one,
+	say a brunch from the wedding: the display settings, the coordinators and
+	the guests, with invitations and their order kept and every status back to
+	Not Responded. The guests are copied inside the database with one
+	INSERT ... SELECT, so it takes seconds for a 100k guest event. Responds 201
+	with the new event's id and name and how many guests were copied.
+	"""
+	ev = get_object_or_404(Event, pk=event_id)
+	serializer = EventCloneSerializer(data=request.data, context={'event': ev})
+	serializer.is_valid(raise_exception=True)
+	with timed('clone'):
+		clone = serializer.save()
+	return Response({'event': clone.pk, 'name': clone.name, 'guests': serializer.copied},
+		status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET'])
+@permission_classes((IsEventCoordinator,))
+def eventSummary(request, event_id):
+	"""
+	Response counters for the coordinator dashboard. Reads the one EventSummary
+	row the writes keep up to date, so polling it doesn't touch the guest table.
+	"""
+	summary = EventSummary.forEvent(event_id)
+	if summary is None:
+		raise Http404
+	response = summary.report()
+	response['event'] = summary.event_id
+	return Response(response)
+
+
+@api_view(['GET'])
+@permission_classes((IsAuthenticated,))
+def plannerDashboard(request):
+	"""
+	Every event the user follows, soonest first, each with its response
+	counters. One query for the lot (plus the usual session/user/profile ones)
+	however many events that is: summaries and versions are joined in.
+	"""
+	profile = getattr(request.user, 'ctprofile', None)
+	if profile is None:
+		return Response({'events': []})
+	events = profile.followed_events.select_related('summary', 'version').order_by('event_date', 'pk')
+	response = []
+	for ev in events:
+		try:
+			summary = ev.summary
+		except EventSummary.DoesNotExist:
+			summary = EventSummary(event=ev) # No guests yet; all zeros.
+		try:
+			version = ev.version.version
+		except EventVersion.DoesNotExist:
+			version = None
+		response.append({'id': ev.pk, 'name': ev.name, 'event_date': ev.event_date,
+			'rsvp_method': ev.rsvp_method, 'version': version, 'summary': summary.report()})
+	return Response({'events': response})
+
+
+@api_view(['GET'])
+@permission_classes((IsEventCoordinator,))
+def exportGuests(request, event_id, filetype):
+	"""
+	Streams an event's guest list as .csv or .jsonl, in the upload file's
+	column layout. See exporter.py.
+	"""
+	ev = get_object_or_404(Event, pk=event_id)
+	response = StreamingHttpResponse(exporter.STREAMS[filetype](ev),
+		content_type=exporter.CONTENT_TYPES[filetype])
+	response['Content-Disposition'] = 'attachment; filename="event-{0}-guests.{1}"'.format(
+		ev.pk, filetype)
+	return response